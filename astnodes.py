@@ -0,0 +1,134 @@
+# Abstract syntax tree built by parser.py and shared by all back ends
+#
+# Statements are small __slots__ objects. An expression is an Expr holding
+# its code in reverse Polish notation, a flat list of (kind, lexeme) items
+# with kinds from lexer.kinds, so the generators walk it without recursion.
+
+from lexer.kinds import numKinds
+
+# Expression items that have no token kind of their own
+NEG = numKinds          # (NEG, '-'): unary minus of the operand before it
+CALL = numKinds + 1     # (CALL, name, [Expr, ...]): function call
+
+
+class Node:
+    __slots__ = ('line',)
+
+    def __reduce__(self):
+        # Pickled as a call of the constructor, which takes the line and then
+        # the fields in __slots__ order; much smaller and faster than the
+        # generic pickling of __slots__ objects
+        return type(self), (self.line,) + tuple(getattr(self, name) for name in self.__slots__)
+
+
+class Expr(Node):
+    __slots__ = ('code',)
+
+    def __init__(self, line, code):
+        self.line = line
+        self.code = code
+
+
+class Program(Node):
+    __slots__ = ('body',)
+
+    def __init__(self, line, body):
+        self.line = line
+        self.body = body
+
+
+class Block(Node):
+    __slots__ = ('body',)
+
+    def __init__(self, line, body):
+        self.line = line
+        self.body = body
+
+
+class VarDecl(Node):
+    # Also a const declaration; items are (name, Expr or None)
+    __slots__ = ('const', 'type', 'items')
+
+    def __init__(self, line, const, type, items):
+        self.line = line
+        self.const = const
+        self.type = type
+        self.items = items
+
+
+class FuncDecl(Node):
+    # In lazy mode body is None until parser.parseFunctionBody() fills it from
+    # lazy, the (tableOfSymb, tableOfKind, first, last) entries of the Block
+    __slots__ = ('name', 'params', 'body', 'lazy')
+
+    def __init__(self, line, name, params, body, lazy=None):
+        self.line = line
+        self.name = name
+        self.params = params
+        self.body = body
+        self.lazy = lazy
+
+
+class Assign(Node):
+    __slots__ = ('name', 'value')
+
+    def __init__(self, line, name, value):
+        self.line = line
+        self.name = name
+        self.value = value
+
+
+class If(Node):
+    __slots__ = ('cond', 'then', 'orelse')
+
+    def __init__(self, line, cond, then, orelse):
+        self.line = line
+        self.cond = cond
+        self.then = then
+        self.orelse = orelse
+
+
+class For(Node):
+    # start and end are the (kind, lexeme) of the range bounds
+    __slots__ = ('var', 'start', 'end', 'body')
+
+    def __init__(self, line, var, start, end, body):
+        self.line = line
+        self.var = var
+        self.start = start
+        self.end = end
+        self.body = body
+
+
+class Print(Node):
+    __slots__ = ('args',)
+
+    def __init__(self, line, args):
+        self.line = line
+        self.args = args
+
+
+class Input(Node):
+    __slots__ = ('name',)
+
+    def __init__(self, line, name):
+        self.line = line
+        self.name = name
+
+
+class Return(Node):
+    __slots__ = ('value',)
+
+    def __init__(self, line, value):
+        self.line = line
+        self.value = value
+
+
+class Call(Node):
+    # Function call used as a statement
+    __slots__ = ('name', 'args')
+
+    def __init__(self, line, name, args):
+        self.line = line
+        self.name = name
+        self.args = args
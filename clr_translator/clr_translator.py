@@ -1,31 +1,21 @@
-from lexer.lexer import start as lex_start
-from lexer import globals as g
+from parser import buildAst, parseFile, parseFunctionBody
+from astnodes import *
+from lexer.kinds import *
+from diagnostics import diag
 
 # Global variables for CLR translator
-tableOfSymb = {}           # Symbol table from lexer
-numRow = 0                 # Current record number
-len_tableOfSymb = 0        # Total records
 cilCode = []               # Generated CIL code
 localVars = set()          # Set of local variables
 labelCounter = 0           # Counter for generating labels
+functions = {}             # Top-level functions {name: FuncDecl}
+workStack = []             # Pending steps [(function, argument)], next one last
 
 
-# ========== HELPER FUNCTIONS ==========
-
-def getSymb():
-    """Gets current entry from symbol table"""
-    global numRow, tableOfSymb
-    if numRow <= len_tableOfSymb:
-        numLine, lexeme, token, _ = tableOfSymb[numRow]
-        return numLine, lexeme, token
-    return None, None, None
-
+class TranslationError(Exception):
+    """Error in the program that stops translation, reported without traceback"""
 
-def nextSymb():
-    """Moves to next symbol"""
-    global numRow
-    numRow += 1
 
+# ========== HELPER FUNCTIONS ==========
 
 def createLabel():
     """Generates new unique label"""
@@ -41,14 +31,37 @@ def emit(instruction, comment=""):
         cilCode.append(f"    {instruction:<40} // {comment}")
     else:
         cilCode.append(f"    {instruction}")
-    print(f"  + CIL: {instruction}")
+    if diag.showTrace:
+        diag.trace(f"  + CIL: {instruction}")
 
 
 def emitLabel(label):
     """Emits label"""
     global cilCode
     cilCode.append(f"  {label}:")
-    print(f"  @ Label: {label}")
+    if diag.showTrace:
+        diag.trace(f"  @ Label: {label}")
+
+
+def emitBranch(target):
+    """Emits unconditional branch, target is (label, comment)"""
+    label, comment = target
+    emit(f"br {label}", comment)
+
+
+def pushStatements(statements):
+    """Schedules the statements, the first one to run next"""
+    workStack.extend((translateStatement, node) for node in reversed(statements))
+
+
+def translateStatements(statements):
+    """Translates the statements and everything nested in them; compound
+    statements push their blocks and the code after them on workStack, so
+    deep nesting does not grow the Python stack"""
+    pushStatements(statements)
+    while workStack:
+        step, argument = workStack.pop()
+        step(argument)
 
 
 def addLocalVar(varName):
@@ -100,240 +113,107 @@ def generateProgramFooter():
     cilCode.append("}")
 
 
+def requireFunction(name):
+    """Parses the body of a lazily parsed function on its first call"""
+    func = functions.get(name)
+    if func is not None and func.lazy is not None and parseFunctionBody(func) is None:
+        raise TranslationError(f"invalid body of function '{name}'")
+
+
 # ========== TRANSLATION FUNCTIONS ==========
 
-def translateProgram():
+def translateProgram(program):
     """Translates entire program"""
-    print("\n" + "=" * 60)
-    print("TRANSLATION TO CIL")
-    print("=" * 60 + "\n")
+    diag.info("\n" + "=" * 60)
+    diag.info("TRANSLATION TO CIL")
+    diag.info("=" * 60 + "\n")
 
     generateProgramHeader()
 
     # First pass: collect all variables
-    collectVariables()
+    collectVariables(program)
 
     # Generate local variable declarations
     generateLocalVars()
 
-    # Reset position
-    global numRow
-    numRow = 1
-
     # Second pass: translate code
     cilCode.append("    // Program code")
 
-    while numRow <= len_tableOfSymb:
-        numLine, lex, tok = getSymb()
+    translateStatements(program.body)
 
-        if numLine is None:
-            break
+    generateProgramFooter()
 
-        # Variable/constant declarations
-        if tok == 'TYPE' or lex == 'const':
-            translateDeclaration()
+    diag.info("\n" + "=" * 60)
+    diag.info("CIL CODE GENERATED")
+    diag.info("=" * 60)
+    return True
 
-        # Function declaration - skip
-        elif lex == 'def' and tok == 'KEYWORD':
-            skipFunction()
 
-        # Statements
-        elif tok == 'IDENTIFIER' or lex in ('if', 'for', 'print', 'input', 'return') or lex == '{':
-            translateStatement()
+def collectVariables(program):
+    """First pass: collect all variable names, functions excluded"""
+    nodes = list(program.body)
 
-        else:
-            break
+    while nodes:
+        node = nodes.pop()
 
-    generateProgramFooter()
-
-    print("\n" + "=" * 60)
-    print("CIL CODE GENERATED")
-    print("=" * 60)
-    return True
+        if isinstance(node, VarDecl):
+            for name, value in node.items:
+                addLocalVar(name)
 
+        elif isinstance(node, For):
+            addLocalVar(node.var)
+            nodes.append(node.body)
 
-def collectVariables():
-    """First pass: collect all variable names"""
-    global numRow
-    saved_row = numRow
-    numRow = 1
-
-    while numRow <= len_tableOfSymb:
-        numLine, lex, tok = getSymb()
-
-        if numLine is None:
-            break
-
-        if tok == 'TYPE' or lex == 'const':
-            nextSymb()  # Skip type/const
-            if tok == 'TYPE':
-                nextSymb()  # Skip type keyword
-
-            # Get variable names
-            while True:
-                numLine, lex, tok = getSymb()
-                if tok == 'IDENTIFIER':
-                    addLocalVar(lex)
-                    nextSymb()
-
-                    # Skip initialization
-                    numLine2, lex2, tok2 = getSymb()
-                    if lex2 == '=':
-                        nextSymb()
-                        skipExpression()
-
-                    numLine3, lex3, tok3 = getSymb()
-                    if lex3 == ',':
-                        nextSymb()
-                    else:
-                        break
-                else:
-                    break
-        else:
-            nextSymb()
-
-    numRow = saved_row
-
-
-def skipExpression():
-    """Skips expression during variable collection"""
-    depth = 0
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == '(':
-            depth += 1
-        elif lex == ')':
-            if depth == 0:
-                break
-            depth -= 1
-        elif lex in (',', ';') and depth == 0:
-            break
-        elif tok == 'TYPE' or lex in ('const', 'def', 'if', 'for', 'print', 'input'):
-            break
-        nextSymb()
-
-
-def skipFunction():
-    """Skips function declaration"""
-    nextSymb()  # def
-    nextSymb()  # name
-    nextSymb()  # (
-
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == ')':
-            nextSymb()
-            break
-        nextSymb()
-
-    # Skip block
-    depth = 1
-    nextSymb()  # {
-
-    while depth > 0:
-        numLine, lex, tok = getSymb()
-        if lex == '{':
-            depth += 1
-        elif lex == '}':
-            depth -= 1
-        nextSymb()
-
-
-def translateDeclaration():
-    """Translates variable declaration with initialization"""
-    numLine, lex, tok = getSymb()
+        elif isinstance(node, Block):
+            nodes.extend(node.body)
 
-    print(f"\nTranslating declaration at line {numLine}")
+        elif isinstance(node, If):
+            nodes.append(node.then)
+            if node.orelse is not None:
+                nodes.append(node.orelse)
 
-    # Skip const keyword
-    if lex == 'const':
-        nextSymb()
 
-    # Skip type
-    nextSymb()
+def skipFunction(node):
+    """Skips function declaration"""
+    if diag.showTrace:
+        diag.trace(f"\nSkipping function '{node.name}' at line {node.line}")
 
-    # Process variable initializations
-    while True:
-        numLine, lex, tok = getSymb()
-        varName = lex
-        nextSymb()
 
-        numLine, lex, tok = getSymb()
-        if lex == '=':
-            nextSymb()
+def translateDeclaration(node):
+    """Translates variable declaration with initialization"""
+    if diag.showTrace:
+        diag.trace(f"\nTranslating declaration at line {node.line}")
 
+    # Process variable initializations
+    for varName, value in node.items:
+        if value is not None:
             # Translate expression
-            translateExpression()
+            translateExpression(value)
 
             # Store to variable
             emit(f"stloc {varName}", f"Store to {varName}")
 
-        numLine, lex, tok = getSymb()
-        if lex == ',':
-            nextSymb()
-        else:
-            break
-
 
-def translateStatement():
+def translateStatement(node):
     """Translates statement"""
-    numLine, lex, tok = getSymb()
-
-    print(f"\nTranslating statement at line {numLine}")
-
-    # Assignment
-    if tok == 'IDENTIFIER':
-        saved_row = numRow
-        nextSymb()
-        numLine2, lex2, tok2 = getSymb()
-        numRow = saved_row
-
-        if lex2 == '=' and tok2 == 'ASSIGN_OP':
-            translateAssignment()
-        elif lex2 == '(':
-            # Function call - skip
-            skipFunctionCall()
-
-    # If statement
-    elif lex == 'if':
-        translateIf()
-
-    # Print
-    elif lex == 'print':
-        translatePrint()
+    if diag.showTrace:
+        diag.trace(f"\nTranslating statement at line {node.line}")
 
-    # Input
-    elif lex == 'input':
-        translateInput()
+    translators[type(node)](node)
 
-    # Block
-    elif lex == '{':
-        translateBlock()
 
-
-def translateAssignment():
+def translateAssignment(node):
     """Translates assignment"""
-    numLine, lex, tok = getSymb()
-    varName = lex
-    nextSymb()
-
-    nextSymb()  # =
-
-    translateExpression()
+    translateExpression(node.value)
 
-    emit(f"stloc {varName}", f"Store to {varName}")
+    emit(f"stloc {node.name}", f"Store to {node.name}")
 
 
-def translateIf():
+def translateIf(node):
     """Translates if statement"""
-    print("  Translating if statement")
-
-    nextSymb()  # if
-    nextSymb()  # (
-
-    translateExpression()
+    diag.trace("  Translating if statement")
 
-    nextSymb()  # )
+    translateExpression(node.cond)
 
     labelElse = createLabel()
     labelEnd = createLabel()
@@ -341,293 +221,216 @@ def translateIf():
     # If false, branch to else
     emit(f"brfalse {labelElse}", "Jump to else if false")
 
-    # Then block
-    translateBlock()
+    # Then block, then the else block if any, pushed in reverse order
+    if node.orelse is not None:
+        workStack.append((emitLabel, labelEnd))
+        workStack.append((translateBlock, node.orelse))
+        workStack.append((emitLabel, labelElse))
+        workStack.append((emitBranch, (labelEnd, "Jump to end")))
+    else:
+        workStack.append((emitLabel, labelElse))
 
-    # Check for else
-    numLine, lex, tok = getSymb()
-    if lex == 'else':
-        emit(f"br {labelEnd}", "Jump to end")
-        emitLabel(labelElse)
+    workStack.append((translateBlock, node.then))
 
-        nextSymb()  # else
-        translateBlock()
 
-        emitLabel(labelEnd)
-    else:
-        emitLabel(labelElse)
+def translateFor(node):
+    """Translates for loop over the range start..end, both ends included"""
+    diag.trace("  Translating for loop")
 
+    varName = node.var
+    emit(f"ldc.r8 {node.start[1]}", f"Load constant {node.start[1]}")
+    emit(f"stloc {varName}", f"Store to {varName}")
 
-def translatePrint():
-    """Translates print statement"""
-    print("  Translating print")
+    labelLoop = createLabel()
+    labelEnd = createLabel()
 
-    nextSymb()  # print
-    nextSymb()  # (
+    # The lexer may read '1..5' as '1.' '.5', the dot of the end is the range
+    end = node.end[1].lstrip('.')
 
-    # Count expressions
-    expressions = []
+    # Leave the loop once the variable is past the end
+    emitLabel(labelLoop)
+    emit(f"ldloc {varName}", f"Load {varName}")
+    emit(f"ldc.r8 {end}", f"Load constant {end}")
+    emit(f"bgt {labelEnd}", "Jump to end if past the range")
 
-    numLine, lex, tok = getSymb()
-    if lex != ')':
-        translateExpression()
-        expressions.append(True)
+    # Block, increment and the end, pushed in reverse order
+    workStack.append((emitLabel, labelEnd))
+    workStack.append((emitBranch, (labelLoop, "Jump to loop start")))
+    workStack.append((incrementVar, varName))
+    workStack.append((translateBlock, node.body))
 
-        while True:
-            numLine, lex, tok = getSymb()
-            if lex == ',':
-                nextSymb()
-                translateExpression()
-                expressions.append(True)
-            else:
-                break
 
-    nextSymb()  # )
+def incrementVar(varName):
+    """Increments the loop variable"""
+    emit(f"ldloc {varName}", f"Load {varName}")
+    emit("ldc.r8 1", "Load constant 1")
+    emit("add", "Addition")
+    emit(f"stloc {varName}", f"Store to {varName}")
+
+
+def translatePrint(node):
+    """Translates print statement"""
+    diag.trace("  Translating print")
+
+    for expr in node.args:
+        translateExpression(expr)
 
     # Print each value (they're on stack in reverse order)
     # For now, just print as float64
-    for _ in expressions:
+    for _ in node.args:
         emit("call void [mscorlib]System.Console::WriteLine(float64)")
 
 
-def translateInput():
+def translateInput(node):
     """Translates input statement"""
-    print("  Translating input")
-
-    nextSymb()  # input
-    nextSymb()  # (
-
-    numLine, lex, tok = getSymb()
-    varName = lex
-    nextSymb()
-
-    nextSymb()  # )
+    diag.trace("  Translating input")
 
     # Read line and parse
     emit("call string [mscorlib]System.Console::ReadLine()")
     emit("call float64 [mscorlib]System.Double::Parse(string)")
-    emit(f"stloc {varName}", f"Store input to {varName}")
-
-
-def translateBlock():
-    """Translates block"""
-    nextSymb()  # {
-
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == '}':
-            nextSymb()
-            break
-        translateStatement()
-
+    emit(f"stloc {node.name}", f"Store input to {node.name}")
 
-def skipFunctionCall():
-    """Skips function call"""
-    nextSymb()  # name
-    nextSymb()  # (
-
-    depth = 1
-    while depth > 0:
-        numLine, lex, tok = getSymb()
-        if lex == '(':
-            depth += 1
-        elif lex == ')':
-            depth -= 1
-        nextSymb()
-
-
-def translateExpression():
-    """Translates expression"""
-    translateCompareExpr()
-
-
-def translateCompareExpr():
-    """Translates comparison expression"""
-    translateArithExpr()
-
-    numLine, lex, tok = getSymb()
-    if tok == 'COMPARE_OP':
-        op = lex
-        nextSymb()
-        translateArithExpr()
-
-        # CIL comparison instructions
-        if op == '==':
-            emit("ceq", "Compare equal")
-        elif op == '>':
-            emit("cgt", "Compare greater than")
-        elif op == '<':
-            emit("clt", "Compare less than")
-        elif op == '>=':
-            # a >= b is NOT (a < b)
-            emit("clt", "Compare less than")
-            emit("ldc.i4.0")
-            emit("ceq", "Invert")
-        elif op == '<=':
-            # a <= b is NOT (a > b)
-            emit("cgt", "Compare greater than")
-            emit("ldc.i4.0")
-            emit("ceq", "Invert")
-        elif op == '!=':
-            emit("ceq", "Compare equal")
-            emit("ldc.i4.0")
-            emit("ceq", "Invert")
-
-
-def translateArithExpr():
-    """Translates arithmetic expression"""
-    translateTerm()
-
-    while True:
-        numLine, lex, tok = getSymb()
-        if tok == 'ADD_OP':
-            op = lex
-            nextSymb()
-            translateTerm()
-
-            if op == '+':
-                emit("add", "Addition")
-            else:
-                emit("sub", "Subtraction")
-        else:
-            break
 
+def translateReturn(node):
+    """Translates return statement; Main returns nothing, so the value is dropped"""
+    diag.trace("  Translating return")
 
-def translateTerm():
-    """Translates term"""
-    translatePower()
-
-    while True:
-        numLine, lex, tok = getSymb()
-        if tok == 'MULT_OP':
-            op = lex
-            nextSymb()
-            translatePower()
-
-            if op == '*':
-                emit("mul", "Multiplication")
-            else:
-                emit("div", "Division")
-        else:
-            break
-
+    if node.value is not None:
+        translateExpression(node.value)
+        emit("pop", "Drop return value")
 
-def translatePower():
-    """Translates power expression"""
-    translateFactor()
-
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == '^' and tok == 'POWER_OP':
-            nextSymb()
-            translateFactor()
-
-            # Power operation (use Math.Pow)
-            emit("call float64 [mscorlib]System.Math::Pow(float64, float64)")
-        else:
-            break
-
-
-def translateFactor():
-    """Translates factor"""
-    numLine, lex, tok = getSymb()
-
-    # Unary operator
-    unaryOp = None
-    if tok == 'ADD_OP' and lex in ('+', '-'):
-        unaryOp = lex
-        nextSymb()
-
-    translatePrimary()
-
-    if unaryOp == '-':
-        emit("neg", "Negate")
-
-
-def translatePrimary():
-    """Translates primary expression"""
-    numLine, lex, tok = getSymb()
-
-    # Constant
-    if tok == 'INT':
-        emit(f"ldc.r8 {lex}", f"Load constant {lex}")
-        nextSymb()
+    emit("ret", "Return from Main")
 
-    elif tok == 'FLOAT':
-        emit(f"ldc.r8 {lex}", f"Load constant {lex}")
-        nextSymb()
 
-    elif tok == 'BOOL':
-        value = "1" if lex == 'true' else "0"
-        emit(f"ldc.i4 {value}", f"Load boolean {lex}")
-        nextSymb()
+def skipFunctionCall(node):
+    """Skips function call"""
+    requireFunction(node.name)
+    diag.trace("  Skipping function call")
 
-    elif tok == 'STRING':
-        # Remove quotes
-        string_value = lex.strip('"')
-        emit(f'ldstr "{string_value}"', f"Load string")
-        nextSymb()
 
-    # Variable
-    elif tok == 'IDENTIFIER':
-        varName = lex
-        nextSymb()
+def translateBlock(node):
+    """Translates block"""
+    pushStatements(node.body)
+
+
+# Translation function of every statement node
+translators = {
+    VarDecl: translateDeclaration,
+    FuncDecl: skipFunction,
+    Assign: translateAssignment,
+    If: translateIf,
+    For: translateFor,
+    Print: translatePrint,
+    Input: translateInput,
+    Return: translateReturn,
+    Call: skipFunctionCall,
+    Block: translateBlock,
+}
+
+# CIL instructions of the binary operators
+operatorCode = {
+    PLUS: (("add", "Addition"),),
+    MINUS: (("sub", "Subtraction"),),
+    STAR: (("mul", "Multiplication"),),
+    SLASH: (("div", "Division"),),
+    # Power operation (use Math.Pow)
+    CARET: (("call float64 [mscorlib]System.Math::Pow(float64, float64)", ""),),
+    EQ: (("ceq", "Compare equal"),),
+    GT: (("cgt", "Compare greater than"),),
+    LT: (("clt", "Compare less than"),),
+    # a >= b is NOT (a < b)
+    GE: (("clt", "Compare less than"), ("ldc.i4.0", ""), ("ceq", "Invert")),
+    # a <= b is NOT (a > b)
+    LE: (("cgt", "Compare greater than"), ("ldc.i4.0", ""), ("ceq", "Invert")),
+    NE: (("ceq", "Compare equal"), ("ldc.i4.0", ""), ("ceq", "Invert")),
+}
+
+
+def translateExpression(expr):
+    """Translates expression, its code is already in postfix order"""
+    for item in expr.code:
+        kind, lex = item[0], item[1]
+
+        # Constant
+        if kind in NUMBERS:
+            emit(f"ldc.r8 {lex}", f"Load constant {lex}")
+
+        elif kind in (TRUE, FALSE):
+            value = "1" if kind == TRUE else "0"
+            emit(f"ldc.i4 {value}", f"Load boolean {lex}")
+
+        elif kind == STRING_CONST:
+            # Remove quotes
+            string_value = lex.strip('"')
+            emit(f'ldstr "{string_value}"', "Load string")
+
+        # Variable
+        elif kind == IDENTIFIER:
+            emit(f"ldloc {lex}", f"Load {lex}")
+
+        elif kind == NEG:
+            emit("neg", "Negate")
+
+        # Function call - skip for now
+        elif kind == CALL:
+            requireFunction(lex)
 
-        # Check for function call
-        numLine2, lex2, tok2 = getSymb()
-        if lex2 == '(':
-            # Function call - skip for now
-            skipFunctionCall()
         else:
-            emit(f"ldloc {varName}", f"Load {varName}")
-
-    # Parenthesized expression
-    elif lex == '(':
-        nextSymb()
-        translateExpression()
-        nextSymb()  # )
+            for instruction, comment in operatorCode[kind]:
+                emit(instruction, comment)
 
 
 # ========== MAIN TRANSLATION FUNCTION ==========
 
-def translate(table_of_symb):
-    """Main translation function"""
-    global tableOfSymb, numRow, len_tableOfSymb, cilCode, localVars, labelCounter
+def translateTree(program):
+    """Translates the Program tree built by the parser"""
+    global cilCode, localVars, labelCounter, functions, workStack
 
     # Initialize
-    tableOfSymb = table_of_symb
-    numRow = 1
-    len_tableOfSymb = len(tableOfSymb)
     cilCode = []
     localVars = set()
     labelCounter = 0
+    workStack = []
+    functions = {node.name: node for node in program.body if isinstance(node, FuncDecl)}
 
     # Translate
     try:
-        translateProgram()
+        translateProgram(program)
         return True, cilCode
+    except TranslationError as e:
+        diag.error(f"\nTranslation ERROR: {e}")
+        return False, []
     except Exception as e:
-        print(f"\nTranslation ERROR: {e}")
+        diag.error(f"\nTranslation ERROR: {e}")
         import traceback
-        traceback.print_exc()
+        diag.error(traceback.format_exc())
+        return False, []
+
+
+def translate(table_of_symb, table_of_kind=None):
+    """Main translation function"""
+    program = buildAst(table_of_symb, table_of_kind)
+    if program is None:
         return False, []
+    return translateTree(program)
 
 
-def start(file_path):
-    """Runs complete analysis and translation"""
-    # Run lexer
-    lex_success = lex_start(file_path)
+def start(file_path, lazy=False):
+    """Runs complete analysis and translation; with lazy, a function body is
+    only parsed when a call to the function is translated"""
+    # Run lexer and parser, once for the whole compilation
+    program = parseFile(file_path, lazy=lazy)
 
-    if not lex_success or g.errorCount > 0:
-        print("\n✗ Lexical analysis failed. Translation not possible.")
+    if program is None:
+        diag.error("\n✗ Lexical or syntax analysis failed. Translation not possible.")
         return False, []
 
     # Translate
-    success, cil_code = translate(g.tableOfSymb)
+    success, cil_code = translateTree(program)
 
     if success:
-        print("\n" + "=" * 60)
-        print("✓ CIL Translation completed successfully")
-        print("=" * 60)
+        diag.info("\n" + "=" * 60)
+        diag.info("✓ CIL Translation completed successfully")
+        diag.info("=" * 60)
 
     return success, cil_code
@@ -0,0 +1,84 @@
+# Diagnostics of all compiler stages (lexer, parser, translators, VM)
+
+# Levels, every level includes the ones before it
+SILENT = 0
+ERROR = 1
+WARNING = 2
+INFO = 3
+TRACE = 4
+
+levelNames = {
+    'silent': SILENT,
+    'error': ERROR,
+    'warning': WARNING,
+    'info': INFO,
+    'trace': TRACE,
+}
+
+
+def printSink(level, message):
+    """Default sink: writes the message to stdout"""
+    print(message)
+
+
+class Collector:
+    """Sink that keeps (level, message) pairs instead of printing them"""
+
+    def __init__(self):
+        self.messages = []
+
+    def __call__(self, level, message):
+        self.messages.append((level, message))
+
+    def errors(self):
+        return [message for level, message in self.messages if level == ERROR]
+
+
+class Diagnostics:
+    """Sends the messages of the stages to a sink, filtered by level.
+
+    The show* flags are precomputed so that hot paths can skip building a
+    message at all: `if diag.showTrace: diag.trace(f'...')`. The default
+    level is SILENT, which costs one attribute check per call site.
+    """
+
+    def __init__(self, level=SILENT, sink=printSink):
+        self.sink = sink
+        self.setLevel(level)
+
+    def setLevel(self, level):
+        self.level = level
+        self.showErrors = level >= ERROR
+        self.showWarnings = level >= WARNING
+        self.showInfo = level >= INFO
+        self.showTrace = level >= TRACE
+
+    def error(self, message):
+        if self.showErrors:
+            self.sink(ERROR, message)
+
+    def warning(self, message):
+        if self.showWarnings:
+            self.sink(WARNING, message)
+
+    def info(self, message):
+        if self.showInfo:
+            self.sink(INFO, message)
+
+    def trace(self, message):
+        if self.showTrace:
+            self.sink(TRACE, message)
+
+
+# Shared by all stages; silent unless a program configures it
+diag = Diagnostics()
+
+
+def configure(level, sink=None):
+    """Sets the level (a number or a name from levelNames) and optionally the sink"""
+    if isinstance(level, str):
+        level = levelNames[level]
+    diag.setLevel(level)
+    if sink is not None:
+        diag.sink = sink
+    return diag
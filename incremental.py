@@ -0,0 +1,174 @@
+# Incremental lexing and parsing of a source that is edited in place, for editors
+
+from bisect import bisect_left
+from itertools import repeat
+from operator import add
+
+from lexer.lexer import Lexer
+from parser import parseTopLevel
+from astnodes import Node, Program
+
+
+class KeptStarts:
+    # First entries of the old top-level statements from index kept on,
+    # moved by shift entries, but the one at index skip; tells parseTopLevel
+    # where to stop
+
+    def __init__(self, starts, kept, shift, skip=None):
+        self.starts = starts
+        self.kept = kept
+        self.shift = shift
+        self.skip = skip
+
+    def index(self, row):
+        i = bisect_left(self.starts, row - self.shift, self.kept)
+        if i < len(self.starts) and self.starts[i] == row - self.shift and i != self.skip:
+            return i
+        return None
+
+    def __contains__(self, row):
+        return self.index(row) is not None
+
+
+def shiftLines(nodes, shift):
+    # Moves the lines of the nodes and of everything inside them by shift
+    stack = list(nodes)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Node):
+            item.line += shift
+            stack.extend(getattr(item, name) for name in item.__slots__)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+
+
+class Document:
+    """Source file kept lexed and parsed between edits.
+
+    edit() lexes again only the part of the source the edit can change (see
+    Lexer.edit) and parses again only the top-level statements that hold
+    the changed tokens. Parsing starts at the last statement that starts
+    before them, since the token after a statement decides where it ends,
+    and stops before the first old statement that starts after them at an
+    entry the new parse reaches. The old statements from there on are kept.
+    When the edit adds or removes lines, the line shift of the kept
+    statements is only recorded, and applied to their nodes when program is
+    read.
+
+    A statement with a syntax error, or the token where the program stops
+    because it starts nothing, is kept in body as a None marker together
+    with the statements after it. Edits after the tokens the parser looked
+    at there cannot change the program, so they are not parsed; the
+    statements after the marker are parsed once an edit changes it. After
+    a lexical error the whole token table is parsed again.
+    """
+
+    def __init__(self, file_path):
+        self.lexer = Lexer(compact=True)
+        self.body = None      # Top-level statements, None without a token table
+        self.starts = []      # First entry of every top-level statement
+        self.shifts = []      # Line shift not applied yet to every statement
+        self.shifted = False
+        self.marker = None    # Index of the None marker in body
+        self.markerEnd = 0    # Last entry the parser looked at for the marker
+        self.markerError = False
+        if self.lexer.start(file_path, 'dfa'):
+            self.parseAll()
+
+    @property
+    def source(self):
+        return self.lexer.sourceCode
+
+    @property
+    def program(self):
+        """Program tree, None while the source has errors"""
+        if self.body is None or self.markerError:
+            return None
+        if self.shifted:
+            for node, shift in zip(self.body, self.shifts):
+                if shift:
+                    shiftLines((node,), shift)
+            self.shifts = [0] * len(self.body)
+            self.shifted = False
+        return Program(1, self.body[:self.marker])
+
+    def parseAll(self):
+        # Parses the whole token table, returns True without errors
+        self.body = None
+        if self.lexer.errorCount:
+            return False
+        self.body = []
+        self.starts = []
+        self.shifts = []
+        self.marker = None
+        return self.reparse(0, KeptStarts([], 0, 0), 0)
+
+    def edit(self, offset, removed, inserted):
+        """Replaces removed chars at offset with the inserted text; returns
+        True if the source is free of errors now"""
+        num, count, newCount, lineShift = self.lexer.edit(offset, removed, inserted)
+        if self.body is None or self.lexer.errorCount:
+            return self.parseAll()
+
+        starts = self.starts
+        first = max(bisect_left(starts, num) - 1, 0)
+        rest = bisect_left(starts, num + count)
+        marker = self.marker
+
+        if marker is not None and num > self.markerEnd + 1:
+            # The program still ends at the marker, only the statements
+            # after it that hold the changed tokens are dropped
+            end = max(first, marker + 1)
+            self.body[end:] = []
+            del starts[end:]
+            del self.shifts[end:]
+            return not self.markerError
+
+        if marker is not None and num + count >= starts[marker]:
+            first = min(first, marker)
+            rest = max(rest, marker + 1)
+        return self.reparse(first, KeptStarts(starts, rest, newCount - count, marker), lineShift)
+
+    def reparse(self, first, kept, lineShift):
+        # Parses the statements from index first on again, up to one of the
+        # kept old statements, whose entries move by kept.shift and lines by
+        # lineShift
+        starts = self.starts
+        row = starts[first] if first < len(starts) else 1
+        body, newStarts, stop, failed = parseTopLevel(self.lexer.tableOfSymb, self.lexer.tableOfKind, row, kept)
+        oldMarker = self.marker
+        end = len(starts)
+
+        rest = None if failed else kept.index(stop)
+        if rest is None and (failed or stop <= len(self.lexer.tableOfSymb)):
+            # Error or a token that starts nothing: the old statements after
+            # the changed ones are kept behind the new marker
+            if not failed:
+                newStarts.append(stop)
+            body.append(None)
+            rest = kept.kept
+            if oldMarker is not None and oldMarker >= rest:
+                # Only one marker: what follows the new one is parsed again
+                # once an edit clears it
+                end = rest
+            self.marker = first + len(body) - 1
+            self.markerEnd = stop
+            self.markerError = failed
+        else:
+            if rest is None:
+                rest = len(starts)
+            if oldMarker is not None and oldMarker >= rest:
+                self.marker = oldMarker - rest + first + len(body)
+                self.markerEnd += kept.shift
+            elif oldMarker is not None and oldMarker >= first:
+                self.marker = None
+                self.markerError = False
+
+        shifts = self.shifts[rest:end]
+        if lineShift:
+            shifts = list(map(add, shifts, repeat(lineShift)))
+            self.shifted = True
+        self.body = self.body[:first] + body + self.body[rest:end]
+        self.starts = starts[:first] + newStarts + list(map(add, starts[rest:end], repeat(kept.shift)))
+        self.shifts = self.shifts[:first] + [0] * len(body) + shifts
+        return not self.markerError
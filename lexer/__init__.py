@@ -1,3 +1,4 @@
-from .lexer import start
+from .lexer import Lexer, start, streamTokens
+from .tokens import TokenTable, TokenRing
 
-__all__ = ['start']
+__all__ = ['Lexer', 'TokenTable', 'TokenRing', 'start', 'streamTokens']
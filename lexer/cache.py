@@ -0,0 +1,249 @@
+# On-disk cache of the lexer tables, keyed by a hash of the source.
+#
+# Opt-in: set the directory with configure() or the JOOVY_TOKEN_CACHE
+# environment variable. Files are written to a temporary name and renamed
+# into place, so concurrent writers never leave a torn entry; the least
+# recently used entries are removed when the directory grows over maxBytes,
+# together with the temporary files of writers that died before the rename.
+
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+
+from .tables import tokenTable, tokStateTable
+from .states import initState, F, Fstar, Ferror, stf
+from .tokens import TokenTable
+from .kinds import kindOfLexeme
+
+MAGIC = b'JTC3'
+SUFFIX = '.jtc'
+TMP_SUFFIX = '.tmp'
+
+# Age in seconds after which a temporary file no writer renamed is removed
+staleSeconds = 600
+
+# magic, numLine, state, lexemeStart, tokens, token names, lexemes, ids, consts, has spans.
+# Offsets into the source and string sizes are 64-bit, a source may be over 4 GiB
+header = struct.Struct('<4sIiqIIIIIB')
+
+# Changes whenever the lexer tables (and so the tokens they produce) change
+tablesVersion = hashlib.sha256(repr((
+    MAGIC, sorted(tokenTable.items()), sorted(tokStateTable.items()), initState,
+    sorted(F), sorted(Fstar), sorted(Ferror), sorted(stf.items()), sorted(kindOfLexeme.items()),
+)).encode('utf-8')).hexdigest()
+
+directory = os.environ.get('JOOVY_TOKEN_CACHE') or None
+maxBytes = int(os.environ.get('JOOVY_TOKEN_CACHE_SIZE', 64 << 20))
+
+
+def configure(path, size=None):
+    """Enables the cache in the directory path (None disables it)"""
+    global directory, maxBytes
+    directory = path
+    if size is not None:
+        maxBytes = size
+
+
+def sourceKey(source, compact=False):
+    # Compact tables keep the spans of the tokens, so the two modes have
+    # their own entries
+    digest = hashlib.sha256(tablesVersion.encode('ascii'))
+    digest.update(b'compact' if compact else b'dict')
+    digest.update(source.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+def entryPath(key):
+    return os.path.join(directory, key + SUFFIX)
+
+
+def littleEndian(arr):
+    if sys.byteorder == 'big':
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def packStrings(strings):
+    lengths = array('q', (len(s) for s in strings))
+    return littleEndian(lengths), ''.join(strings).encode('utf-8', 'surrogatepass')
+
+
+def readArray(typecode, data, pos, count):
+    arr = array(typecode)
+    end = pos + count * arr.itemsize
+    arr.frombytes(data[pos:end])
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr, end
+
+
+def readStrings(data, pos, count):
+    lengths, pos = readArray('q', data, pos, count)
+    size, = struct.unpack_from('<Q', data, pos)
+    pos += 8
+    text = data[pos:pos + size].decode('utf-8', 'surrogatepass')
+    strings = []
+    at = 0
+    for length in lengths:
+        strings.append(text[at:at + length])
+        at += length
+    return strings, pos + size
+
+
+def store(lx, key):
+    """Writes the tables of the Lexer lx under key; returns False if that failed"""
+    table = lx.tableOfSymb
+    if not isinstance(table, TokenTable):
+        table = TokenTable()
+        for line, lex, tok, idx in lx.tableOfSymb.values():
+            table.append(line, lex, tok, idx)
+    else:
+        # Shifts left by splice() go into the arrays
+        table.moveGap(len(table))
+    hasSpans = table.source is not None
+
+    parts = [header.pack(MAGIC, lx.numLine, lx.state, lx.lexemeStart, len(table),
+                         len(table.tokenNames), len(table.lexemeList),
+                         len(lx.tableOfId), len(lx.tableOfConst), hasSpans)]
+    parts.append(littleEndian(table.lines))
+    parts.append(table.tokens.tobytes())
+    parts.append(bytes(lx.tableOfKind))
+    parts.append(littleEndian(table.lexemes))
+    parts.append(littleEndian(table.indices))
+    if hasSpans:
+        parts.append(littleEndian(array('q', table.starts)))
+        parts.append(littleEndian(array('q', table.ends)))
+    # Indices of identifiers and constants are their positions, starting at 1
+    for strings in (table.tokenNames, table.lexemeList, list(lx.tableOfId), list(lx.tableOfConst)):
+        lengths, text = packStrings(strings)
+        parts += [lengths, struct.pack('<Q', len(text)), text]
+    data = b''.join(parts)
+    data += struct.pack('<I', zlib.crc32(data))
+
+    try:
+        os.makedirs(directory, exist_ok=True)
+        fd, tmpPath = tempfile.mkstemp(dir=directory, suffix=TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmpPath, entryPath(key))
+            tmpPath = None
+        finally:
+            if tmpPath is not None:
+                try:
+                    os.unlink(tmpPath)
+                except OSError:
+                    pass
+    except OSError as e:
+        lx.diag.warning(f'Lexer: cannot write the token cache: {e}')
+        return False
+
+    evict()
+    return True
+
+
+def load(lx, key):
+    """Fills the tables of the Lexer lx from the entry key; returns False on a miss"""
+    path = entryPath(key)
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return False
+
+    if len(data) < header.size + 4 or data[:4] != MAGIC:
+        return False
+    crc, = struct.unpack_from('<I', data, len(data) - 4)
+    if zlib.crc32(memoryview(data)[:-4]) != crc:
+        return False
+
+    try:
+        (_, numLine, state, lexemeStart, count, numNames, numLexemes,
+         numIds, numConsts, hasSpans) = header.unpack_from(data)
+        pos = header.size
+
+        table = TokenTable(lx.sourceCode if hasSpans else None)
+        table.lines, pos = readArray('i', data, pos, count)
+        table.tokens, pos = readArray('B', data, pos, count)
+        kinds = bytearray(data[pos:pos + count + 1])
+        pos += count + 1
+        table.lexemes, pos = readArray('i', data, pos, count)
+        table.indices, pos = readArray('i', data, pos, count)
+        if hasSpans:
+            table.starts, pos = readArray('q', data, pos, count)
+            table.ends, pos = readArray('q', data, pos, count)
+
+        table.tokenNames, pos = readStrings(data, pos, numNames)
+        table.lexemeList, pos = readStrings(data, pos, numLexemes)
+        ids, pos = readStrings(data, pos, numIds)
+        consts, pos = readStrings(data, pos, numConsts)
+    except (struct.error, UnicodeDecodeError):
+        return False
+    if pos != len(data) - 4:
+        return False
+
+    table.tokenCodes = {name: code for code, name in enumerate(table.tokenNames)}
+    table.lexemeCodes = {lex: code for code, lex in enumerate(table.lexemeList)}
+
+    lx.tableOfSymb = table if lx.compact else dict(table.items())
+    lx.tableOfKind = kinds
+    lx.tableOfId = {lex: num for num, lex in enumerate(ids, 1)}
+    lx.tableOfConst = {lex: num for num, lex in enumerate(consts, 1)}
+    lx.numLine = numLine
+    lx.state = state
+    lx.lexemeStart = lexemeStart
+    lx.lexeme = lx.sourceCode[lexemeStart:] if state != initState else ''
+    lx.numChar = lx.lenCode - 1
+    lx.char = lx.sourceCode[-1:]
+
+    # Marks the entry as recently used for the eviction
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return True
+
+
+def evict():
+    """Removes the least recently used entries until the cache fits in
+    maxBytes, and the temporary files older than staleSeconds"""
+    entries = []
+    total = 0
+    stale = time.time() - staleSeconds
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                isEntry = entry.name.endswith(SUFFIX)
+                if not isEntry and not entry.name.endswith(TMP_SUFFIX):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if isEntry:
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+                elif st.st_mtime < stale:
+                    # Left by a writer that died before renaming it
+                    try:
+                        os.unlink(entry.path)
+                    except OSError:
+                        pass
+    except OSError:
+        return
+
+    entries.sort()
+    for mtime, size, path in entries:
+        if total <= maxBytes:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        total -= size
@@ -0,0 +1,89 @@
+from array import array
+
+from .states import initState, F, Fstar
+
+# Actions attached to every state of the dense automaton
+ACT_NEXT = 0      # keep reading the current lexeme
+ACT_INIT = 1      # back in the initial state, the lexeme is dropped
+ACT_FINAL = 2     # final state, the current char belongs to the lexeme
+ACT_RETRACT = 3   # final state from Fstar, the current char is put back
+
+
+class DenseDfa:
+    """State-transition function compiled into dense integer tables.
+
+    Character classes are numbered and stored in a 256-byte translation
+    table indexed by code point (everything above 255 is 'other'), and
+    every state gets a row indexed by class number, so one step of the
+    automaton is two indexing operations instead of a classOfChar
+    if-chain plus a dict lookup.
+    """
+
+    def __init__(self, classOfChar, nextState):
+        self.classNames = []
+        classIndex = {}
+
+        def classId(name):
+            if name not in classIndex:
+                classIndex[name] = len(self.classNames)
+                self.classNames.append(name)
+            return classIndex[name]
+
+        # code point -> class number; chars above latin-1 are encoded
+        # as '?', which is 'other' just like classOfChar says for them
+        classId('other')
+        self.classTable = bytes(classId(classOfChar(chr(code))) for code in range(256))
+
+        # error states have the biggest numbers
+        self.numStates = max(F | {initState}) + 1
+
+        # state -> row of next states indexed by class number
+        self.delta = tuple(
+            bytes(nextState(st, name) for name in self.classNames)
+            for st in range(self.numStates)
+        )
+
+        self.action = bytearray(self.numStates)
+        for st in range(self.numStates):
+            if st in Fstar:
+                self.action[st] = ACT_RETRACT
+            elif st in F:
+                self.action[st] = ACT_FINAL
+            elif st == initState:
+                self.action[st] = ACT_INIT
+
+    def classify(self, text):
+        """Maps the whole text to a bytes object of class numbers"""
+        return text.encode('latin-1', 'replace').translate(self.classTable)
+
+    def scan(self, text, pos=0, state=initState, start=0):
+        """Runs the automaton over text[pos:].
+
+        Returns (finals, state, start): finals is an array of
+        (state, lexemeStart, lexemeEnd) triples, flattened, for every final
+        state reached (new lines, comments and errors included), and
+        (state, start) describe the lexeme still unfinished at the end.
+        """
+        classes = self.classify(text)
+        delta = self.delta
+        action = self.action
+        finals = array('i')
+        emit = finals.extend
+        end = len(text)
+
+        while pos < end:
+            state = delta[state][classes[pos]]
+            pos += 1
+            act = action[state]
+            if act == ACT_NEXT:
+                continue
+            if act == ACT_INIT:
+                start = pos
+                continue
+            if act == ACT_RETRACT:
+                pos -= 1
+            emit((state, start, pos))
+            state = initState
+            start = pos
+
+        return finals, state, start
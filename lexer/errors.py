@@ -1,14 +1,13 @@
-from . import globals as g
 from .states import initState
 
-def fail():
-    if g.state == 101:
-        print(f'Lexer: ERROR in line {g.numLine}: unexpected symbol "{g.char}"')
-    elif g.state == 102:
-        print(f'Lexer: ERROR in line {g.numLine}: operator "!" does not supported, please use "!="')
+def fail(lx):
+    if lx.state == 101:
+        lx.diag.error(f'Lexer: ERROR in line {lx.numLine}: unexpected symbol "{lx.char}"')
+    elif lx.state == 102:
+        lx.diag.error(f'Lexer: ERROR in line {lx.numLine}: operator "!" does not supported, please use "!="')
     else:
-        print(f'Lexer: ERROR in line {g.numLine}: lexical error')
+        lx.diag.error(f'Lexer: ERROR in line {lx.numLine}: lexical error')
 
-    g.errorCount += 1
-    g.state = initState
-    g.lexeme = ''
+    lx.errorCount += 1
+    lx.state = initState
+    lx.lexeme = ''
@@ -1,3 +1,4 @@
+# Results of the last lexer.start() run, see lexer.Lexer for the state of a single run
 sourceCode = ""
 numLine = 1
 numChar = -1
@@ -7,6 +8,7 @@ lexeme = ""
 char = ""
 
 tableOfSymb = {}
+tableOfKind = bytearray(1)   # Token kinds (lexer.kinds) by entry number, [0] unused
 tableOfId = {}
 tableOfConst = {}
 
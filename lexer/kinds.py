@@ -0,0 +1,141 @@
+# Token kinds: a small integer for every key word, type, operator and punctuation
+# mark, so the parser and translators dispatch on ints instead of comparing the
+# (lexeme, token) strings of tableOfSymb
+
+NONE = 0                # End of the table
+
+IDENTIFIER = 1
+INT_CONST = 2
+FLOAT_CONST = 3
+STRING_CONST = 4
+TRUE = 5
+FALSE = 6
+
+KW_FOR = 7
+KW_IN = 8
+KW_IF = 9
+KW_ELSE = 10
+KW_PRINT = 11
+KW_INPUT = 12
+KW_CONST = 13
+KW_DEF = 14
+KW_RETURN = 15
+
+TYPE_INT = 16
+TYPE_FLOAT = 17
+TYPE_BOOL = 18
+TYPE_STRING = 19
+
+ASSIGN = 20             # =
+PLUS = 21               # +
+MINUS = 22              # -
+STAR = 23               # *
+SLASH = 24              # /
+CARET = 25              # ^
+EQ = 26                 # ==
+NE = 27                 # !=
+LT = 28                 # <
+LE = 29                 # <=
+GT = 30                 # >
+GE = 31                 # >=
+
+LPAREN = 32             # (
+RPAREN = 33             # )
+LBRACE = 34             # {
+RBRACE = 35             # }
+LBRACKET = 36           # [
+RBRACKET = 37           # ]
+COMMA = 38
+SEMICOLON = 39
+DOT = 40
+
+numKinds = 41
+
+# Kinds of the lexemes from tokenTable
+kindOfLexeme = {
+    'for': KW_FOR, 'in': KW_IN,
+    'if': KW_IF, 'else': KW_ELSE,
+    'print': KW_PRINT, 'input': KW_INPUT,
+    'const': KW_CONST, 'def': KW_DEF,
+    'return': KW_RETURN,
+
+    'int': TYPE_INT, 'float': TYPE_FLOAT,
+    'bool': TYPE_BOOL, 'string': TYPE_STRING,
+
+    'true': TRUE, 'false': FALSE,
+
+    '=': ASSIGN,
+    '+': PLUS, '-': MINUS,
+    '*': STAR, '/': SLASH,
+    '^': CARET,
+
+    '==': EQ, '!=': NE,
+    '<': LT, '<=': LE,
+    '>': GT, '>=': GE,
+
+    '(': LPAREN, ')': RPAREN,
+    '{': LBRACE, '}': RBRACE,
+    '[': LBRACKET, ']': RBRACKET,
+    ',': COMMA, ';': SEMICOLON,
+    '.': DOT,
+}
+
+# Kinds of the tokens with a lexeme of their own
+kindOfToken = {
+    'IDENTIFIER': IDENTIFIER,
+    'INT': INT_CONST,
+    'FLOAT': FLOAT_CONST,
+    'STRING': STRING_CONST,
+}
+
+# Lexeme and token of every kind, as they appear in tableOfSymb
+lexemeOfKind = [None] * numKinds
+tokenOfKind = [None] * numKinds
+for lex, kind in kindOfLexeme.items():
+    lexemeOfKind[kind] = lex
+tokenOfKind[IDENTIFIER] = 'IDENTIFIER'
+tokenOfKind[INT_CONST] = 'INT'
+tokenOfKind[FLOAT_CONST] = 'FLOAT'
+tokenOfKind[STRING_CONST] = 'STRING'
+tokenOfKind[TRUE] = tokenOfKind[FALSE] = 'BOOL'
+for kind in range(KW_FOR, KW_RETURN + 1):
+    tokenOfKind[kind] = 'KEYWORD'
+for kind in range(TYPE_INT, TYPE_STRING + 1):
+    tokenOfKind[kind] = 'TYPE'
+tokenOfKind[ASSIGN] = 'ASSIGN_OP'
+tokenOfKind[PLUS] = tokenOfKind[MINUS] = 'ADD_OP'
+tokenOfKind[STAR] = tokenOfKind[SLASH] = 'MULT_OP'
+tokenOfKind[CARET] = 'POWER_OP'
+for kind in range(EQ, GE + 1):
+    tokenOfKind[kind] = 'COMPARE_OP'
+for kind in range(LPAREN, RBRACKET + 1):
+    tokenOfKind[kind] = 'PAR_OP'
+tokenOfKind[COMMA] = 'COMMA'
+tokenOfKind[SEMICOLON] = 'SEMICOLON'
+tokenOfKind[DOT] = 'DOT'
+
+# Groups used by the grammar
+TYPES = frozenset(range(TYPE_INT, TYPE_STRING + 1))
+CONSTS = frozenset((INT_CONST, FLOAT_CONST, STRING_CONST, TRUE, FALSE))
+NUMBERS = frozenset((INT_CONST, FLOAT_CONST))
+ADD_OPS = frozenset((PLUS, MINUS))
+MULT_OPS = frozenset((STAR, SLASH))
+COMPARE_OPS = frozenset(range(EQ, GE + 1))
+PAR_OPS = frozenset(range(LPAREN, RBRACKET + 1))
+STATEMENTS = frozenset((IDENTIFIER, KW_IF, KW_FOR, KW_PRINT, KW_INPUT, KW_RETURN, LBRACE))
+
+
+def kindOf(lex, token):
+    # Kind of the (lexeme, token) pair of a tableOfSymb entry
+    kind = kindOfToken.get(token)
+    if kind is None:
+        kind = kindOfLexeme.get(lex, NONE)
+    return kind
+
+
+def kindsOf(tableOfSymb):
+    # Kinds of all entries, indexed by the entry number like tableOfSymb
+    kinds = bytearray(len(tableOfSymb) + 1)
+    for num, (_, lex, token, _) in tableOfSymb.items():
+        kinds[num] = kindOf(lex, token)
+    return kinds
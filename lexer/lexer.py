@@ -1,7 +1,23 @@
+import gc
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 from .utils import *
 from .tables import *
 from .states import *
 from .errors import *
+from . import globals as g
+from diagnostics import diag as defaultDiag, Diagnostics, ERROR
+from .dfa import DenseDfa
+from .master import MasterPattern
+try:
+    from .vector import VectorScanner
+except ImportError:
+    # NumPy is optional, only the numpy engine needs it
+    VectorScanner = None
+from .tokens import TokenTable
+from .kinds import kindOf
+from . import cache
 
 def classOfChar(ch):
     if ch in '.':
@@ -37,6 +53,14 @@ def nextState(st, classCh):
     except KeyError:
         return stf.get((st, 'other'), 101)
 
+# Dense tables compiled once from classOfChar and stf
+denseDfa = DenseDfa(classOfChar, nextState)
+masterPattern = MasterPattern(denseDfa)
+vectorScanner = VectorScanner(denseDfa) if VectorScanner is not None else None
+
+# Lexemes of the operators that are known from the final state alone
+stateLexemes = {21: '==', 22: '=', 24: '!=', 26: '<=', 27: '<', 29: '>=', 30: '>', 34: '/'}
+
 def getToken(st, lex):
     if lex in tokenTable:
         return tokenTable[lex]
@@ -45,156 +69,561 @@ def getToken(st, lex):
     else:
         return 'UNKNOWN'
 
-def indexIdConst(st, lex):
-    if st == 2:
-        if lex not in g.tableOfId:
-            g.tableOfId[lex] = len(g.tableOfId) + 1
-        return g.tableOfId[lex]
-    elif st in (13, 14, 9, 41):
-        if lex not in g.tableOfConst:
-            g.tableOfConst[lex] = len(g.tableOfConst) + 1
-        return g.tableOfConst[lex]
-    return -1
-
-def processing():
-    # New line processing
-    if g.state == 50:
-        g.numLine += 1
-        g.state = initState
-        return
-
-    #  Comments processing
-    if g.state == 33:
-        g.numLine += 1
-        g.lexeme = ''
-        g.state = initState
-        return
-
-    # Identifiers and const
-    if g.state in (2, 9, 13, 14):
-        token = getToken(g.state, g.lexeme)
-
-        # Key word check
-        if g.lexeme in tokenTable and token in ('KEYWORD', 'TYPE', 'BOOL'):
-            print(f'{g.numLine:<4d} {g.lexeme:<15s} {token:<15s}')
-            g.tableOfSymb[len(g.tableOfSymb) + 1] = (g.numLine, g.lexeme, token, '')
+
+class Lexer:
+    """Lexical analyzer that keeps its state and tables in the instance.
+
+    Every Lexer is independent, so several of them can run at the same
+    time in different threads. The module-level start() runs one Lexer and
+    publishes its results into lexer.globals for the parser and translators.
+    Messages go to diag, the shared diagnostics by default. With compact
+    the symbol table is a TokenTable over the source, which keeps token
+    offsets and only slices identifier and constant lexemes on demand.
+
+    Lexemes are tracked as offsets into sourceCode: lexemeStart is where
+    the current lexeme begins, lexeme only holds the unfinished one left
+    at the end of the source. tableOfKind holds the kind (lexer.kinds) of
+    every entry of tableOfSymb, indexed by the same entry numbers.
+    """
+
+    def __init__(self, diag=None, compact=False):
+        self.diag = diag if diag is not None else defaultDiag
+        self.compact = compact
+        self.reset()
+
+    def reset(self):
+        self.sourceCode = ""
+        self.numLine = 1
+        self.numChar = -1
+        self.lenCode = 0
+        self.state = initState
+        self.lexeme = ""
+        self.lexemeStart = 0
+        self.char = ""
+        self.tableOfSymb = TokenTable() if self.compact else {}
+        self.tableOfKind = bytearray(1)
+        self.tableOfId = {}
+        self.tableOfConst = {}
+        self.errorCount = 0
+        self.FSuccess = None
+
+    def indexIdConst(self, st, lex):
+        if st == 2:
+            if lex not in self.tableOfId:
+                self.tableOfId[lex] = len(self.tableOfId) + 1
+            return self.tableOfId[lex]
+        elif st in (13, 14, 9, 41):
+            if lex not in self.tableOfConst:
+                self.tableOfConst[lex] = len(self.tableOfConst) + 1
+            return self.tableOfConst[lex]
+        return -1
+
+    def makeToken(self, st, lex):
+        # Returns (lexeme, token, index) for the lexeme recognized in the final state st
+        if st == 41:
+            # Closed " for lexeme
+            lex = '"' + lex + '"'
+            return lex, 'STRING', self.indexIdConst(st, lex)
+
+        token = getToken(st, lex)
+
+        # Key words and operators have no index
+        if st in (2, 9, 13, 14) and not (lex in tokenTable and token in ('KEYWORD', 'TYPE', 'BOOL')):
+            return lex, token, self.indexIdConst(st, lex)
+        return lex, token, ''
+
+    def addToken(self, st, begin, end):
+        # Records the lexeme sourceCode[begin:end] recognized in the final state st
+        if st in stateLexemes:
+            lex = stateLexemes[st]
+        elif st == 41:
+            # Closing " is added by makeToken
+            lex = self.sourceCode[begin:end - 1]
+        elif st > 50:
+            # One-char operators and punctuation
+            lex = self.sourceCode[begin]
         else:
-            # Identifiers and const
-            index = indexIdConst(g.state, g.lexeme)
-            print(f'{g.numLine:<4d} {g.lexeme:<15s} {token:<15s} {index:<5d}')
-            g.tableOfSymb[len(g.tableOfSymb) + 1] = (g.numLine, g.lexeme, token, index)
-
-        g.lexeme = ''
-        if g.state in Fstar:
-            putCharBack()
-        g.state = initState
-
-    # String literals
-    elif g.state == 41:
-        # Closed " for lexeme
-        full_lexeme = '"' + g.lexeme + '"'
-        token = 'STRING'
-        index = indexIdConst(g.state, full_lexeme)
-        print(f'{g.numLine:<4d} {full_lexeme:<15s} {token:<15s} {index:<5d}')
-        g.tableOfSymb[len(g.tableOfSymb) + 1] = (g.numLine, full_lexeme, token, index)
-        g.lexeme = ''
-        g.state = initState
-
-    # Operators (1 - 2 symbols )
-    elif g.state in (21, 22, 24, 26, 27, 29, 30, 34, 51, 52, 53):
-        if g.state not in (22, 27, 30, 34):
-            g.lexeme += g.char
-
-        token = getToken(g.state, g.lexeme)
-        print(f'{g.numLine:<4d} {g.lexeme:<15s} {token:<15s}')
-        g.tableOfSymb[len(g.tableOfSymb) + 1] = (g.numLine, g.lexeme, token, '')
-
-        g.lexeme = ''
-        if g.state in Fstar:
-            putCharBack()
-        g.state = initState
-
-    # Errors
-    elif g.state in Ferror:
-        fail()
-
-def lexer_main():
-    print(f'{"Line":<4s} {"Lexeme":<15s} {"Token":<15s} {"Index":<5s}')
-    print('-' * 50)
+            lex = self.sourceCode[begin:end]
+        lex, token, index = self.makeToken(st, lex)
 
-    try:
-        while g.numChar < g.lenCode - 1:
-            g.char = nextChar()
-            classCh = classOfChar(g.char)
-            g.state = nextState(g.state, classCh)
-
-            if is_final(g.state, F):
-                processing()
-            elif g.state == initState:
-                g.lexeme = ''
+        if self.diag.showTrace:
+            if index == '':
+                self.diag.trace(f'{self.numLine:<4d} {lex:<15s} {token:<15s}')
+            else:
+                self.diag.trace(f'{self.numLine:<4d} {lex:<15s} {token:<15s} {index:<5d}')
+        if self.compact:
+            self.tableOfSymb.append(self.numLine, lex, token, index, begin, end)
+        else:
+            self.tableOfSymb[len(self.tableOfSymb) + 1] = (self.numLine, lex, token, index)
+        self.tableOfKind.append(kindOf(lex, token))
+
+    def processing(self):
+        # New line processing
+        if self.state == 50:
+            self.numLine += 1
+
+        #  Comments processing
+        elif self.state == 33:
+            self.numLine += 1
+
+        # Identifiers and const
+        elif self.state in (2, 9, 13, 14):
+            putCharBack(self)
+            self.addToken(self.state, self.lexemeStart, self.numChar + 1)
+
+        # String literals
+        elif self.state == 41:
+            self.addToken(self.state, self.lexemeStart, self.numChar + 1)
+
+        # Operators (1 - 2 symbols )
+        elif self.state in (21, 22, 24, 26, 27, 29, 30, 34, 51, 52, 53):
+            if self.state in Fstar:
+                putCharBack(self)
+            self.addToken(self.state, self.lexemeStart, self.numChar + 1)
+
+        # Errors
+        elif self.state in Ferror:
+            fail(self)
+
+        self.state = initState
+        self.lexemeStart = self.numChar + 1
+
+    def lexer_main(self):
+        self.diag.trace(f'{"Line":<4s} {"Lexeme":<15s} {"Token":<15s} {"Index":<5s}')
+        self.diag.trace('-' * 50)
+
+        try:
+            while self.numChar < self.lenCode - 1:
+                self.char = nextChar(self)
+                classCh = classOfChar(self.char)
+                self.state = nextState(self.state, classCh)
+
+                if is_final(self.state, F):
+                    self.processing()
+                elif self.state == initState:
+                    self.lexemeStart = self.numChar + 1
+
+            # The unfinished lexeme at the end of the source
+            if self.state != initState:
+                self.lexeme = self.sourceCode[self.lexemeStart:]
+            self.lexer_summary()
+
+        except SystemExit as e:
+            self.diag.error('\n' + '=' * 50)
+            self.diag.error(f'Lexer: Crashing the program with code {e}')
+            self.FSuccess = ('Lexer', False)
+
+    def lexer_main_dfa(self):
+        # Same automaton as lexer_main, driven by the dense tables of denseDfa
+        self.lexer_main_scanned(denseDfa.scan)
+
+    def lexer_main_regex(self):
+        # Whole lexemes are recognized at once by the master pattern
+        self.lexer_main_scanned(masterPattern.scan)
+
+    def lexer_main_numpy(self):
+        # Lexeme starts are found by a vectorized pass over the char classes
+        self.lexer_main_scanned(vectorScanner.scan)
+
+    def lexer_main_scanned(self, scan):
+        # Processes the final states found by scan(source) in one pass
+        self.diag.trace(f'{"Line":<4s} {"Lexeme":<15s} {"Token":<15s} {"Index":<5s}')
+        self.diag.trace('-' * 50)
+
+        try:
+            source = self.sourceCode
+            finals, state, pending = scan(source)
+
+            for i in range(0, len(finals), 3):
+                st, begin, end = finals[i], finals[i + 1], finals[i + 2]
+
+                # New line and comments
+                if st == 50 or st == 33:
+                    self.numLine += 1
+
+                # Errors consume the char that caused them
+                elif st in Ferror:
+                    self.char = source[end - 1]
+                    self.state = st
+                    fail(self)
+
+                else:
+                    self.addToken(st, begin, end)
+
+            # The unfinished lexeme is left as lexer_main leaves it
+            self.state = state
+            self.lexeme = source[pending:] if state != initState else ''
+            self.lexemeStart = pending
+            self.char = source[-1:]
+            self.numChar = self.lenCode - 1
+            self.lexer_summary()
+
+        except SystemExit as e:
+            self.diag.error('\n' + '=' * 50)
+            self.diag.error(f'Lexer: Crashing the program with code {e}')
+            self.FSuccess = ('Lexer', False)
+
+    def lexer_main_parallel(self, engine, workers, chunkSize):
+        """Lexes the source in chunks of about chunkSize chars, split after
+        new lines, in a pool of workers processes (None: one per CPU).
+
+        Every chunk is lexed from the initial state and line 1 by the engine,
+        then the tables are stitched together in source order: lines are
+        shifted and the indices of tableOfId/tableOfConst renumbered, so the
+        result is the same as lexing the whole source at once. A chunk that
+        does not really start in the initial state (a string literal or a
+        comment of the previous chunk goes on in it) or that has lexical
+        errors is lexed again here, from the start of the unfinished lexeme
+        and with the right line number, so error messages do not change.
+        """
+        source = self.sourceCode
+        bounds = []
+        begin = 0
+        while begin < self.lenCode:
+            end = source.find('\n', begin + chunkSize) + 1 or self.lenCode
+            bounds.append((begin, end))
+            begin = end
+
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with ProcessPoolExecutor(workers, initializer=gc.disable) as pool:
+                parts = pool.map(lexChunk, [source[begin:end] for begin, end in bounds],
+                                 [engine] * len(bounds), chunksize=len(bounds) // (4 * (workers or os.cpu_count() or 1)) + 1)
+
+                # Errors of a chunk are reported by this Lexer, other messages are not repeated
+                relexDiag = Diagnostics(min(self.diag.level, ERROR), self.diag.sink)
+                pending = None    # Start of the lexeme left unfinished by the previous chunk
+                for (begin, end), part in zip(bounds, parts):
+                    if pending is not None or part[7]:
+                        if pending is not None:
+                            begin = pending
+                        part = lexChunk(source[begin:end], engine, relexDiag, self.numLine)
+                    lineBase = self.numLine - part[8]
+                    self.stitch(part, begin, lineBase)
+                    self.numLine = part[4] + lineBase
+                    pending = begin + part[6] if part[5] != initState else None
+        finally:
+            if enabled:
+                gc.enable()
+
+        # The unfinished lexeme is left as lexer_main leaves it
+        self.state = initState if pending is None else part[5]
+        self.lexemeStart = self.lenCode if pending is None else pending
+        self.lexeme = source[self.lexemeStart:]
+        self.char = source[-1:]
+        self.numChar = self.lenCode - 1
+        self.lexer_summary()
+
+    def stitch(self, part, offset, lineBase):
+        # Appends the tokens of a chunk lexed by lexChunk() that starts at
+        # offset of the source, with lines shifted by lineBase
+        table, kinds, ids, consts = part[:4]
+        self.errorCount += part[7]
+
+        # Indices of the chunk -> indices of this Lexer, in order of first use
+        idMap = [0] + [self.indexIdConst(2, lex) for lex in ids]
+        constMap = [0] + [self.indexIdConst(13, lex) for lex in consts]
+
+        # Index maps of the token names, IDENTIFIER indices are in tableOfId
+        maps = [idMap if name == 'IDENTIFIER' else constMap for name in table.tokenNames]
+        names = table.tokenNames
+        symb = self.tableOfSymb
+        num = len(symb)
+        for i, (line, code, index) in enumerate(zip(table.lines, table.tokens, table.indices), 1):
+            line += lineBase
+            index = maps[code][index] if index else ''
+            if self.compact:
+                begin, end = table.span(i)
+                symb.append(line, table.lexeme(i), names[code], index, begin + offset, end + offset)
             else:
-                g.lexeme += g.char
+                symb[num + i] = (line, table.lexeme(i), names[code], index)
+        self.tableOfKind += memoryview(kinds)[1:]
 
-        print('\n' + '=' * 50)
-        if g.errorCount == 0:
-            print('Lexer: Lexical analysis completed SUCCESSFULLY')
-            g.FSuccess = ('Lexer', True)
+    def edit(self, offset, removed, inserted):
+        """Replaces removed chars of the source at offset with the inserted
+        text and lexes again only the part of the source the edit can change.
+
+        Lexing starts after the last token that ends before the edit and
+        stops at the first token past the edit that ends where an old token
+        ended: the automaton is back in the initial state at the same place
+        of the same text, so the old tokens after it are kept, moved by the
+        size of the edit. New identifiers and constants get new indices, the
+        old ones keep theirs. Needs a compact Lexer; a source with lexical
+        errors is lexed again as a whole, since the old errors are not kept.
+
+        Returns (num, count, newCount, lineShift): the entries num..num+count-1
+        of tableOfSymb were replaced with newCount entries, and the lines of
+        the entries after them moved by lineShift.
+        """
+        if not self.compact:
+            raise ValueError('incremental lexing needs a compact Lexer')
+        old = self.sourceCode
+        if not 0 <= offset <= offset + removed <= len(old):
+            raise ValueError(f'edit of {removed} chars at {offset} is outside of the source')
+
+        source = old[:offset] + inserted + old[offset + removed:]
+        shift = len(inserted) - removed
+        table = self.tableOfSymb
+        oldCount = len(table)
+        oldLine = self.numLine
+        oldState, oldLexeme = self.state, self.lexeme
+
+        if self.errorCount:
+            self.reset()
+            self.sourceCode = source
+            self.lenCode = len(source)
+            self.tableOfSymb = TokenTable(source)
+            self.lexer_main_dfa()
+            return 1, oldCount, len(self.tableOfSymb), self.numLine - oldLine
+
+        # Tokens that end before the edit stay, their lookahead is not edited
+        first = table.endsBefore(offset)
+        pos = table.span(first)[1] if first else 0
+        line = table[first][0] if first else 1
+        editEnd = offset + len(inserted)
+        last = first          # Old entry compared with the new tokens
+        synced = False
+
+        tokens = TokenTable(source)
+        kinds = bytearray()
+        window = 256
+        while not synced:
+            limit = min(editEnd + window, len(source))
+            finals, state, pending = denseDfa.scan(source[pos:limit])
+            self.numLine = line
+            for i in range(0, len(finals), 3):
+                st, begin, end = finals[i], pos + finals[i + 1], pos + finals[i + 2]
+
+                if st == 50 or st == 33:
+                    self.numLine += 1
+
+                elif st in Ferror:
+                    self.char = source[end - 1]
+                    self.state = st
+                    fail(self)
+
+                else:
+                    lex = source[begin:end - 1] if st == 41 else source[begin:end]
+                    lex, token, index = self.makeToken(st, lex)
+                    tokens.append(self.numLine, lex, token, index, begin, end)
+                    kinds.append(kindOf(lex, token))
+
+                    # In step again with the old token that ended at the same place
+                    if end >= editEnd and end - shift >= offset + removed:
+                        last = table.endsBefore(end - shift, last)
+                        if last < oldCount and table.span(last + 1)[1] == end - shift:
+                            synced = True
+                            break
+
+            if synced or limit == len(source):
+                break
+
+            # The window ends in the middle of a lexeme: go on from the last
+            # boundary with a bigger one
+            if len(finals):
+                pos += finals[-1]
+                line = self.numLine
+            window *= 2
+
+        if synced:
+            count = last + 1 - first
+            lineShift = self.numLine - table[last + 1][0]
+            self.numLine = oldLine + lineShift
+            self.state, self.lexeme = oldState, oldLexeme
+            self.lexemeStart += shift
         else:
-            print(f'Lexer: Lexical analysis completed with {g.errorCount} errors')
-            g.FSuccess = ('Lexer', False)
-
-    except SystemExit as e:
-        print('\n' + '=' * 50)
-        print(f'Lexer: Crashing the program with code {e}')
-        g.FSuccess = ('Lexer', False)
-
-def start(file_path):
-    # Resetting global variables
-    g.numLine = 1
-    g.numChar = -1
-    g.state = 0
-    g.lexeme = ""
-    g.char = ""
-    g.tableOfSymb = {}
-    g.tableOfId = {}
-    g.tableOfConst = {}
-    g.errorCount = 0
-    g.FSuccess = None
+            count = oldCount - first
+            lineShift = 0
+            self.state = state
+            self.lexemeStart = pos + pending
+            self.lexeme = source[self.lexemeStart:] if state != initState else ''
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            g.sourceCode = f.read()
-            g.lenCode = len(g.sourceCode)
-    except FileNotFoundError:
-        print(f'ERROR: File "{file_path}" not found')
-        return False
-
-    print(f'\n{"=" * 60}')
-    print(f'Lexical analysis of the file: {file_path}')
-    print(f'{"=" * 60}\n')
-
-    lexer_main()
-
-    print('\n' + '=' * 50)
-    print('DISASSEMBLY TABLE:')
-    print(f'{"№":<4s} {"Line":<7s} {"Lexeme":<15s} {"Token":<15s} {"Index":<5s}')
-    print('-' * 50)
-    for num, (line, lex, tok, idx) in g.tableOfSymb.items():
-        idx_str = str(idx) if idx != '' else ''
-        print(f'{num:<4d} {line:<7d} {lex:<15s} {tok:<15s} {idx_str:<5s}')
-
-    print('\n' + '=' * 50)
-    print('TABLE OF IDENTIFIERS:')
-    print(f'{"Identifier":<20s} {"Index":<5s}')
-    print('-' * 30)
-    for ident, idx in g.tableOfId.items():
-        print(f'{ident:<20s} {idx:<5d}')
-
-    print('\n' + '=' * 50)
-    print('TABLE OF CONST:')
-    print(f'{"Const":<20s} {"Index":<5s}')
-    print('-' * 30)
-    for const, idx in g.tableOfConst.items():
-        print(f'{const:<20s} {idx:<5d}')
-
-    return g.FSuccess[1] if g.FSuccess else False
+        table.source = source
+        table.splice(first + 1, count, tokens, lineShift, shift)
+        self.tableOfKind[first + 1:first + 1 + count] = kinds
+        self.sourceCode = source
+        self.lenCode = len(source)
+        self.char = source[-1:]
+        self.numChar = self.lenCode - 1
+        self.lexer_summary()
+        return first + 1, count, len(tokens), lineShift
+
+    def lexer_summary(self):
+        self.diag.info('\n' + '=' * 50)
+        if self.errorCount == 0:
+            self.diag.info('Lexer: Lexical analysis completed SUCCESSFULLY')
+            self.FSuccess = ('Lexer', True)
+        else:
+            self.diag.info(f'Lexer: Lexical analysis completed with {self.errorCount} errors')
+            self.FSuccess = ('Lexer', False)
+
+    def streamTokens(self, file_path, chunkSize=1 << 16):
+        """Lexes the file chunk by chunk and yields (line, lexeme, token, index).
+
+        Only the current chunk and the unfinished lexeme are held in memory,
+        tableOfSymb stays empty; tableOfId, tableOfConst, errorCount and
+        FSuccess are filled as with start(). A lexeme that crosses a chunk
+        boundary is carried over together with the automaton state.
+        """
+        self.reset()
+        state = initState
+        carry = []    # Parts of the unfinished lexeme from previous chunks
+
+        try:
+            f = open(file_path, 'r', encoding='utf-8')
+        except FileNotFoundError:
+            self.diag.error(f'ERROR: File "{file_path}" not found')
+            return
+
+        with f:
+            while True:
+                chunk = f.read(chunkSize)
+                if not chunk:
+                    break
+
+                finals, state, pending = denseDfa.scan(chunk, 0, state, 0)
+
+                for i in range(0, len(finals), 3):
+                    st, begin, end = finals[i], finals[i + 1], finals[i + 2]
+
+                    # The first lexeme finished in this chunk may start in the previous ones
+                    if carry:
+                        head = ''.join(carry)
+                        carry = []
+                    else:
+                        head = ''
+
+                    if st == 50 or st == 33:
+                        self.numLine += 1
+
+                    elif st in Ferror:
+                        self.char = (head + chunk[begin:end])[-1]
+                        self.state = st
+                        fail(self)
+
+                    else:
+                        lex = head + chunk[begin:end - 1 if st == 41 else end]
+                        lex, token, index = self.makeToken(st, lex)
+                        yield self.numLine, lex, token, index
+
+                # Comments are not kept, their text is never needed
+                if state == 32:
+                    carry = []
+                elif state != initState:
+                    carry.append(chunk[pending:])
+
+        self.state = state
+        self.lexeme = ''.join(carry)
+        self.lexer_summary()
+
+    def printTables(self):
+        # Symbol, identifier and constant tables as a trace
+        trace = self.diag.trace
+        trace('\n' + '=' * 50)
+        trace('DISASSEMBLY TABLE:')
+        trace(f'{"№":<4s} {"Line":<7s} {"Lexeme":<15s} {"Token":<15s} {"Index":<5s}')
+        trace('-' * 50)
+        for num, (line, lex, tok, idx) in self.tableOfSymb.items():
+            idx_str = str(idx) if idx != '' else ''
+            trace(f'{num:<4d} {line:<7d} {lex:<15s} {tok:<15s} {idx_str:<5s}')
+
+        trace('\n' + '=' * 50)
+        trace('TABLE OF IDENTIFIERS:')
+        trace(f'{"Identifier":<20s} {"Index":<5s}')
+        trace('-' * 30)
+        for ident, idx in self.tableOfId.items():
+            trace(f'{ident:<20s} {idx:<5d}')
+
+        trace('\n' + '=' * 50)
+        trace('TABLE OF CONST:')
+        trace(f'{"Const":<20s} {"Index":<5s}')
+        trace('-' * 30)
+        for const, idx in self.tableOfConst.items():
+            trace(f'{const:<20s} {idx:<5d}')
+
+    def start(self, file_path, engine='classic', workers=1, chunkSize=1 << 20):
+        # With workers other than 1, a source longer than chunkSize is lexed
+        # in chunks by that many processes, see lexer_main_parallel
+        self.reset()
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                self.sourceCode = f.read()
+                self.lenCode = len(self.sourceCode)
+        except FileNotFoundError:
+            self.diag.error(f'ERROR: File "{file_path}" not found')
+            return False
+
+        if self.compact:
+            self.tableOfSymb = TokenTable(self.sourceCode)
+
+        if engine not in engines:
+            self.diag.error(f'ERROR: Unknown lexer engine "{engine}", use one of: {", ".join(engines)}')
+            return False
+
+        self.diag.info(f'\n{"=" * 60}')
+        self.diag.info(f'Lexical analysis of the file: {file_path}')
+        self.diag.info(f'{"=" * 60}\n')
+
+        key = cache.sourceKey(self.sourceCode, self.compact) if cache.directory is not None else None
+        if key is not None and cache.load(self, key):
+            self.diag.info('Lexer: tokens loaded from the cache')
+            self.lexer_summary()
+        else:
+            if workers != 1 and self.lenCode > chunkSize and not self.diag.showTrace:
+                self.lexer_main_parallel(engine, workers, chunkSize)
+            else:
+                engines[engine](self)
+            # Only clean runs are cached, so a hit never hides error messages
+            if key is not None and self.FSuccess and self.FSuccess[1]:
+                cache.store(self, key)
+
+        if self.diag.showTrace:
+            self.printTables()
+
+        return self.FSuccess[1] if self.FSuccess else False
+
+
+# Lexer engines that can be selected in start()
+engines = {
+    'classic': Lexer.lexer_main,
+    'dfa': Lexer.lexer_main_dfa,
+    'regex': Lexer.lexer_main_regex,
+}
+if vectorScanner is not None:
+    engines['numpy'] = Lexer.lexer_main_numpy
+
+def lexChunk(text, engine, diag=None, numLine=1):
+    # Lexes one chunk of a source for Lexer.lexer_main_parallel; returns its
+    # tables and final state as (tableOfSymb, tableOfKind, tableOfId,
+    # tableOfConst, numLine, state, lexemeStart, errorCount, first line)
+    lx = Lexer(diag if diag is not None else Diagnostics(), compact=True)
+    lx.sourceCode = text
+    lx.lenCode = len(text)
+    lx.tableOfSymb = TokenTable(text)
+    lx.numLine = numLine
+    engines[engine](lx)
+    return (lx.tableOfSymb, lx.tableOfKind, lx.tableOfId, lx.tableOfConst,
+            lx.numLine, lx.state, lx.lexemeStart, lx.errorCount, numLine)
+
+def publish(lx):
+    # Makes the results of lx visible to the users of lexer.globals
+    for name in ('sourceCode', 'numLine', 'numChar', 'lenCode', 'state', 'lexeme', 'char',
+                 'tableOfSymb', 'tableOfKind', 'tableOfId', 'tableOfConst', 'errorCount', 'FSuccess'):
+        setattr(g, name, getattr(lx, name))
+
+def streamTokens(file_path, chunkSize=1 << 16):
+    # Streams the tokens of a new Lexer, its tables are shared with lexer.globals
+    lx = Lexer()
+    tokens = lx.streamTokens(file_path, chunkSize)
+    publish(lx)
+    for token in tokens:
+        yield token
+    publish(lx)
+
+def start(file_path, engine='classic', compact=False, workers=1):
+    lx = Lexer(compact=compact)
+    success = lx.start(file_path, engine, workers)
+    publish(lx)
+    return success
@@ -1,13 +1,19 @@
 import sys
 from .lexer import start
 from . import globals as g
+from diagnostics import configure, TRACE
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Use: python -m lexer.main <file.joovy>")
+        print("Use: python -m lexer.main <file.joovy> [classic|dfa|regex|numpy]")
         sys.exit(1)
 
-    start(sys.argv[1])
+    # The token tables are what this tool is for
+    configure(TRACE)
+
+    engine = sys.argv[2] if len(sys.argv) > 2 else 'classic'
+    if not start(sys.argv[1], engine) and g.FSuccess is None:
+        sys.exit(1)
 
     if g.errorCount > 0:
         print(f'\nLexer: found {g.errorCount} errors')
@@ -0,0 +1,93 @@
+import re
+from array import array
+
+from .states import initState, Fstar
+
+# One alternative per kind of lexeme, leading whitespace is skipped as part
+# of the match. Order matters: '//' before '/', two-char operators before
+# '=', '<', '>' and '!', numbers before the lone '.'
+MASTER = re.compile(r'''
+    [ \t]*
+    (?:
+        (?P<nl>\n)
+      | (?P<comment>//[^\n]*\n?)
+      | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<float>[0-9]+\.[0-9]*|\.[0-9]+)
+      | (?P<int>[0-9]+)
+      | (?P<string>"[^"]*"?)
+      | (?P<op>==|!=|<=|>=|[=<>/+\-*^(){}\[\],;])
+      | (?P<bang>![\s\S]?)
+      | (?P<dot>\.[\s\S]?)
+      | (?P<error>[^ \t])
+    )
+''', re.VERBOSE)
+
+NL, COMMENT, IDENT, FLOAT, INT, STRING, OP, BANG, DOT, ERROR = range(1, 11)
+
+# Final state of the automaton reached by every operator
+opStates = {
+    '==': 21, '=': 22, '!=': 24, '<=': 26, '<': 27, '>=': 29, '>': 30, '/': 34,
+    '+': 51, '-': 51, '*': 51, '^': 51,
+    '(': 52, ')': 52, '{': 52, '}': 52, '[': 52, ']': 52,
+    ',': 53, ';': 53,
+}
+
+
+class MasterPattern:
+    """Bulk tokenizer that recognizes whole lexemes with one compiled regex.
+
+    scan() returns the same (state, lexemeStart, lexemeEnd) triples as
+    DenseDfa.scan, so both engines feed the same token processing. The
+    automaton is only replayed over the unfinished lexeme at the end of the
+    text to report the state it stopped in.
+    """
+
+    def __init__(self, dfa):
+        self.dfa = dfa
+
+    def scan(self, text):
+        finals = array('i')
+        emit = finals.extend
+        size = len(text)
+        begin = size
+
+        for m in MASTER.finditer(text):
+            kind = m.lastindex
+            begin, end = m.span(kind)
+
+            if kind == IDENT:
+                st = 2
+            elif kind == OP:
+                st = opStates[text[begin:end]]
+            elif kind == NL:
+                st = 50
+            elif kind == INT:
+                st = 13
+            elif kind == FLOAT:
+                st = 9 if text[end - 1] == '.' else 14
+            elif kind == COMMENT:
+                if text[end - 1] != '\n':
+                    break
+                st = 33
+            elif kind == STRING:
+                if end - begin == 1 or text[end - 1] != '"':
+                    break
+                st = 41
+            elif kind == ERROR:
+                st = 101
+            else:
+                # '!' or '.' followed by the char that makes them an error
+                if end - begin == 1:
+                    break
+                st = 102 if kind == BANG else 101
+
+            # Fstar lexemes are only complete when a char follows them
+            if st in Fstar and end == size:
+                break
+
+            emit((st, begin, end))
+            begin = size
+
+        # Unfinished lexeme at the end of the text
+        _, state, start = self.dfa.scan(text, begin, initState, begin)
+        return finals, state, start
@@ -0,0 +1,212 @@
+import sys
+from array import array
+from bisect import bisect_left
+from itertools import repeat
+from operator import add
+
+
+class TokenTable:
+    """Compact symbol table stored as parallel arrays.
+
+    Lines, token names, lexemes and indices of the constants and
+    identifiers live in one array each; token names and lexemes are
+    interned, so a token costs a few machine integers instead of a dict
+    entry holding a 4-tuple. Reading works like the dict {num: (line,
+    lexeme, token, index)} the lexer builds by default, with numbers
+    starting at 1, so the parser and translators use it unchanged.
+
+    Given the source, the table also keeps the (start, end) offsets of every
+    token. Only key words, operators and punctuation are then stored as
+    interned lexemes; lexemes of identifiers and constants are sliced out
+    of the source when they are read.
+
+    After splice(), the entries behind the spliced ones may still miss the
+    shift of their lines and offsets: from entry index gap on, gapLine and
+    gapOffset are added when an entry is read. The next splice only moves
+    the gap to its own place, so a series of nearby edits does not touch
+    the rest of the table.
+    """
+
+    def __init__(self, source=None):
+        self.source = source
+        self.starts = array('q')
+        self.ends = array('q')
+        self.gap = sys.maxsize
+        self.gapLine = 0
+        self.gapOffset = 0
+
+        self.lines = array('i')
+        self.tokens = array('B')      # Codes of token names
+        self.lexemes = array('i')     # Codes of lexemes, -1 if sliced from the source
+        self.indices = array('i')     # Index in tableOfId/tableOfConst, 0 if none
+
+        self.tokenNames = []
+        self.tokenCodes = {}
+        self.lexemeList = []
+        self.lexemeCodes = {}
+
+    def tokenCode(self, token):
+        code = self.tokenCodes.get(token)
+        if code is None:
+            code = self.tokenCodes[token] = len(self.tokenNames)
+            self.tokenNames.append(token)
+        return code
+
+    def lexemeCode(self, lexeme):
+        code = self.lexemeCodes.get(lexeme)
+        if code is None:
+            code = self.lexemeCodes[lexeme] = len(self.lexemeList)
+            self.lexemeList.append(lexeme)
+        return code
+
+    def append(self, line, lexeme, token, index, start=0, end=0):
+        code = self.tokenCode(token)
+
+        if self.source is not None:
+            self.starts.append(start)
+            self.ends.append(end)
+
+        # Identifiers and constants have an index and are read back from the source
+        if self.source is not None and index != '':
+            lexCode = -1
+        else:
+            lexCode = self.lexemeCode(lexeme)
+
+        self.lines.append(line)
+        self.tokens.append(code)
+        self.lexemes.append(lexCode)
+        self.indices.append(index if index != '' else 0)
+
+    def moveGap(self, i):
+        # Adds the shifts to the entries between the gap and index i, the
+        # entries from i on keep them to add
+        gap, n = self.gap, len(self.lines)
+        if gap < i:
+            self.shift(gap, i, self.gapLine, self.gapOffset)
+        elif i < gap:
+            self.shift(i, min(gap, n), -self.gapLine, -self.gapOffset)
+        self.gap = i
+
+    def shift(self, i, j, lineShift, offsetShift):
+        if lineShift:
+            self.lines[i:j] = array('i', map(add, self.lines[i:j], repeat(lineShift)))
+        if offsetShift and self.source is not None:
+            self.starts[i:j] = array('q', map(add, self.starts[i:j], repeat(offsetShift)))
+            self.ends[i:j] = array('q', map(add, self.ends[i:j], repeat(offsetShift)))
+
+    def splice(self, num, count, other, lineShift=0, offsetShift=0):
+        """Replaces the entries num..num+count-1 with the entries of the
+        table other over the same source. The lines and offsets of the
+        entries after them are moved by lineShift and offsetShift."""
+        i, j = num - 1, num - 1 + count
+        self.moveGap(j)
+        self.gapLine += lineShift
+        self.gapOffset += offsetShift
+
+        tokens = [self.tokenCode(name) for name in other.tokenNames]
+        lexemes = [self.lexemeCode(lexeme) for lexeme in other.lexemeList]
+        self.lines[i:j] = other.lines
+        self.tokens[i:j] = array('B', [tokens[code] for code in other.tokens])
+        self.lexemes[i:j] = array('i', [lexemes[code] if code >= 0 else -1 for code in other.lexemes])
+        self.indices[i:j] = other.indices
+        if self.source is not None:
+            self.starts[i:j] = other.starts
+            self.ends[i:j] = other.ends
+        self.gap = i + len(other)
+
+    def endsBefore(self, offset, lo=0):
+        """Number of entries that end before offset, the first lo included"""
+        gap = self.gap
+        if lo < gap:
+            i = bisect_left(self.ends, offset, lo, min(gap, len(self.ends)))
+            if i < gap:
+                return i
+            lo = gap
+        return bisect_left(self.ends, offset - self.gapOffset, lo)
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __contains__(self, num):
+        return isinstance(num, int) and 1 <= num <= len(self.lines)
+
+    def __getitem__(self, num):
+        if not isinstance(num, int) or num < 1:
+            raise KeyError(num)
+        i = num - 1
+        try:
+            index = self.indices[i]
+        except IndexError:
+            raise KeyError(num) from None
+        line = self.lines[i]
+        if i >= self.gap:
+            line += self.gapLine
+        return (line, self.lexeme(num),
+                self.tokenNames[self.tokens[i]], index if index else '')
+
+    def lexeme(self, num):
+        """Lexeme of the token num, sliced from the source if it is not stored"""
+        i = num - 1
+        code = self.lexemes[i]
+        if code >= 0:
+            return self.lexemeList[code]
+
+        start, end = self.starts[i], self.ends[i]
+        if i >= self.gap:
+            start += self.gapOffset
+            end += self.gapOffset
+        text = self.source[start:end]
+        if self.tokenNames[self.tokens[i]] == 'STRING':
+            # The lexer records string literals with a doubled opening "
+            return '"' + text
+        return text
+
+    def span(self, num):
+        """(start, end) offsets of the token num in the source"""
+        i = num - 1
+        if i >= self.gap:
+            return self.starts[i] + self.gapOffset, self.ends[i] + self.gapOffset
+        return self.starts[i], self.ends[i]
+
+    def get(self, num, default=None):
+        return self[num] if num in self else default
+
+    def __iter__(self):
+        return iter(range(1, len(self.lines) + 1))
+
+    def keys(self):
+        return range(1, len(self.lines) + 1)
+
+    def values(self):
+        for num in self.keys():
+            yield self[num]
+
+    def items(self):
+        for num in self.keys():
+            yield num, self[num]
+
+
+class TokenRing:
+    """The last entries of a token stream, indexed by entry number.
+
+    Entry num lives in slot num % size of a fixed list, so a reader that
+    pulls tokens from a lexer iterator keeps only the newest size entries,
+    however long the stream is. The size is a power of two.
+    """
+
+    __slots__ = ('slots', 'mask')
+
+    def __init__(self, size, fill=None):
+        if size & (size - 1):
+            raise ValueError(f'ring size {size} is not a power of two')
+        self.slots = [fill] * size
+        self.mask = size - 1
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __getitem__(self, num):
+        return self.slots[num & self.mask]
+
+    def __setitem__(self, num, value):
+        self.slots[num & self.mask] = value
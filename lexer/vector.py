@@ -0,0 +1,143 @@
+from array import array
+
+import numpy as np
+
+from .dfa import ACT_INIT, ACT_FINAL, ACT_RETRACT
+from .states import initState
+
+
+class VectorScanner:
+    """Tokenizer that classifies the whole source with NumPy first.
+
+    The class of every char comes from one table lookup over the source,
+    and the positions where a lexeme can start (the first char of a run of
+    letters and digits, and every char that is neither whitespace nor part
+    of such a run) are found with vectorized comparisons of neighbouring
+    classes. Python code then only runs once per lexeme: identifiers end
+    where their run ends, one-char lexemes are known from their class,
+    strings and comments are closed with str.find, and only the remaining
+    lexemes (numbers, operators of one or two chars, errors) are driven
+    through the dense automaton char by char.
+
+    scan() returns the same (state, lexemeStart, lexemeEnd) triples as
+    DenseDfa.scan.
+    """
+
+    def __init__(self, dfa):
+        self.dfa = dfa
+        names = dfa.classNames
+        start = dfa.delta[initState]
+
+        self.letter = names.index('Letter')
+        self.quote = names.index('dquote')
+        self.slash = names.index('/')
+
+        # class -> final state of a lexeme of one char, 0 for the others
+        self.single = bytes(st if dfa.action[st] == ACT_FINAL else 0 for st in start)
+
+        # class -> char belongs to a run of letters and digits / is whitespace
+        self.isWord = np.array([name in ('Letter', 'Digit', 'exp') for name in names])
+        self.isSpace = np.array([start[c] == initState for c in range(len(names))])
+
+    def candidates(self, classes):
+        """Positions where a lexeme can start, and the end of the run of
+        letters and digits that starts there (position + 1 for other chars)"""
+        cls = np.frombuffer(classes, np.uint8)
+        word = self.isWord[cls]
+
+        prevWord = np.empty_like(word)
+        prevWord[:1] = False
+        prevWord[1:] = word[:-1]
+        nextWord = np.empty_like(word)
+        nextWord[-1:] = False
+        nextWord[:-1] = word[1:]
+
+        runStart = word & ~prevWord
+        starts = np.flatnonzero(runStart | ~(word | self.isSpace[cls]))
+        ends = starts + 1
+        ends[runStart[starts]] = np.flatnonzero(word & ~nextWord) + 1
+        return starts.tolist(), ends.tolist()
+
+    def scan(self, text):
+        dfa = self.dfa
+        delta = dfa.delta
+        action = dfa.action
+        single = self.single
+        letter, quote, slash = self.letter, self.quote, self.slash
+        isWord = self.isWord.tolist()
+
+        classes = dfa.classify(text)
+        starts, runEnds = self.candidates(classes)
+        finals = array('i')
+        emit = finals.extend
+        size = len(text)
+        count = len(starts)
+        k = 0
+        pos = 0
+        inRun = False
+
+        while True:
+            # A lexeme ended inside a run of letters and digits (a number
+            # followed by letters, an error that took a letter): the rest of
+            # the run is not a candidate and starts the next lexeme
+            if inRun:
+                inRun = False
+                begin = pos
+                runEnd = begin + 1
+                while runEnd < size and isWord[classes[runEnd]]:
+                    runEnd += 1
+            else:
+                while k < count and starts[k] < pos:
+                    k += 1
+                if k == count:
+                    break
+                begin = starts[k]
+                runEnd = runEnds[k]
+                k += 1
+
+            cls = classes[begin]
+            st = single[cls]
+
+            if st:
+                pos = begin + 1
+                emit((st, begin, pos))
+
+            elif cls == letter:
+                # Identifiers and key words are only complete when a char follows them
+                if runEnd == size:
+                    return finals, delta[initState][cls], begin
+                pos = runEnd
+                emit((2, begin, pos))
+
+            elif cls == quote:
+                end = text.find('"', begin + 1)
+                if end < 0:
+                    return finals, delta[initState][cls], begin
+                pos = end + 1
+                emit((41, begin, pos))
+
+            elif cls == slash and text.startswith('//', begin):
+                end = text.find('\n', begin + 2)
+                if end < 0:
+                    return finals, delta[delta[initState][cls]][cls], begin
+                pos = end + 1
+                emit((33, begin, pos))
+
+            else:
+                # Numbers, operators and errors
+                state = initState
+                pos = begin
+                while pos < size:
+                    state = delta[state][classes[pos]]
+                    pos += 1
+                    act = action[state]
+                    if act > ACT_INIT:
+                        if act == ACT_RETRACT:
+                            pos -= 1
+                        emit((state, begin, pos))
+                        inRun = pos < size and isWord[classes[pos]] and isWord[classes[pos - 1]]
+                        break
+                else:
+                    return finals, state, begin
+
+        return finals, initState, size
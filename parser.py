@@ -1,10 +1,26 @@
-from lexer.lexer import start as lex_start
+import gc
+import os
+from concurrent.futures import ProcessPoolExecutor
+from lexer.lexer import start as lex_start, Lexer
 from lexer import globals as g
+from lexer.tokens import TokenRing
+from lexer.kinds import *
+from astnodes import *
+from diagnostics import diag, configure, SILENT
 
 tableOfSymb = {}      # Character table from lexer
+tableOfKind = bytearray(1)  # Token kinds of the entries (lexer.kinds)
 numRow = 0            # Current record number in the table
 len_tableOfSymb = 0   # Total number of records
+tokenStream = None    # Stream mode: iterator of the tokens not read yet
+ringAhead = 0         # Stream mode: tokens read ahead of numRow
+streamLexer = None    # Stream mode: Lexer that produces the tokens
 indent_level = 0      # Indentation level for output
+blockStack = []       # Open blocks [(Block, closer, node)], innermost last
+recovering = False    # Go on after a syntax error (recovery mode)
+parseErrors = []      # Errors of the recovery mode [(line, error_type, info)]
+parsedFunctions = {}  # Parallel mode: {entry number of a 'def': (FuncDecl, entries)}
+lazyFunctions = False # Lazy mode: function bodies are only recorded
 step_indent = 2       # Step indentation
 
 
@@ -28,365 +44,467 @@ def getSymb():
     # Gets the current entry from the character table
     global numRow, tableOfSymb
     if numRow <= len_tableOfSymb:
-        numLine, lexeme, token, _ = tableOfSymb[numRow]
-        return numLine, lexeme, token
-    return None, None, None
+        numLine, lexeme, _, _ = tableOfSymb[numRow]
+        return numLine, lexeme, tableOfKind[numRow]
+    return None, None, NONE
 
 
 def nextSymb():
     # Moves to the next character
     global numRow
     numRow += 1
+    if numRow > len_tableOfSymb and tokenStream is not None:
+        pullTokens()
+
+
+def pullTokens():
+    # Stream mode: reads the next entries into the rings, up to ringAhead past numRow
+    global len_tableOfSymb, tokenStream
+    limit = numRow + ringAhead
+    for entry in tokenStream:
+        len_tableOfSymb += 1
+        tableOfSymb[len_tableOfSymb] = entry
+        tableOfKind[len_tableOfSymb] = kindOf(entry[1], entry[2])
+        if len_tableOfSymb >= limit:
+            return
+    tokenStream = None
 
 
 # Errors processing
 def failParse(error_type, info):
+    global recovering
+    if streamLexer is not None and streamLexer.errorCount:
+        # Stream mode: the tokens follow a lexical error, which fails the
+        # program as in the default mode, so parsing just stops
+        recovering = False
+        raise SystemExit(1)
+
     if error_type == 'unexpected_end':
         expected = info
-        print(f'\nParser ERROR: Unexpected program end.')
-        print(f'  Expected: {expected}')
+        diag.error(f'\nParser ERROR: Unexpected program end.')
+        diag.error(f'  Expected: {expected}')
 
     elif error_type == 'token_mismatch':
         numLine, found_lex, found_tok, exp_lex, exp_tok = info
-        print(f'\nParser ERROR: In line {numLine}')
-        print(f'  Found: ({found_lex}, {found_tok})')
-        print(f'  Expected: ({exp_lex}, {exp_tok})')
+        diag.error(f'\nParser ERROR: In line {numLine}')
+        diag.error(f'  Found: ({found_lex}, {found_tok})')
+        diag.error(f'  Expected: ({exp_lex}, {exp_tok})')
 
     elif error_type == 'unexpected_token':
         numLine, lex, tok, expected = info
-        print(f'\nParser ERROR: In line {numLine}')
-        print(f'  Unexpected token: ({lex}, {tok})')
-        print(f'  Expected: {expected}')
+        diag.error(f'\nParser ERROR: In line {numLine}')
+        diag.error(f'  Unexpected token: ({lex}, {tok})')
+        diag.error(f'  Expected: {expected}')
 
     elif error_type == 'invalid_statement':
         numLine, lex, tok = info
-        print(f'\nParser ERROR: In line {numLine}')
-        print(f'  Incorrect instruction: ({lex}, {tok})')
-        print(f'  Expected: variable declaration, function or instruction')
+        diag.error(f'\nParser ERROR: In line {numLine}')
+        diag.error(f'  Incorrect instruction: ({lex}, {tok})')
+        diag.error(f'  Expected: variable declaration, function or instruction')
 
     else:
-        print(f'\nParser ERROR: {error_type}')
-        print(f'  Information: {info}')
+        diag.error(f'\nParser ERROR: {error_type}')
+        diag.error(f'  Information: {info}')
+
+    if recovering:
+        # The end of the program is on the line of the last token
+        numLine = info[0] if error_type in ('token_mismatch', 'unexpected_token', 'invalid_statement') else None
+        if numLine is None and len_tableOfSymb:
+            numLine = tableOfSymb[len_tableOfSymb][0]
+        parseErrors.append((numLine, error_type, info))
 
     raise SystemExit(1)
 
 
 # Parser function
-def parseToken(expected_lex, expected_tok):
-    # Checks whether the current token matches the expected one
+def parseToken(expected):
+    # Checks whether the current token is of the expected kind
     global numRow
 
     indent = nextIndent()
 
     # Checking the end of the table
     if numRow > len_tableOfSymb:
-        failParse('unexpected_end', (expected_lex, expected_tok))
+        failParse('unexpected_end', (lexemeOfKind[expected], tokenOfKind[expected]))
 
-    numLine, lex, tok = getSymb()
+    numLine, lex, kind = getSymb()
 
-    if (lex, tok) == (expected_lex, expected_tok):
-        print(f'{indent}✓ Line {numLine}: ({lex}, {tok})')
+    if kind == expected:
+        if diag.showTrace:
+            diag.trace(f'{indent}✓ Line {numLine}: ({lex}, {tokenOfKind[kind]})')
         nextSymb()
         prevIndent()
         return True
     else:
-        failParse('token_mismatch', (numLine, lex, tok, expected_lex, expected_tok))
+        failParse('token_mismatch', (numLine, lex, tokenOfKind[kind],
+                                     lexemeOfKind[expected], tokenOfKind[expected]))
 
 def parseProgram():
     # Program = {Declaration | Statement}
     indent = nextIndent()
-    print(f'{indent}parseProgram()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseProgram()')
 
     # A program is a sequence of statements and instructions.
-    while numRow <= len_tableOfSymb:
-        numLine, lex, tok = getSymb()
-
-        # End of program
-        if numLine is None:
-            break
-
-        # Variable declaration
-        if tok == 'TYPE':
-            parseVarDecl()
-
-        # Constant declaration
-        elif lex == 'const' and tok == 'KEYWORD':
-            parseConstDecl()
-
-        # Function declaration
-        elif lex == 'def' and tok == 'KEYWORD':
-            parseFuncDecl()
-
-        # Інструкції
-        elif tok == 'IDENTIFIER' or lex in ('if', 'for', 'print', 'input', 'return') or lex == '{':
-            parseStatement()
+    body = []
+    parseStatements(body)
 
+    prevIndent()
+    return Program(1, body)
+
+def parseStatements(body, base=None):
+    # Table-driven LL(1) loop over the statements of a program or a block.
+    # The current token selects the parse function through the FIRST sets in
+    # programTable/statementTable. Compound statements push their block on
+    # blockStack instead of recursing, and '}' pops it; a finished statement
+    # goes to the innermost open block, or to body.
+    # Without base the loop ends before a top-level token that starts nothing,
+    # like the end of the table (only at the end in recovery mode); otherwise
+    # it ends when the block opened at depth base is closed.
+    global indent_level
+    depth = base or 0
+    while True:
+        numLine, lex, kind = getSymb()
+        startRow = numRow
+        startIndent = indent_level
+
+        try:
+            if len(blockStack) > depth:
+                if kind == RBRACE:
+                    block, closer, node = blockStack.pop()
+                    parseToken(RBRACE)
+                    prevIndent()
+                    node = closer(block, node)
+                    if node is None:
+                        # The else block has been opened
+                        continue
+                else:
+                    parse = statementTable[kind]
+                    if parse is None:
+                        failParse('invalid_statement', (numLine, lex, tokenOfKind[kind]))
+                    node = parse()
+                    if node is None:
+                        # Compound statement, its block is open
+                        continue
+            else:
+                parse = programTable[kind]
+                if parse is None:
+                    # Unknown element - end of program, unless the recovery
+                    # mode still has tokens to report
+                    if not recovering or numRow > len_tableOfSymb:
+                        return
+                    failParse('invalid_statement', (numLine, lex, tokenOfKind[kind]))
+                node = parse()
+                if node is None:
+                    continue
+
+        except SystemExit:
+            # Recovery mode: the error is recorded, go on from the next statement
+            if not recovering or numRow > len_tableOfSymb:
+                raise
+            indent_level = startIndent
+            resync(startRow, len(blockStack) > depth)
+            continue
+
+        if len(blockStack) > depth:
+            blockStack[-1][0].body.append(node)
         else:
-            # Unknown element - end of program
+            body.append(node)
+            if base is not None:
+                return
+
+def resync(startRow, inBlock):
+    # Skips the tokens after a syntax error up to one that can start a statement
+    # again: '{', a key word or a type, or the '}' of the open block.
+    # At least one token is skipped if the statement consumed none.
+    global numRow
+    if numRow == startRow:
+        nextSymb()
+    while numRow <= len_tableOfSymb:
+        kind = tableOfKind[numRow]
+        if kind in syncKinds or (kind == RBRACE and inBlock):
             break
-
-    prevIndent()
-    return True
+        nextSymb()
 
 def parseVarDecl():
     #  VarDecl = Type Ident ['=' Expression] {',' Ident ['=' Expression]}
     indent = nextIndent()
-    print(f'{indent}parseVarDecl()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseVarDecl()')
 
     # Type
-    numLine, lex, tok = getSymb()
-    if tok != 'TYPE':
-        failParse('unexpected_token', (numLine, lex, tok, 'TYPE'))
-    print(f'{indent}  Type: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind not in TYPES:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'TYPE'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Type: {lex}')
+    node = VarDecl(numLine, False, lex, [])
     nextSymb()
 
     # Ident
-    numLine, lex, tok = getSymb()
-    if tok != 'IDENTIFIER':
-        failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-    print(f'{indent}  Ident: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind != IDENTIFIER:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Ident: {lex}')
+    name = lex
     nextSymb()
 
     # ['=' Expression]
-    numLine, lex, tok = getSymb()
-    if lex == '=' and tok == 'ASSIGN_OP':
+    value = None
+    numLine, lex, kind = getSymb()
+    if kind == ASSIGN:
         nextSymb()
-        parseExpression()
+        value = parseExpression()
+    node.items.append((name, value))
 
     # {',' Ident ['=' Expression]}
     while True:
-        numLine, lex, tok = getSymb()
-        if lex == ',' and tok == 'COMMA':
+        numLine, lex, kind = getSymb()
+        if kind == COMMA:
             nextSymb()
 
             # Ident
-            numLine, lex, tok = getSymb()
-            if tok != 'IDENTIFIER':
-                failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-            print(f'{indent}  Ident: {lex}')
+            numLine, lex, kind = getSymb()
+            if kind != IDENTIFIER:
+                failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+            if diag.showTrace:
+                diag.trace(f'{indent}  Ident: {lex}')
+            name = lex
             nextSymb()
 
             # ['=' Expression]
-            numLine, lex, tok = getSymb()
-            if lex == '=' and tok == 'ASSIGN_OP':
+            value = None
+            numLine, lex, kind = getSymb()
+            if kind == ASSIGN:
                 nextSymb()
-                parseExpression()
+                value = parseExpression()
+            node.items.append((name, value))
         else:
             break
 
     prevIndent()
-    return True
+    return node
 
 
 def parseConstDecl():
     #  ConstDecl = 'const' Type Ident '=' Const {',' Ident '=' Const}
     indent = nextIndent()
-    print(f'{indent}parseConstDecl()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseConstDecl()')
 
-    parseToken('const', 'KEYWORD')
+    line = getSymb()[0]
+    parseToken(KW_CONST)
 
     # Type
-    numLine, lex, tok = getSymb()
-    if tok != 'TYPE':
-        failParse('unexpected_token', (numLine, lex, tok, 'TYPE'))
-    print(f'{indent}  Type: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind not in TYPES:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'TYPE'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Type: {lex}')
+    node = VarDecl(line, True, lex, [])
     nextSymb()
 
     # Ident
-    numLine, lex, tok = getSymb()
-    if tok != 'IDENTIFIER':
-        failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-    print(f'{indent}  Ident: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind != IDENTIFIER:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Ident: {lex}')
+    name = lex
     nextSymb()
 
-    parseToken('=', 'ASSIGN_OP')
+    parseToken(ASSIGN)
 
     # Const
-    numLine, lex, tok = getSymb()
-    if tok not in ('INT', 'FLOAT', 'BOOL', 'STRING'):
-        failParse('unexpected_token', (numLine, lex, tok, 'CONST'))
-    print(f'{indent}  Const: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind not in CONSTS:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'CONST'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Const: {lex}')
+    node.items.append((name, Expr(numLine, [(kind, lex)])))
     nextSymb()
 
     # {',' Ident '=' Const}
     while True:
-        numLine, lex, tok = getSymb()
-        if lex == ',' and tok == 'COMMA':
+        numLine, lex, kind = getSymb()
+        if kind == COMMA:
             nextSymb()
 
             # Ident
-            numLine, lex, tok = getSymb()
-            if tok != 'IDENTIFIER':
-                failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-            print(f'{indent}  Ident: {lex}')
+            numLine, lex, kind = getSymb()
+            if kind != IDENTIFIER:
+                failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+            if diag.showTrace:
+                diag.trace(f'{indent}  Ident: {lex}')
+            name = lex
             nextSymb()
 
-            parseToken('=', 'ASSIGN_OP')
+            parseToken(ASSIGN)
 
             # Const
-            numLine, lex, tok = getSymb()
-            if tok not in ('INT', 'FLOAT', 'BOOL', 'STRING'):
-                failParse('unexpected_token', (numLine, lex, tok, 'CONST'))
-            print(f'{indent}  Const: {lex}')
+            numLine, lex, kind = getSymb()
+            if kind not in CONSTS:
+                failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'CONST'))
+            if diag.showTrace:
+                diag.trace(f'{indent}  Const: {lex}')
+            node.items.append((name, Expr(numLine, [(kind, lex)])))
             nextSymb()
         else:
             break
 
     prevIndent()
-    return True
+    return node
 
 
 def parseFuncDecl():
     # FuncDecl = 'def' Ident '(' [ParamList] ')' Block
+    global numRow
+
+    # Parallel mode: the declaration may already be parsed by a worker
+    if parsedFunctions:
+        done = parsedFunctions.get(numRow)
+        if done is not None:
+            node, count = done
+            numRow += count
+            return node
+
     indent = nextIndent()
-    print(f'{indent}parseFuncDecl()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseFuncDecl()')
 
-    parseToken('def', 'KEYWORD')
+    line = getSymb()[0]
+    parseToken(KW_DEF)
 
     # Ident
-    numLine, lex, tok = getSymb()
-    if tok != 'IDENTIFIER':
-        failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-    print(f'{indent}  Function: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind != IDENTIFIER:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Function: {lex}')
+    name = lex
     nextSymb()
 
-    parseToken('(', 'PAR_OP')
+    parseToken(LPAREN)
 
     # [ParamList]
-    numLine, lex, tok = getSymb()
-    if tok == 'IDENTIFIER':
-        parseParamList()
-
-    parseToken(')', 'PAR_OP')
-    parseBlock()
-
-    prevIndent()
-    return True
+    params = []
+    numLine, lex, kind = getSymb()
+    if kind == IDENTIFIER:
+        params = parseParamList()
+
+    parseToken(RPAREN)
+
+    # Lazy mode: the Block is skipped and parsed by parseFunctionBody() when needed
+    if lazyFunctions and tokenStream is None and getSymb()[2] == LBRACE:
+        last = matchingBrace(numRow)
+        if last is not None:
+            if diag.showTrace:
+                diag.trace(f'{indent}  Body: entries {numRow}..{last}, not parsed yet')
+            node = FuncDecl(line, name, params, None, (tableOfSymb, tableOfKind, numRow, last))
+            numRow = last + 1
+            prevIndent()
+            return node
+
+    openBlock(closeBody, FuncDecl(line, name, params, None))
 
 def parseParamList():
     #  ParamList = Ident {',' Ident}
     indent = nextIndent()
-    print(f'{indent}parseParamList()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseParamList()')
 
     # Ident
-    numLine, lex, tok = getSymb()
-    if tok != 'IDENTIFIER':
-        failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-    print(f'{indent}  Param: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind != IDENTIFIER:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Param: {lex}')
+    params = [lex]
     nextSymb()
 
     # {',' Ident}
     while True:
-        numLine, lex, tok = getSymb()
-        if lex == ',' and tok == 'COMMA':
+        numLine, lex, kind = getSymb()
+        if kind == COMMA:
             nextSymb()
 
-            numLine, lex, tok = getSymb()
-            if tok != 'IDENTIFIER':
-                failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-            print(f'{indent}  Param: {lex}')
+            numLine, lex, kind = getSymb()
+            if kind != IDENTIFIER:
+                failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+            if diag.showTrace:
+                diag.trace(f'{indent}  Param: {lex}')
+            params.append(lex)
             nextSymb()
         else:
             break
 
     prevIndent()
-    return True
-
-def parseStatement():
-    # Statement = VarDecl | ConstDecl | Assignment | IfStatement | ForLoop | PrintStmt | InputStmt | ReturnStmt | FuncCall | Block
-    indent = nextIndent()
-    print(f'{indent}parseStatement()')
-
-    numLine, lex, tok = getSymb()
-
-    # VarDecl
-    if tok == 'TYPE':
-        parseVarDecl()
-
-    # ConstDecl -
-    elif lex == 'const' and tok == 'KEYWORD':
-        parseConstDecl()
+    return params
 
-    # Assignment or FuncCall
-    elif tok == 'IDENTIFIER':
-        # Look ahead
-        saved_row = numRow
-        nextSymb()
-        numLine2, lex2, tok2 = getSymb()
-        numRow = saved_row
-
-        if lex2 == '=' and tok2 == 'ASSIGN_OP':
-            parseAssignment()
-        elif lex2 == '(' and tok2 == 'PAR_OP':
-            parseFuncCall()
-        else:
-            failParse('unexpected_token', (numLine, lex, tok, '= або ('))
-
-    # IfStatement
-    elif lex == 'if' and tok == 'KEYWORD':
-        parseIfStatement()
-
-    # ForLoop
-    elif lex == 'for' and tok == 'KEYWORD':
-        parseForLoop()
-
-    # PrintStmt
-    elif lex == 'print' and tok == 'KEYWORD':
-        parsePrintStmt()
-
-    # InputStmt
-    elif lex == 'input' and tok == 'KEYWORD':
-        parseInputStmt()
-
-    # ReturnStmt
-    elif lex == 'return' and tok == 'KEYWORD':
-        parseReturnStmt()
-
-    # Block
-    elif lex == '{' and tok == 'PAR_OP':
-        parseBlock()
+def parseIdentStatement():
+    # Assignment or FuncCall, told apart by the token after the Ident
+    global numRow
+    numLine, lex, kind = getSymb()
 
-    else:
-        failParse('invalid_statement', (numLine, lex, tok))
+    # Look ahead
+    saved_row = numRow
+    nextSymb()
+    numLine2, lex2, kind2 = getSymb()
+    numRow = saved_row
 
-    prevIndent()
-    return True
+    if kind2 == ASSIGN:
+        return parseAssignment()
+    elif kind2 == LPAREN:
+        return parseFuncCall()
+    failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], '= або ('))
 
 def parseAssignment():
     #  Assignment = Ident '=' Expression
     indent = nextIndent()
-    print(f'{indent}parseAssignment()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseAssignment()')
 
     # Ident
-    numLine, lex, tok = getSymb()
-    print(f'{indent}  Ident: {lex}')
+    numLine, lex, kind = getSymb()
+    if diag.showTrace:
+        diag.trace(f'{indent}  Ident: {lex}')
     nextSymb()
 
-    parseToken('=', 'ASSIGN_OP')
-    parseExpression()
+    parseToken(ASSIGN)
+    value = parseExpression()
 
     prevIndent()
-    return True
+    return Assign(numLine, lex, value)
 
 def parseIfStatement():
     #  IfStatement = 'if' '(' Expression ')' Block ['else' Block]
     indent = nextIndent()
-    print(f'{indent}parseIfStatement()')
-
-    parseToken('if', 'KEYWORD')
-    parseToken('(', 'PAR_OP')
-    parseExpression()
-    parseToken(')', 'PAR_OP')
-    parseBlock()
-
-    # ['else' Block]
-    numLine, lex, tok = getSymb()
-    if lex == 'else' and tok == 'KEYWORD':
-        parseToken('else', 'KEYWORD')
-        parseBlock()
+    if diag.showTrace:
+        diag.trace(f'{indent}parseIfStatement()')
+
+    line = getSymb()[0]
+    parseToken(KW_IF)
+    parseToken(LPAREN)
+    cond = parseExpression()
+    parseToken(RPAREN)
+    openBlock(closeThen, If(line, cond, None, None))
+
+def closeThen(block, node):
+    # ['else' Block] after the then block of an IfStatement
+    node.then = block
+    numLine, lex, kind = getSymb()
+    if kind == KW_ELSE:
+        parseToken(KW_ELSE)
+        openBlock(closeElse, node)
+        return None
+    prevIndent()
+    return node
 
+def closeElse(block, node):
+    node.orelse = block
     prevIndent()
-    return True
+    return node
 
 def parseForLoop():
     """
@@ -399,27 +517,32 @@ def parseForLoop():
     Handle both cases by accepting any combination of numbers and dots
     """
     indent = nextIndent()
-    print(f'{indent}parseForLoop()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseForLoop()')
 
-    parseToken('for', 'KEYWORD')
-    parseToken('(', 'PAR_OP')
+    line = getSymb()[0]
+    parseToken(KW_FOR)
+    parseToken(LPAREN)
 
     # Ident (loop counter)
-    numLine, lex, tok = getSymb()
-    if tok != 'IDENTIFIER':
-        failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-    print(f'{indent}  Iterator: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind != IDENTIFIER:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Iterator: {lex}')
+    var = lex
     nextSymb()
 
-    parseToken('in', 'KEYWORD')
+    parseToken(KW_IN)
 
     # Range start (can be INT or FLOAT like "1." or just "1")
-    numLine, lex, tok = getSymb()
-    if tok not in ('INT', 'FLOAT'):
-        failParse('unexpected_token', (numLine, lex, tok, 'range start (number)'))
+    numLine, lex, kind = getSymb()
+    if kind not in NUMBERS:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'range start (number)'))
 
-    start_value = lex
-    print(f'{indent}  Range start: {lex}')
+    start_value = (kind, lex)
+    if diag.showTrace:
+        diag.trace(f'{indent}  Range start: {lex}')
     nextSymb()
 
     # Range operator ".."
@@ -431,8 +554,8 @@ def parseForLoop():
     # Skip all DOT tokens until we find a number
     dot_count = 0
     while True:
-        numLine, lex, tok = getSymb()
-        if lex == '.' and tok == 'DOT':
+        numLine, lex, kind = getSymb()
+        if kind == DOT:
             dot_count += 1
             nextSymb()
         else:
@@ -443,333 +566,646 @@ def parseForLoop():
     # Accept any combination with at least context making sense
 
     # Range end (can be INT or FLOAT like ".5" or just "5")
-    numLine, lex, tok = getSymb()
-    if tok not in ('INT', 'FLOAT'):
-        failParse('unexpected_token', (numLine, lex, tok, 'range end (number)'))
+    numLine, lex, kind = getSymb()
+    if kind not in NUMBERS:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'range end (number)'))
 
-    end_value = lex
-    print(f'{indent}  Range end: {lex}')
+    end_value = (kind, lex)
+    if diag.showTrace:
+        diag.trace(f'{indent}  Range end: {lex}')
     nextSymb()
 
-    parseToken(')', 'PAR_OP')
-    parseBlock()
+    parseToken(RPAREN)
+    openBlock(closeBody, For(line, var, start_value, end_value, None))
 
+def closeBody(block, node):
+    # Block of a ForLoop or FuncDecl
+    node.body = block
     prevIndent()
-    return True
+    return node
 
 def parsePrintStmt():
     # PrintStmt = 'print' '(' [ExprList] ')'
     indent = nextIndent()
-    print(f'{indent}parsePrintStmt()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parsePrintStmt()')
 
-    parseToken('print', 'KEYWORD')
-    parseToken('(', 'PAR_OP')
+    line = getSymb()[0]
+    parseToken(KW_PRINT)
+    parseToken(LPAREN)
 
     # [ExprList]
-    numLine, lex, tok = getSymb()
-    if lex != ')':
-        parseExprList()
+    args = []
+    numLine, lex, kind = getSymb()
+    if kind != RPAREN:
+        args = parseExprList()
 
-    parseToken(')', 'PAR_OP')
+    parseToken(RPAREN)
 
     prevIndent()
-    return True
+    return Print(line, args)
 
 def parseInputStmt():
     #  InputStmt = 'input' '(' Ident ')'
     indent = nextIndent()
-    print(f'{indent}parseInputStmt()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseInputStmt()')
 
-    parseToken('input', 'KEYWORD')
-    parseToken('(', 'PAR_OP')
+    line = getSymb()[0]
+    parseToken(KW_INPUT)
+    parseToken(LPAREN)
 
     # Ident
-    numLine, lex, tok = getSymb()
-    if tok != 'IDENTIFIER':
-        failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER'))
-    print(f'{indent}  Ident: {lex}')
+    numLine, lex, kind = getSymb()
+    if kind != IDENTIFIER:
+        failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER'))
+    if diag.showTrace:
+        diag.trace(f'{indent}  Ident: {lex}')
+    name = lex
     nextSymb()
 
-    parseToken(')', 'PAR_OP')
+    parseToken(RPAREN)
 
     prevIndent()
-    return True
+    return Input(line, name)
 
 def parseReturnStmt():
     # ReturnStmt = 'return' [Expression]
     indent = nextIndent()
-    print(f'{indent}parseReturnStmt()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseReturnStmt()')
 
-    parseToken('return', 'KEYWORD')
+    line = getSymb()[0]
+    parseToken(KW_RETURN)
 
     # [Expression]
-    numLine, lex, tok = getSymb()
+    value = None
+    numLine, lex, kind = getSymb()
     # If not the end of the block - there is an expression
-    if lex != '}' and tok != 'PAR_OP':
-        parseExpression()
+    if kind not in PAR_OPS:
+        value = parseExpression()
 
     prevIndent()
-    return True
+    return Return(line, value)
 
-def parseBlock():
-    # Block = '{' {Statement} '}'
+def openBlock(closer, node):
+    # '{' of a Block: its statements are parsed by parseStatements, and at
+    # the '}' closer(block, node) returns the finished statement
     indent = nextIndent()
-    print(f'{indent}parseBlock()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseBlock()')
 
-    parseToken('{', 'PAR_OP')
+    line = getSymb()[0]
+    parseToken(LBRACE)
+    blockStack.append((Block(line, []), closer, node))
 
-    # {Statement}
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == '}' and tok == 'PAR_OP':
-            break
-        parseStatement()
+def closeBlock(block, node):
+    # A Block used as a statement
+    return block
 
-    parseToken('}', 'PAR_OP')
+def parseBlock():
+    # Block = '{' {Statement} '}'
+    holder = []
+    openBlock(closeBlock, None)
+    parseStatements(holder, len(blockStack) - 1)
+    return holder[0]
 
-    prevIndent()
-    return True
+def parseBareBlock():
+    # Block statement, parsed by the caller's loop
+    openBlock(closeBlock, None)
 
 def parseExprList():
     #  ExprList = Expression {',' Expression}
     indent = nextIndent()
-    print(f'{indent}parseExprList()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseExprList()')
 
-    parseExpression()
+    exprs = [parseExpression()]
 
     # {',' Expression}
     while True:
-        numLine, lex, tok = getSymb()
-        if lex == ',' and tok == 'COMMA':
+        numLine, lex, kind = getSymb()
+        if kind == COMMA:
             nextSymb()
-            parseExpression()
+            exprs.append(parseExpression())
         else:
             break
 
     prevIndent()
-    return True
+    return exprs
 
-def parseExpression():
-    # Expression = CompareExpr
-    indent = nextIndent()
-    print(f'{indent}parseExpression()')
+# Binding power of the binary operators; all of them are left-associative and a
+# comparison may appear only once per expression: CompareExpr = ArithExpr [RelOp ArithExpr]
+COMPARE_POWER = 1
+bindingPower = {kind: COMPARE_POWER for kind in COMPARE_OPS}
+bindingPower.update({PLUS: 2, MINUS: 2, STAR: 3, SLASH: 3, CARET: 4})
+opNames = {COMPARE_POWER: 'RelOp', 2: 'AddOp', 3: 'MultOp', 4: 'PowerOp'}
 
-    parseCompareExpr()
+# Kinds of the expression frames
+TOP, PAREN, ARG = 0, 1, 2
 
-    prevIndent()
-    return True
 
-def parseCompareExpr():
-    # CompareExpr = ArithExpr [RelOp ArithExpr]
-    indent = nextIndent()
-    print(f'{indent}parseCompareExpr()')
+class ExprFrame:
+    # One nesting level of an expression: the whole expression, a
+    # parenthesized group or a function call argument
+    __slots__ = ('type', 'code', 'ops', 'compared', 'sign', 'expr', 'name', 'args', 'outer')
 
-    parseArithExpr()
+    def __init__(self, type, code, sign=NONE):
+        self.type = type
+        self.code = code          # RPN items of the frame
+        self.ops = []             # Pending operators [(power, kind, lex)]
+        self.compared = False     # A RelOp has been read
+        self.sign = sign          # Sign in front of the group or call
+        self.expr = None          # ARG: Expr of the current argument
+        self.name = None          # ARG: function name
+        self.args = None          # ARG: finished arguments
+        self.outer = None         # ARG: code the call is appended to
 
-    # [RelOp ArithExpr]
-    numLine, lex, tok = getSymb()
-    if tok == 'COMPARE_OP':
-        print(f'{indent}  RelOp: {lex}')
-        nextSymb()
-        parseArithExpr()
 
-    prevIndent()
-    return True
-
-def parseArithExpr():
-    # ArithExpr = Term {AddOp Term}
+def parseExpression():
+    # Expression = ArithExpr [RelOp ArithExpr]
+    # ArithExpr = Term {AddOp Term}, Term = Power {MultOp Power}, Power = Factor {'^' Factor}
+    # Factor = [Sign] Primary, Primary = Ident | Const | FuncCall | '(' Expression ')'
+    #
+    # Precedence climbing with explicit stacks instead of one call per grammar
+    # level, so long operator chains and deep parentheses cost no recursion.
+    # The code is collected in reverse Polish notation.
     indent = nextIndent()
-    print(f'{indent}parseArithExpr()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseExpression()')
 
-    parseTerm()
+    expr = Expr(getSymb()[0], [])
+    frame = ExprFrame(TOP, expr.code)
+    frames = []
 
-    # {AddOp Term}
     while True:
-        numLine, lex, tok = getSymb()
-        if tok == 'ADD_OP':
-            print(f'{indent}  AddOp: {lex}')
+        # Factor = [Sign] Primary
+        numLine, lex, sign = getSymb()
+        if sign in ADD_OPS:
+            if diag.showTrace:
+                diag.trace(f'{indent}  UnaryOp: {lex}')
             nextSymb()
-            parseTerm()
-        else:
-            break
-
-    prevIndent()
-    return True
+        numLine, lex, kind = getSymb()
 
-def parseTerm():
-    # Term = Power {MultOp Power}
-    indent = nextIndent()
-    print(f'{indent}parseTerm()')
-
-    parsePower()
-
-    # {MultOp Power}
-    while True:
-        numLine, lex, tok = getSymb()
-        if tok == 'MULT_OP':
-            print(f'{indent}  MultOp: {lex}')
+        if kind in CONSTS:
+            if diag.showTrace:
+                diag.trace(f'{indent}  Const: {lex}')
+            frame.code.append((kind, lex))
             nextSymb()
-            parsePower()
-        else:
-            break
-
-    prevIndent()
-    return True
 
-def parsePower():
-    # Power = Factor {'^' Factor}
-    indent = nextIndent()
-    print(f'{indent}parsePower()')
-
-    parseFactor()
-
-    # {'^' Factor}
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == '^' and tok == 'POWER_OP':
-            print(f'{indent}  PowerOp: ^')
+        elif kind == IDENTIFIER:
+            if diag.showTrace:
+                diag.trace(f'{indent}  Ident: {lex}')
             nextSymb()
-            parseFactor()
-        else:
-            break
-
-    prevIndent()
-    return True
-
-def parseFactor():
-    # Factor = [Sign] Primary
-    indent = nextIndent()
-    print(f'{indent}parseFactor()')
-
-    # [Sign]
-    numLine, lex, tok = getSymb()
-    if tok == 'ADD_OP' and lex in ('+', '-'):
-        print(f'{indent}  UnaryOp: {lex}')
-        nextSymb()
 
-    parsePrimary()
-
-    prevIndent()
-    return True
-
-def parsePrimary():
-    # Primary = Ident | Const | FuncCall | '(' Expression ')'
-    indent = nextIndent()
-    print(f'{indent}parsePrimary()')
-
-    numLine, lex, tok = getSymb()
-
-    # Const
-    if tok in ('INT', 'FLOAT', 'BOOL', 'STRING'):
-        print(f'{indent}  Const: {lex}')
-        nextSymb()
+            if getSymb()[2] != LPAREN:
+                frame.code.append((kind, lex))
+            else:
+                parseToken(LPAREN)
+                if getSymb()[2] == RPAREN:
+                    parseToken(RPAREN)
+                    frame.code.append((CALL, lex, []))
+                else:
+                    # [ArgList]: the arguments are parsed as frames of their own
+                    frames.append(frame)
+                    outer = frame.code
+                    arg = Expr(getSymb()[0], [])
+                    frame = ExprFrame(ARG, arg.code, sign)
+                    frame.expr, frame.name, frame.args, frame.outer = arg, lex, [], outer
+                    continue
+
+        elif kind == LPAREN:
+            parseToken(LPAREN)
+            frames.append(frame)
+            frame = ExprFrame(PAREN, frame.code, sign)
+            continue
 
-    # Ident або FuncCall
-    elif tok == 'IDENTIFIER':
-        print(f'{indent}  Ident: {lex}')
-        nextSymb()
+        else:
+            failParse('unexpected_token', (numLine, lex, tokenOfKind[kind], 'IDENTIFIER, CONST або ('))
+
+        # Unary + does nothing
+        if sign == MINUS:
+            frame.code.append((NEG, '-'))
+
+        # Binary operators after the operand; a finished frame returns to the
+        # one it is nested in and the operand that frame is waiting for is complete
+        while True:
+            numLine, lex, kind = getSymb()
+            power = bindingPower.get(kind)
+
+            if power is not None and not (power == COMPARE_POWER and frame.compared):
+                if diag.showTrace:
+                    diag.trace(f'{indent}  {opNames[power]}: {lex}')
+                ops = frame.ops
+                while ops and ops[-1][0] >= power:
+                    frame.code.append(ops.pop()[1:])
+                ops.append((power, kind, lex))
+                if power == COMPARE_POWER:
+                    frame.compared = True
+                nextSymb()
+                break
 
-        # Перевірка на FuncCall
-        numLine2, lex2, tok2 = getSymb()
-        if lex2 == '(' and tok2 == 'PAR_OP':
-            parseToken('(', 'PAR_OP')
+            # End of the frame
+            while frame.ops:
+                frame.code.append(frame.ops.pop()[1:])
 
-            # [ArgList]
-            numLine3, lex3, tok3 = getSymb()
-            if lex3 != ')':
-                parseArgList()
+            if frame.type == TOP:
+                prevIndent()
+                return expr
 
-            parseToken(')', 'PAR_OP')
+            if frame.type == ARG:
+                frame.args.append(frame.expr)
 
-    # '(' Expression ')'
-    elif lex == '(' and tok == 'PAR_OP':
-        parseToken('(', 'PAR_OP')
-        parseExpression()
-        parseToken(')', 'PAR_OP')
+                # {',' Expression}
+                if kind == COMMA:
+                    nextSymb()
+                    frame.expr = Expr(getSymb()[0], [])
+                    frame.code = frame.expr.code
+                    frame.compared = False
+                    break
 
-    else:
-        failParse('unexpected_token', (numLine, lex, tok, 'IDENTIFIER, CONST або ('))
+                parseToken(RPAREN)
+                frame.outer.append((CALL, frame.name, frame.args))
+            else:
+                parseToken(RPAREN)
 
-    prevIndent()
-    return True
+            sign = frame.sign
+            frame = frames.pop()
+            if sign == MINUS:
+                frame.code.append((NEG, '-'))
 
 def parseFuncCall():
     # FuncCall = Ident '(' [ArgList] ')'
     indent = nextIndent()
-    print(f'{indent}parseFuncCall()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseFuncCall()')
 
     # Ident
-    numLine, lex, tok = getSymb()
-    print(f'{indent}  Function: {lex}')
+    line, name, kind = getSymb()
+    if diag.showTrace:
+        diag.trace(f'{indent}  Function: {name}')
     nextSymb()
 
-    parseToken('(', 'PAR_OP')
+    parseToken(LPAREN)
 
     # [ArgList]
-    numLine, lex, tok = getSymb()
-    if lex != ')':
-        parseArgList()
+    args = []
+    numLine, lex, kind = getSymb()
+    if kind != RPAREN:
+        args = parseArgList()
 
-    parseToken(')', 'PAR_OP')
+    parseToken(RPAREN)
 
     prevIndent()
-    return True
+    return Call(line, name, args)
 
 def parseArgList():
     # ArgList = Expression {',' Expression}
     indent = nextIndent()
-    print(f'{indent}parseArgList()')
+    if diag.showTrace:
+        diag.trace(f'{indent}parseArgList()')
 
-    parseExpression()
+    exprs = [parseExpression()]
 
     # {',' Expression}
     while True:
-        numLine, lex, tok = getSymb()
-        if lex == ',' and tok == 'COMMA':
+        numLine, lex, kind = getSymb()
+        if kind == COMMA:
             nextSymb()
-            parseExpression()
+            exprs.append(parseExpression())
         else:
             break
 
     prevIndent()
-    return True
+    return exprs
+
+# FIRST sets of the statements and their parse functions; a function that
+# opens a block returns None and its statement is finished by the closer
+firstSets = (
+    (TYPES, parseVarDecl),
+    ((KW_CONST,), parseConstDecl),
+    ((IDENTIFIER,), parseIdentStatement),
+    ((KW_IF,), parseIfStatement),
+    ((KW_FOR,), parseForLoop),
+    ((KW_PRINT,), parsePrintStmt),
+    ((KW_INPUT,), parseInputStmt),
+    ((KW_RETURN,), parseReturnStmt),
+    ((LBRACE,), parseBareBlock),
+)
+
+# Parse function of every token kind, None if no statement starts with it
+statementTable = [None] * numKinds
+for first, parse in firstSets:
+    for kind in first:
+        statementTable[kind] = parse
+
+# Functions are declared at the top level only
+programTable = list(statementTable)
+programTable[KW_DEF] = parseFuncDecl
+
+# Tokens the recovery mode resumes at
+syncKinds = TYPES | {KW_CONST, KW_DEF, KW_IF, KW_FOR, KW_PRINT, KW_INPUT, KW_RETURN, LBRACE}
+
 
 # Parser
-def parse(table_of_symb):
-    global tableOfSymb, numRow, len_tableOfSymb, indent_level
+def buildAst(table_of_symb, table_of_kind=None, recover=False, workers=1, lazy=False):
+    # Parses the symbol table, returns the Program tree or None on a syntax error.
+    # With recover, parsing goes on after an error and all of them are
+    # reported and kept in parseErrors. With workers other than 1, top-level
+    # functions are parsed first in a pool of that many processes (None: one
+    # per CPU). With lazy, function bodies are left for parseFunctionBody()
+    global tableOfSymb, tableOfKind, len_tableOfSymb, tokenStream, parsedFunctions, lazyFunctions
 
     tableOfSymb = table_of_symb
-    numRow = 1
+    tableOfKind = table_of_kind if table_of_kind is not None else kindsOf(table_of_symb)
     len_tableOfSymb = len(tableOfSymb)
+    tokenStream = None
+    parsedFunctions = {}
+    lazyFunctions = lazy
+    if workers != 1 and not lazy:
+        parsedFunctions = parseFunctions(workers)
+    return runParser(recover)
+
+def buildAstFromStream(tokens, recover=False, ringSize=64):
+    # Parses the (line, lexeme, token, index) entries pulled from the iterator
+    # tokens, like Lexer.streamTokens, while they are produced. Only the last
+    # ringSize entries are kept, so memory does not grow with the program and
+    # a syntax error stops reading the stream at once. The parser looks one entry
+    # back and one ahead, the rest of the ring is read ahead in batches.
+    global tableOfSymb, tableOfKind, len_tableOfSymb, tokenStream, ringAhead, parsedFunctions, lazyFunctions
+
+    if ringSize < 4:
+        raise ValueError(f'ring size {ringSize} is too small, the parser needs 4 entries')
+    ringAhead = ringSize // 2
+    tableOfSymb = TokenRing(ringSize)
+    tableOfKind = TokenRing(ringSize, NONE)
+    len_tableOfSymb = 0
+    tokenStream = iter(tokens)
+    parsedFunctions = {}
+    lazyFunctions = False
+    return runParser(recover)
+
+def matchingBrace(row):
+    # Entry number of the '}' that closes the '{' at row, None if it is not
+    # closed; jumps from brace to brace with bytes.find on tableOfKind
+    end = len_tableOfSymb + 1
+    nextOpen = tableOfKind.find(LBRACE, row, end)
+    nested = 0
+    while True:
+        nextClose = tableOfKind.find(RBRACE, row, end)
+        if nextClose < 0:
+            return None
+        while 0 <= nextOpen < nextClose:
+            nested += 1
+            nextOpen = tableOfKind.find(LBRACE, nextOpen + 1, end)
+        nested -= 1
+        if nested == 0:
+            return nextClose
+        row = nextClose + 1
+
+def scanFunctions():
+    # (first, last) entry numbers of the 'def' declarations outside of any
+    # braces, up to the '}' matching the first '{' after the 'def'
+    ranges = []
+    depth = 0
+    row = 1
+    while row <= len_tableOfSymb:
+        kind = tableOfKind[row]
+        if kind == LBRACE:
+            depth += 1
+        elif kind == RBRACE:
+            depth = max(depth - 1, 0)
+        elif kind == KW_DEF and depth == 0:
+            first = tableOfKind.find(LBRACE, row + 1, len_tableOfSymb + 1)
+            last = matchingBrace(first) if first >= 0 else None
+            if last is None:
+                break
+            ranges.append((row, last))
+            row = last
+        row += 1
+    return ranges
+
+def parseFunctions(workers):
+    # Parallel mode: parses the top-level functions in a process pool.
+    # Returns {first entry: (FuncDecl, entries)} of the ones without errors;
+    # the others are parsed again in place, so their errors are reported in order
+    ranges = scanFunctions()
+    if not ranges:
+        return {}
+
+    # The workers get the tables once, and then only the entry numbers of each function.
+    # Trees have no reference cycles, so the cyclic collector is off while they
+    # are unpickled: it would walk the whole heap again and again
+    workers = workers or os.cpu_count() or 1
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        with ProcessPoolExecutor(workers, initializer=setWorkerTables,
+                                 initargs=(tableOfSymb, tableOfKind)) as pool:
+            results = list(pool.map(parseFunctionRange, *zip(*ranges),
+                                    chunksize=len(ranges) // (4 * workers) + 1))
+    finally:
+        if collecting:
+            gc.enable()
+
+    # Merged by entry number, so the tree does not depend on the order of the workers
+    return {first: done for (first, last), done in zip(ranges, results) if done is not None}
+
+def setWorkerTables(table_of_symb, table_of_kind):
+    # Initializer of the parallel mode workers
+    global tableOfSymb, tableOfKind, tokenStream, parsedFunctions, recovering
+
+    configure(SILENT)
+    gc.disable()
+    tableOfSymb = table_of_symb
+    tableOfKind = table_of_kind
+    tokenStream = None
+    parsedFunctions = {}
+    recovering = False
+
+def parseFunctionRange(first, last):
+    # Worker of the parallel mode: parses the 'def' declaration in the entries
+    # first..last; returns (FuncDecl, entries consumed) or None on a syntax error
+    global numRow, len_tableOfSymb, indent_level, blockStack
+
+    # The declaration is parsed as if the table ended after it
+    numRow = first
+    len_tableOfSymb = last
     indent_level = 0
+    blockStack = []
 
-    print('\n' + '=' * 60)
-    print('Syntax analysis')
-    print('=' * 60 + '\n')
+    holder = []
+    try:
+        parseFuncDecl()
+        parseStatements(holder, 0)
+    except SystemExit:
+        return None
+    return holder[0], numRow - first
+
+def parseFunctionBody(func, recover=False):
+    # Lazy mode: parses the recorded Block of the FuncDecl func the first time
+    # it is needed; returns the Block, or None after reporting its syntax errors.
+    # The state of the parser is restored afterwards, parseErrors included, so
+    # a caller in the middle of a parse can go on
+    global tableOfSymb, tableOfKind, numRow, len_tableOfSymb, tokenStream, parsedFunctions
+    global indent_level, blockStack, recovering, parseErrors, lazyFunctions
+
+    if func.lazy is None:
+        return func.body
+
+    saved = (tableOfSymb, tableOfKind, numRow, len_tableOfSymb, tokenStream, parsedFunctions,
+             indent_level, blockStack, recovering, parseErrors, lazyFunctions)
+    tableOfSymb, tableOfKind, first, last = func.lazy
+    numRow = first
+    len_tableOfSymb = last
+    tokenStream = None
+    parsedFunctions = {}
+    indent_level = 0
+    blockStack = []
+    recovering = recover
+    parseErrors = []
+    lazyFunctions = False
 
     try:
-        parseProgram()
-        print('\n' + '=' * 60)
-        print('✓ Parser: Parsing completed SUCCESSFULLY')
-        print('=' * 60)
-        return True
+        body = parseBlock()
+    except SystemExit:
+        body = None
+    finally:
+        failed = bool(parseErrors)
+        (tableOfSymb, tableOfKind, numRow, len_tableOfSymb, tokenStream, parsedFunctions,
+         indent_level, blockStack, recovering, parseErrors, lazyFunctions) = saved
+    if body is None or failed:
+        diag.error(f"\n✗ Parser: Syntax errors in the body of function '{func.name}'")
+        return None
+
+    func.body = body
+    func.lazy = None
+    return body
+
+def parseTopLevel(table_of_symb, table_of_kind, first, resume=()):
+    # Incremental mode: parses top-level statements from the entry first on.
+    # Stops at the end, at a token that starts nothing, before a statement at
+    # an entry in resume, where the caller still has the old one, or at a
+    # syntax error. Returns (statements, their first entries, entry where it
+    # stopped, failed); after an error the last first entry is the one of
+    # the statement that has it, and the entry is where it was found
+    global tableOfSymb, tableOfKind, numRow, len_tableOfSymb, tokenStream, parsedFunctions
+    global indent_level, blockStack, recovering, parseErrors, lazyFunctions
 
-    except SystemExit as e:
-        print('\n' + '=' * 60)
-        print(f'✗ Parser: Crash with code {e}')
-        print('=' * 60)
-        return False
+    tableOfSymb = table_of_symb
+    tableOfKind = table_of_kind
+    len_tableOfSymb = len(tableOfSymb)
+    numRow = first
+    tokenStream = None
+    parsedFunctions = {}
+    indent_level = 0
+    blockStack = []
+    recovering = False
+    parseErrors = []
+    lazyFunctions = False
 
-def start(file_path):
-    # Runs lexical and syntactic analysis of the file
-    lex_success = lex_start(file_path)
+    body = []
+    starts = []
+    try:
+        while numRow <= len_tableOfSymb and numRow not in resume:
+            starts.append(numRow)
+            parseStatements(body, 0)
+            if len(body) < len(starts):
+                starts.pop()
+                break
+    except SystemExit:
+        return body, starts, numRow, True
+    return body, starts, numRow, False
+
+def runParser(recover):
+    global numRow, indent_level, blockStack, recovering, parseErrors
+
+    numRow = 1
+    if tokenStream is not None:
+        pullTokens()
+    indent_level = 0
+    blockStack = []
+    recovering = recover
+    parseErrors = []
+
+    diag.info('\n' + '=' * 60)
+    diag.info('Syntax analysis')
+    diag.info('=' * 60 + '\n')
+
+    try:
+        program = parseProgram()
+
+    except SystemExit as e:
+        if streamLexer is not None and streamLexer.errorCount:
+            return None
+        if not parseErrors:
+            diag.error('\n' + '=' * 60)
+            diag.error(f'✗ Parser: Crash with code {e}')
+            diag.error('=' * 60)
+            return None
+
+    if parseErrors:
+        diag.error('\n' + '=' * 60)
+        diag.error(f'✗ Parser: Found {len(parseErrors)} syntax errors')
+        diag.error('=' * 60)
+        return None
+
+    diag.info('\n' + '=' * 60)
+    diag.info('✓ Parser: Parsing completed SUCCESSFULLY')
+    diag.info('=' * 60)
+    return program
+
+def parse(table_of_symb, table_of_kind=None, recover=False):
+    return buildAst(table_of_symb, table_of_kind, recover) is not None
+
+def parseFile(file_path, recover=False, stream=False, workers=1, lazy=False):
+    # Runs lexical and syntactic analysis of the file, returns the Program tree or None.
+    # With stream, the parser reads the tokens while the lexer produces them
+    # (function bodies are then always parsed at once). With workers other
+    # than 1, a big file is also lexed in chunks by that many processes
+    if stream:
+        return parseStream(file_path, recover)
+
+    lex_success = lex_start(file_path, workers=workers)
 
     if not lex_success:
-        print('\n✗ Lexical analysis failed. Syntactic analysis is not possible..')
-        return False
+        diag.error('\n✗ Lexical analysis failed. Syntactic analysis is not possible..')
+        return None
 
     if g.errorCount > 0:
-        print(f'\n✗ Found {g.errorCount} lexical errors. Syntactic analysis is not possible.')
-        return False
-
-    return parse(g.tableOfSymb)
+        diag.error(f'\n✗ Found {g.errorCount} lexical errors. Syntactic analysis is not possible.')
+        return None
+
+    return buildAst(g.tableOfSymb, g.tableOfKind, recover, workers, lazy)
+
+def parseStream(file_path, recover=False):
+    # Lexes and parses the file in one pass over a ring of tokens. Errors are
+    # reported as soon as they are found, and the first syntax error stops
+    # the lexer too (in the recovery mode, parsing ends at the end of the
+    # source). So unlike the default mode, which lexes the whole source
+    # first, a lexical error after the first syntax error is not reported.
+    # A syntax error in the tokens after a lexical error is not reported
+    # either: the program fails with the lexical error, as in the default mode
+    global streamLexer
+    lx = Lexer()
+    tokens = lx.streamTokens(file_path)
+    streamLexer = lx
+    try:
+        program = buildAstFromStream(tokens, recover)
+        if program is not None:
+            # Lexical errors after the last statement still fail the program
+            for _ in tokens:
+                pass
+    finally:
+        streamLexer = None
+        tokens.close()
+
+    if lx.errorCount > 0 or (program is not None and not lx.FSuccess):
+        diag.error('\n✗ Lexical analysis failed. Syntactic analysis is not possible..')
+        return None
+
+    return program
+
+def start(file_path, recover=False, stream=False, workers=1, lazy=False):
+    # Runs lexical and syntactic analysis of the file
+    return parseFile(file_path, recover, stream, workers, lazy) is not None
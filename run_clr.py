@@ -2,6 +2,8 @@ import sys
 import os
 import argparse
 from clr_translator.clr_translator import start
+from diagnostics import configure, INFO, TRACE
+from lexer import cache as token_cache
 
 
 def save_il_file(cil_code, source_file):
@@ -94,6 +96,9 @@ Examples:
   
   # Show CIL code on screen
   python run_clr.py program.joovy --show-code
+
+  # Trace every token and emitted instruction
+  python run_clr.py program.joovy --trace
         """
     )
 
@@ -102,8 +107,17 @@ Examples:
                         help='Try to compile with ilasm')
     parser.add_argument('--show-code', action='store_true',
                         help='Display generated CIL code')
+    parser.add_argument('--trace', action='store_true',
+                        help='Show the lexer tables and translation trace')
+    parser.add_argument('--token-cache', metavar='DIR',
+                        help='Reuse the tokens of unchanged sources from DIR (default: $JOOVY_TOKEN_CACHE)')
+    parser.add_argument('--lazy', action='store_true',
+                        help='Parse a function body only when a call to it is translated')
 
     args = parser.parse_args()
+    configure(TRACE if args.trace else INFO)
+    if args.token_cache:
+        token_cache.configure(args.token_cache)
 
     if not os.path.exists(args.file):
         print(f"✗ Error: File '{args.file}' not found")
@@ -116,7 +130,7 @@ Examples:
     print("=" * 70)
 
     # Translate
-    success, cil_code = start(args.file)
+    success, cil_code = start(args.file, lazy=args.lazy)
 
     if not success:
         print("\n✗ Translation failed")
@@ -0,0 +1,255 @@
+import sys
+import os
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+from lexer.lexer import Lexer, engines, publish
+from lexer import cache as token_cache
+from parser import buildAst
+from translator import translator as postfix_translator
+from translator.postfix_vm import execute_postfix, engines as vm_engines
+from clr_translator import clr_translator as cil_translator
+from diagnostics import configure, ERROR, INFO, TRACE
+from run_translator import print_postfix_code, print_label_table, save_postfix_to_file
+from run_clr import print_cil_code, save_il_file
+
+
+class PassTimer:
+    """Runs the stages of the compilation and measures each of them.
+
+    For every stage it keeps the wall and CPU time, the tokens of the source
+    handled per second of wall time, and the peak of the memory traced by
+    tracemalloc above what was allocated when the stage started. Tracing
+    slows allocations down, so it only runs when the timer is enabled.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.passes = []
+        self.tokens = 0
+        if enabled:
+            tracemalloc.start()
+
+    def run(self, name, func, *args, **kwargs):
+        """Calls func(*args, **kwargs) as the stage name, returns its result"""
+        if not self.enabled:
+            return func(*args, **kwargs)
+
+        # A collection left over by the previous stage is not charged to this one
+        gc.collect()
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+
+        result = func(*args, **kwargs)
+
+        cpu = time.process_time() - cpu
+        wall = time.perf_counter() - wall
+        peak = tracemalloc.get_traced_memory()[1] - base
+        self.passes.append({
+            'pass': name,
+            'wall_s': wall,
+            'cpu_s': cpu,
+            'tokens': self.tokens,
+            'tokens_per_s': self.tokens / wall if wall > 0 else 0.0,
+            'peak_bytes': peak,
+        })
+        return result
+
+    def set_tokens(self, tokens):
+        """Number of tokens of the source, known once it is lexed; also
+        charged to the stages measured before"""
+        self.tokens = tokens
+        for p in self.passes:
+            p['tokens'] = tokens
+            p['tokens_per_s'] = tokens / p['wall_s'] if p['wall_s'] > 0 else 0.0
+
+    def stop(self):
+        if self.enabled:
+            tracemalloc.stop()
+
+    def print_report(self):
+        """Prints the measures of the stages as a table"""
+        print("\n" + "=" * 70)
+        print("TIME PASSES:")
+        print("=" * 70)
+        print(f"  {'pass':10s} {'wall ms':>10s} {'cpu ms':>10s} {'tokens/s':>14s} {'peak KiB':>12s}")
+
+        for p in self.passes:
+            print(f"  {p['pass']:10s} {p['wall_s'] * 1000:10.2f} {p['cpu_s'] * 1000:10.2f} "
+                  f"{p['tokens_per_s']:14,.0f} {p['peak_bytes'] / 1024:12,.1f}")
+
+        wall = sum(p['wall_s'] for p in self.passes)
+        cpu = sum(p['cpu_s'] for p in self.passes)
+        print(f"  {'total':10s} {wall * 1000:10.2f} {cpu * 1000:10.2f}")
+
+    def report(self, source_file, success):
+        """Measures as a dictionary for the JSON output"""
+        return {
+            'source': source_file,
+            'success': success,
+            'tokens': self.tokens,
+            'passes': self.passes,
+        }
+
+
+def lex(file_path, engine, workers):
+    """Lexes the file into a compact token table, returns the lexer or None"""
+    lx = Lexer(compact=True)
+    success = lx.start(file_path, engine, workers)
+    publish(lx)
+    if not success or lx.errorCount:
+        return None
+    return lx
+
+
+def compile_file(args, timer):
+    """Runs the stages asked for by args, returns True on success"""
+    lx = timer.run('lex', lex, args.file, args.engine, args.jobs)
+    if lx is None:
+        print("\n✗ Lexical analysis failed")
+        return False
+    timer.set_tokens(len(lx.tableOfSymb))
+
+    program = timer.run('parse', buildAst, lx.tableOfSymb, lx.tableOfKind,
+                        workers=args.jobs, lazy=args.lazy)
+    if program is None:
+        print("\n✗ Syntax analysis failed")
+        return False
+
+    postfix_code = label_table = None
+    if args.emit in ('postfix', 'both') or args.run:
+        success, postfix_code, label_table = timer.run('postfix', postfix_translator.translateTree, program)
+        if not success:
+            print("\n✗ Postfix translation failed")
+            return False
+        if args.show_code:
+            print_postfix_code(postfix_code)
+            print_label_table(label_table)
+        if args.save:
+            save_postfix_to_file(postfix_code, args.file)
+
+    if args.emit in ('cil', 'both'):
+        success, cil_code = timer.run('cil', cil_translator.translateTree, program)
+        if not success:
+            print("\n✗ CIL translation failed")
+            return False
+        if args.show_code:
+            print_cil_code(cil_code)
+        if args.save:
+            save_il_file(cil_code, args.file)
+
+    if args.run:
+        if not timer.run('run', execute_postfix, postfix_code, label_table,
+                        debug=args.debug, engine=args.vm):
+            print("\n✗ Execution failed")
+            return False
+
+    return True
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description='Joovy Compiler Driver',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Lex, parse and generate postfix code
+  python run_compiler.py program.joovy
+
+  # Generate postfix and CIL code and run the postfix code
+  python run_compiler.py program.joovy --emit both --run
+
+  # Report the time and memory of every stage
+  python run_compiler.py program.joovy --emit both --time-passes
+
+  # Write the measures as JSON for a dashboard
+  python run_compiler.py program.joovy --time-passes --json passes.json
+        """
+    )
+
+    parser.add_argument('file', help='Joovy source file (.joovy)')
+    parser.add_argument('--emit', choices=('postfix', 'cil', 'both', 'none'), default='postfix',
+                        help='Code to generate (default: postfix)')
+    parser.add_argument('--run', action='store_true',
+                        help='Execute the postfix code on the VM')
+    parser.add_argument('--vm', choices=sorted(vm_engines), default='tuple',
+                        help='Virtual machine that executes the postfix code (default: tuple)')
+    parser.add_argument('--show-code', action='store_true',
+                        help='Display the generated code')
+    parser.add_argument('--save', action='store_true',
+                        help='Save the generated code next to the source (.postfix, .il)')
+    parser.add_argument('--engine', choices=sorted(engines), default='dfa',
+                        help='Lexer engine (default: dfa)')
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help='Lex in chunks and parse the top-level functions in N processes (0: one per CPU)')
+    parser.add_argument('--lazy', action='store_true',
+                        help='Parse a function body only when a call to it is translated')
+    parser.add_argument('--debug', action='store_true',
+                        help='Enable debug output during execution')
+    parser.add_argument('--trace', action='store_true',
+                        help='Show the lexer tables and translation trace')
+    parser.add_argument('--token-cache', metavar='DIR',
+                        help='Reuse the tokens of unchanged sources from DIR (default: $JOOVY_TOKEN_CACHE)')
+    parser.add_argument('--time-passes', action='store_true',
+                        help='Report wall time, CPU time, tokens/s and peak memory of every stage')
+    parser.add_argument('--json', metavar='FILE',
+                        help='Write the stage measures as JSON to FILE (-: stdout, only errors are printed then)')
+
+    args = parser.parse_args()
+    args.jobs = args.jobs or None
+    to_stdout = args.json == '-'
+    configure(TRACE if args.trace else ERROR if to_stdout else INFO)
+    if args.token_cache:
+        token_cache.configure(args.token_cache)
+
+    if not os.path.exists(args.file):
+        print(f"✗ Error: File '{args.file}' not found", file=sys.stderr)
+        return 1
+
+    if to_stdout:
+        # The report is the only output on stdout
+        sys.stdout, stdout = sys.stderr, sys.stdout
+    else:
+        print("=" * 70)
+        print("JOOVY COMPILER")
+        print("=" * 70)
+        print(f"Source file: {args.file}")
+        print("=" * 70)
+
+    timer = PassTimer(args.time_passes or args.json is not None)
+    try:
+        success = compile_file(args, timer)
+    finally:
+        timer.stop()
+
+    if to_stdout:
+        sys.stdout = stdout
+        json.dump(timer.report(args.file, success), sys.stdout, indent=2)
+        print()
+    else:
+        if args.time_passes:
+            timer.print_report()
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump(timer.report(args.file, success), f, indent=2)
+            print(f"\n✓ Pass measures saved to: {args.json}")
+
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n✗ Interrupted by user")
+        sys.exit(1)
+    except Exception as e:
+        print(f"\n✗ Unexpected error: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -1,21 +1,35 @@
 import sys
 from parser import start
+from diagnostics import configure, INFO, TRACE
+from lexer import cache as token_cache
 
 def main():
     if len(sys.argv) < 2:
-        print("Using: python run_parser.py <file.joovy>")
+        print("Using: python run_parser.py <file.joovy> [--trace] [--all-errors] [--stream] [--jobs N] [--lazy] [--token-cache DIR]")
         print("\nExamples:")
         print("  python run_parser.py test_programs/test_correct.joovy")
         print("  python run_parser.py test_programs/test_syntax_errors.joovy")
+        print("  python run_parser.py test_programs/test_syntax_errors.joovy --all-errors")
         sys.exit(1)
 
     file_path = sys.argv[1]
+    configure(TRACE if '--trace' in sys.argv[2:] else INFO)
+    if '--token-cache' in sys.argv[2:-1]:
+        token_cache.configure(sys.argv[sys.argv.index('--token-cache', 2) + 1])
+    # --jobs N lexes the file in chunks and parses the top-level functions in N processes (0: one per CPU)
+    workers = 1
+    if '--jobs' in sys.argv[2:-1]:
+        workers = int(sys.argv[sys.argv.index('--jobs', 2) + 1]) or None
 
     print(f"\n{'=' * 70}")
     print(f"Analys: {file_path}")
     print(f"{'=' * 70}")
 
-    success = start(file_path)
+    # --all-errors reports every syntax error instead of stopping at the first one
+    # --stream parses the tokens while the lexer produces them
+    # --lazy only records the function bodies, they are not checked
+    success = start(file_path, recover='--all-errors' in sys.argv[2:], stream='--stream' in sys.argv[2:],
+                    workers=workers, lazy='--lazy' in sys.argv[2:])
 
     if success:
         print("\n✓ The program is syntactically correct.")
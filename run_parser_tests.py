@@ -1,6 +1,23 @@
 import os
 import sys
+import tempfile
+import parser
 from parser import start
+from diagnostics import configure, Collector, printSink, INFO
+
+# Sources with several independent syntax errors for the recovery tests
+error_sources = [
+    "int x = 5\nint = 3\nint y = 2\nprint(x\nint z = 1\n",
+    "def f( {\n    return 1\n}\nint a = (1 + \nif (a > 0) {\n    print(a)\n}\nint b = 2 3\n",
+]
+
+# Sources with lexical and syntax errors for the stream tests, with the
+# first error stream mode reports when it differs from the default mode
+stream_sources = [
+    ("int x = 5\nint y = @ 10\nint = = 3\nprint(x\n", None),
+    ("int = = 3\nint x = 5\nint y = @ 10\n", None),
+    ("int = = 3\n" + "int x = 5\n" * 20000 + "int y = @ 10\n", "\nParser ERROR: In line 1"),
+]
 
 def run_test(test_name, file_path, should_pass=True):
     """Runs one test"""
@@ -31,8 +48,78 @@ def run_test(test_name, file_path, should_pass=True):
             return False
 
 
+def parse_errors(file_path, recover=False, stream=False):
+    """Parses the file, returns the result, every syntax error as the list
+    of its lines and all error messages"""
+    collector = Collector()
+    configure(INFO, collector)
+    try:
+        success = start(file_path, recover, stream)
+    finally:
+        configure(INFO, printSink)
+
+    errors = []
+    for message in collector.errors():
+        if message.startswith('\nParser ERROR'):
+            errors.append([message])
+        elif message.startswith('  ') and errors:
+            errors[-1].append(message)
+    return success, errors, collector.errors()
+
+
+def run_recovery_test(test_name, file_path, min_errors):
+    """Checks that the recovery mode reports at least min_errors syntax
+    errors, the first one as the normal mode reports it"""
+    print("\n" + "=" * 70)
+    print(f"TEST: {test_name}")
+    print("=" * 70)
+
+    success, errors, _ = parse_errors(file_path)
+    recovered, all_errors, _ = parse_errors(file_path, recover=True)
+
+    if recovered != success or len(all_errors) < min_errors or len(parser.parseErrors) != len(all_errors):
+        print(f"\n✗ Test '{test_name}' FAILED ({len(all_errors)} errors reported, "
+              f"{len(parser.parseErrors)} kept, at least {min_errors} expected)")
+        return False
+    if all_errors[:1] != errors[:1]:
+        print(f"\n✗ Test '{test_name}' FAILED (first error differs from the normal mode)")
+        return False
+
+    print(f"\n✓ Test '{test_name}' PASSED ({len(all_errors)} errors reported)")
+    return True
+
+
+def run_stream_test(test_name, file_path, first_error=None):
+    """Checks that parsing while the tokens are streamed gives the result
+    of parsing after lexing, in both modes, and the same error messages or,
+    when a syntax error comes before the lexical errors far enough to be
+    reported at once, the given first error"""
+    print("\n" + "=" * 70)
+    print(f"TEST: {test_name}")
+    print("=" * 70)
+
+    for recover in (False, True):
+        mode = ' with recovery' if recover else ''
+        success, _, messages = parse_errors(file_path, recover)
+        streamed, _, stream_messages = parse_errors(file_path, recover, stream=True)
+        if streamed != success:
+            print(f"\n✗ Test '{test_name}' FAILED (stream mode result differs{mode})")
+            return False
+        if first_error is None and stream_messages != messages:
+            print(f"\n✗ Test '{test_name}' FAILED (stream mode differs{mode})")
+            return False
+        if first_error is not None and stream_messages[:1] != [first_error]:
+            print(f"\n✗ Test '{test_name}' FAILED (stream mode did not report {first_error.strip()!r} first{mode})")
+            return False
+
+    print(f"\n✓ Test '{test_name}' PASSED ({len(messages)} error messages)")
+    return True
+
+
 def main():
     """Main function"""
+    configure(INFO)
+
     tests = [
         # (name, file, should_pass)
         ("Simple correct program", "test_programs/test_correct.joovy", True),
@@ -48,6 +135,35 @@ def main():
         else:
             print(f"\nSkipping test '{test_name}' - file not found")
 
+    recovery_tests = [
+        # (name, file, least number of errors)
+        ("Recovery: correct program", "test_programs/test_correct.joovy", 0),
+        ("Recovery: syntax errors", "test_programs/test_syntax_errors.joovy", 5),
+        ("Recovery: nested blocks", "test_programs/test_nested.joovy", 1),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for i, text in enumerate(error_sources):
+            file_path = os.path.join(directory, f"errors_{i}.joovy")
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            recovery_tests.append((f"Recovery: errors_{i}.joovy", file_path, 2))
+
+        for test_name, file_path, min_errors in recovery_tests:
+            results.append((test_name, run_recovery_test(test_name, file_path, min_errors)))
+
+        stream_tests = [(f"test_programs/{name}", None) for name in
+                        ("test_correct.joovy", "test_errors.joovy", "test_syntax_errors.joovy")]
+        for i, (text, first_error) in enumerate(stream_sources):
+            file_path = os.path.join(directory, f"stream_{i}.joovy")
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            stream_tests.append((file_path, first_error))
+
+        for file_path, first_error in stream_tests:
+            test_name = f"Stream: {os.path.basename(file_path)}"
+            results.append((test_name, run_stream_test(test_name, file_path, first_error)))
+
     # Summary
     print("\n" + "=" * 70)
     print("TESTING SUMMARY")
@@ -1,6 +1,40 @@
+import io
 import os
-from lexer.lexer import start
+import time
+import glob
+import tempfile
+import contextlib
+from lexer.lexer import start, Lexer, engines
 from lexer import globals as g
+from lexer import cache
+from diagnostics import configure, Diagnostics, Collector, printSink, ERROR, INFO
+import parser
+from translator import translator
+from clr_translator import clr_translator
+from translator.postfix_vm import engines as vm_engines
+
+# Sources with lexical errors for the lexer engine tests
+error_sources = [
+    "int x = 5\nint y = @10\n",
+    "bool flag = ! true\nint 123var = 5\n",
+    "string s = \"never closed\nint x = 1\n",
+    "float f = 1.5.2 # $\n// comment without new line",
+    "int a = 1\n" * 20 + "int b = a @ 2\n" + "string s = \"a b c d e f g h\"\n" * 20,
+]
+
+# Postfix code with runtime errors for the VM engine tests
+error_programs = [
+    ("Underflow in assignment", [('x', 'IDENTIFIER_LVALUE'), (':=', 'ASSIGN_OP')], {}),
+    ("Underflow for operator", [('1', 'INT'), ('+', 'ADD_OP')], {}),
+    ("Underflow for NEG", [('NEG', 'UNARY_OP')], {}),
+    ("Underflow in JF", [('m1', 'LABEL'), ('JUMP_IF_FALSE', 'JUMP_IF_FALSE'), ('m1', 'LABEL'), (':', 'COLON')], {'m1': 2}),
+    ("Underflow in PRINT", [('1', 'INT'), ('3', 'INT'), ('PRINT', 'PRINT_OP')], {}),
+    ("Division by zero", [('1', 'INT'), ('0', 'INT'), ('/', 'MULT_OP'), ('x', 'IDENTIFIER_LVALUE'), (':=', 'ASSIGN_OP')], {}),
+    ("Division by a zero variable", [('0', 'INT'), ('z', 'IDENTIFIER_LVALUE'), (':=', 'ASSIGN_OP'),
+                                     ('1', 'INT'), ('z', 'IDENTIFIER'), ('/', 'MULT_OP'), ('1', 'INT'), ('PRINT', 'PRINT_OP')], {}),
+    ("Undefined variable", [('1', 'INT'), ('y', 'IDENTIFIER'), ('+', 'ADD_OP')], {}),
+    ("Undefined variable before underflow", [('y', 'IDENTIFIER'), ('+', 'ADD_OP')], {}),
+]
 
 def run_test(test_name, file_path, expect_errors=False):
     print("\n" + "=" * 70)
@@ -28,7 +62,272 @@ def run_test(test_name, file_path, expect_errors=False):
             print(f"\n✗ Test '{test_name}' Failed")
             return False
 
+def lex_with(file_path, engine, compact=False, workers=1, chunk_size=1 << 20):
+    """Lexes the file with a new Lexer, returns its tables and error messages"""
+    collector = Collector()
+    lx = Lexer(Diagnostics(ERROR, collector), compact)
+    if engine == 'stream':
+        symbols = [tuple(token) for token in lx.streamTokens(file_path, 16)]
+    else:
+        lx.start(file_path, engine, workers, chunk_size)
+        symbols = [tuple(token) for token in lx.tableOfSymb.values()]
+    return symbols, lx.tableOfId, lx.tableOfConst, collector.errors()
+
+
+def run_lexer_engines_test(test_name, file_path):
+    """Checks that every lexer engine and mode gives the tables and errors of the classic lexer"""
+    print("\n" + "=" * 70)
+    print(f"Test: {test_name}")
+    print("=" * 70)
+
+    expected = lex_with(file_path, 'classic')
+    variants = [(f"{engine}{' compact' if compact else ''}", dict(engine=engine, compact=compact))
+                for engine in engines for compact in (False, True)]
+    variants.append(('stream', dict(engine='stream')))
+    variants += [(f'{engine} in chunks', dict(engine=engine, compact=True, workers=2, chunk_size=32))
+                 for engine in engines]
+
+    failed = []
+    for name, options in variants:
+        if lex_with(file_path, **options) != expected:
+            failed.append(name)
+
+    if failed:
+        print(f"\n✗ Test '{test_name}' Failed ({', '.join(failed)})")
+        return False
+    print(f"\n✓ Test '{test_name}' Passed ({len(variants)} engines and modes, {len(expected[3])} errors)")
+    return True
+
+
+def lex_cached(file_path, compact):
+    """Lexes the file with the cache enabled, returns its tables and
+    whether they were loaded from the cache"""
+    collector = Collector()
+    lx = Lexer(Diagnostics(INFO, collector), compact)
+    lx.start(file_path)
+    symbols = [tuple(token) for token in lx.tableOfSymb.values()]
+    hit = any('loaded from the cache' in message for _, message in collector.messages)
+    return (symbols, lx.tableOfId, lx.tableOfConst, collector.errors()), hit
+
+
+def run_cache_test(test_name, file_path):
+    """Checks hits and misses, CRC rejection, both table modes and the
+    removal of temporary files of the token cache"""
+    print("\n" + "=" * 70)
+    print(f"Test: {test_name}")
+    print("=" * 70)
+
+    expected = lex_with(file_path, 'classic')
+    saved = cache.directory
+    failed = []
+    with tempfile.TemporaryDirectory() as directory:
+        cache.configure(directory)
+        try:
+            # Each table mode has its own entry
+            entries = []
+            for compact in (False, True):
+                mode = 'compact' if compact else 'dict'
+                if lex_cached(file_path, compact) != (expected, False):
+                    failed.append(f"miss {mode}")
+                stored = set(glob.glob(os.path.join(directory, '*' + cache.SUFFIX))) - set(entries)
+                if len(stored) != 1:
+                    failed.append(f"store {mode}")
+                entries += stored
+                if lex_cached(file_path, compact) != (expected, True):
+                    failed.append(f"hit {mode}")
+
+            # A corrupted entry is a miss, and is written again
+            with open(entries[-1], 'r+b') as f:
+                f.seek(cache.header.size)
+                byte = f.read(1)
+                f.seek(cache.header.size)
+                f.write(bytes([byte[0] ^ 0xff]))
+            if lex_cached(file_path, True) != (expected, False):
+                failed.append("CRC")
+            if lex_cached(file_path, True) != (expected, True):
+                failed.append("rewrite")
+
+            # A writer that fails leaves no temporary file
+            lx = Lexer(Diagnostics(), compact=True)
+            lx.start(file_path)
+            # Offsets past 4 GiB are kept
+            lx.tableOfSymb.ends[-1] = 5 << 30
+            loaded = Lexer(Diagnostics(), compact=True)
+            loaded.sourceCode, loaded.lenCode = lx.sourceCode, lx.lenCode
+            if not cache.store(lx, 'large') or not cache.load(loaded, 'large') \
+                    or loaded.tableOfSymb.ends[-1] != 5 << 30:
+                failed.append("large offsets")
+
+            os.mkdir(cache.entryPath('blocked'))
+            if cache.store(lx, 'blocked') or glob.glob(os.path.join(directory, '*' + cache.TMP_SUFFIX)):
+                failed.append("failed write")
+
+            # Temporary files of dead writers are removed once they are stale
+            old = os.path.join(directory, 'old' + cache.TMP_SUFFIX)
+            new = os.path.join(directory, 'new' + cache.TMP_SUFFIX)
+            for path in (old, new):
+                open(path, 'wb').close()
+            past = time.time() - cache.staleSeconds - 60
+            os.utime(old, (past, past))
+            cache.evict()
+            if os.path.exists(old) or not os.path.exists(new):
+                failed.append("stale temporary files")
+        finally:
+            cache.configure(saved)
+
+    if failed:
+        print(f"\n✗ Test '{test_name}' Failed ({', '.join(failed)})")
+        return False
+    print(f"\n✓ Test '{test_name}' Passed")
+    return True
+
+
+def run_vm(engine, postfix_code, label_table):
+    """Runs the postfix code on the VM of engine, returns success, output,
+    variables and the message of the runtime error"""
+    collector = Collector()
+    configure(ERROR, collector)
+    vm = vm_engines[engine](list(postfix_code), dict(label_table))
+    vm.debug = False
+    vm.read_input = lambda name: 3
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            success = vm.run()
+    finally:
+        configure(INFO, printSink)
+
+    errors = [message for message in collector.errors() if 'RUNTIME ERROR' in message]
+    error = errors[0].split(': ', 1)[1] if errors else None
+    return success, vm.get_output(), vm.get_variables(), error
+
+
+def run_vm_engines_test(test_name, postfix_code, label_table):
+    """Checks that every VM engine runs the code like the tuple VM"""
+    print("\n" + "=" * 70)
+    print(f"Test: {test_name}")
+    print("=" * 70)
+
+    expected = run_vm('tuple', postfix_code, label_table)
+    failed = [engine for engine in vm_engines if run_vm(engine, postfix_code, label_table) != expected]
+
+    if failed:
+        print(f"\n✗ Test '{test_name}' Failed ({', '.join(failed)})")
+        return False
+    print(f"\n✓ Test '{test_name}' Passed ({expected[3] or 'no error'})")
+    return True
+
+
+def translate_file(file_path):
+    """Postfix code and label table of the file, None if it does not translate"""
+    configure(ERROR, Collector())
+    try:
+        success, postfix_code, label_table = translator.start(file_path)
+    finally:
+        configure(INFO, printSink)
+    return (postfix_code, label_table) if success else None
+
+
+def run_deep_nesting_test(test_name, depth):
+    """Checks that both translators handle blocks nested deeper than the
+    Python recursion limit"""
+    print("\n" + "=" * 70)
+    print(f"Test: {test_name}")
+    print("=" * 70)
+
+    text = ("int x = 1\n" + "if (x > 0) {\nfor (i in 1..2) {\n" * depth + "x = x + 1\n"
+            + "}\n} else {\nprint(x)\n}\n" * depth)
+    failed = []
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "deep.joovy")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        configure(ERROR, Collector())
+        try:
+            success, postfix_code, label_table = translator.start(file_path)
+            if not success or len(label_table) != 4 * depth:
+                failed.append("postfix")
+            success, cil_code = clr_translator.start(file_path)
+            if not success or sum(line.startswith("  IL_") for line in cil_code) != 4 * depth:
+                failed.append("CIL")
+        finally:
+            configure(INFO, printSink)
+
+    if failed:
+        print(f"\n✗ Test '{test_name}' Failed ({', '.join(failed)})")
+        return False
+    print(f"\n✓ Test '{test_name}' Passed")
+    return True
+
+
+def run_lazy_body_test(test_name):
+    """Checks that a broken body of a lazily parsed function fails both
+    translators with plain messages and leaves the parser state alone"""
+    print("\n" + "=" * 70)
+    print(f"Test: {test_name}")
+    print("=" * 70)
+
+    text = "def f() {\n    int = 1\n}\nint x = 1\nf()\nprint(x)\n"
+    expected = "\nTranslation ERROR: invalid body of function 'f'"
+    failed = []
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "lazy.joovy")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+        for name, module in (("postfix", translator), ("CIL", clr_translator)):
+            collector = Collector()
+            configure(ERROR, collector)
+            try:
+                success = module.start(file_path, lazy=True)[0]
+            finally:
+                configure(INFO, printSink)
+            errors = collector.errors()
+            if success or errors[-1:] != [expected] or any('Traceback' in error for error in errors):
+                failed.append(name)
+
+        configure(ERROR, Collector())
+        try:
+            program = parser.parseFile(file_path, lazy=True)
+            state = (parser.numRow, parser.tableOfSymb, parser.parseErrors, parser.blockStack)
+            if parser.parseFunctionBody(program.body[0]) is not None:
+                failed.append("body")
+            if (parser.numRow, parser.tableOfSymb, parser.parseErrors, parser.blockStack) != state:
+                failed.append("parser state")
+        finally:
+            configure(INFO, printSink)
+
+    if failed:
+        print(f"\n✗ Test '{test_name}' Failed ({', '.join(failed)})")
+        return False
+    print(f"\n✓ Test '{test_name}' Passed")
+    return True
+
+
+def run_cil_test(test_name, file_path):
+    """Checks the CIL code of the file against its golden .il file"""
+    print("\n" + "=" * 70)
+    print(f"Test: {test_name}")
+    print("=" * 70)
+
+    configure(ERROR, Collector())
+    try:
+        success, cil_code = clr_translator.start(file_path)
+    finally:
+        configure(INFO, printSink)
+
+    with open(file_path.replace('.joovy', '.il'), encoding='utf-8') as f:
+        expected = f.read()
+    if not success or '\n'.join(cil_code) + '\n' != expected:
+        print(f"\n✗ Test '{test_name}' Failed (CIL code differs)")
+        return False
+    print(f"\n✓ Test '{test_name}' Passed")
+    return True
+
+
 def main():
+    configure(INFO)
+
     tests = [
         ("Base example", "test_programs/test_basic.joovy", False),
         ("Nested example", "test_programs/test_nested.joovy", False),
@@ -41,6 +340,42 @@ def main():
         success = run_test(test_name, file_path, expect_errors)
         results.append((test_name, success))
 
+    sources = sorted(glob.glob("test_programs/*.joovy"))
+    with tempfile.TemporaryDirectory() as directory:
+        for i, text in enumerate(error_sources):
+            file_path = os.path.join(directory, f"error_{i}.joovy")
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            sources.append(file_path)
+
+        for file_path in sources:
+            test_name = f"Lexer engines: {os.path.basename(file_path)}"
+            results.append((test_name, run_lexer_engines_test(test_name, file_path)))
+
+    test_name = "Token cache"
+    results.append((test_name, run_cache_test(test_name, "test_programs/test_basic.joovy")))
+
+    test_name = "Deep nesting"
+    results.append((test_name, run_deep_nesting_test(test_name, 5000)))
+
+    test_name = "Lazy function body"
+    results.append((test_name, run_lazy_body_test(test_name)))
+
+    # Programs that only the CIL back end runs to the end are in cil/
+    for il_path in sorted(glob.glob("test_programs/**/*.il", recursive=True)):
+        test_name = f"CIL: {os.path.basename(il_path)}"
+        results.append((test_name, run_cil_test(test_name, il_path.replace('.il', '.joovy'))))
+
+    programs = []
+    for file_path in sorted(glob.glob("test_programs/*.joovy")):
+        translated = translate_file(file_path)
+        if translated is not None:
+            programs.append((os.path.basename(file_path), *translated))
+
+    for test_name, postfix_code, label_table in programs + error_programs:
+        test_name = f"VM engines: {test_name}"
+        results.append((test_name, run_vm_engines_test(test_name, postfix_code, label_table)))
+
     print("\n" + "=" * 70)
     print("Testing Result")
     print("=" * 70)
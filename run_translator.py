@@ -2,6 +2,8 @@ import sys
 import argparse
 from translator.translator import start as translate_start
 from translator.postfix_vm import execute_postfix
+from diagnostics import configure, INFO, TRACE
+from lexer import cache as token_cache
 
 
 def print_postfix_code(postfix_code):
@@ -70,6 +72,9 @@ Examples:
   
   # Save postfix code to file
   python run_translator.py program.joovy --save-postfix
+
+  # Trace every token, production and generated instruction
+  python run_translator.py program.joovy --trace
         """
     )
 
@@ -80,8 +85,17 @@ Examples:
                         help='Enable debug output during execution')
     parser.add_argument('--save-postfix', action='store_true',
                         help='Save generated postfix code to file')
+    parser.add_argument('--trace', action='store_true',
+                        help='Show the lexer tables and translation trace')
+    parser.add_argument('--token-cache', metavar='DIR',
+                        help='Reuse the tokens of unchanged sources from DIR (default: $JOOVY_TOKEN_CACHE)')
+    parser.add_argument('--lazy', action='store_true',
+                        help='Parse a function body only when a call to it is translated')
 
     args = parser.parse_args()
+    configure(TRACE if args.trace else INFO)
+    if args.token_cache:
+        token_cache.configure(args.token_cache)
 
     print("=" * 70)
     print("JOOVY COMPILER AND INTERPRETER")
@@ -90,7 +104,7 @@ Examples:
     print("=" * 70)
 
     # Step 1: Lexical analysis and translation
-    success, postfix_code, label_table = translate_start(args.file)
+    success, postfix_code, label_table = translate_start(args.file, lazy=args.lazy)
 
     if not success:
         print("\n✗ Compilation failed")
@@ -1,4 +1,4 @@
 from .translator import start, translate
-from .postfix_vm import execute_postfix, PostfixVM
+from .postfix_vm import execute_postfix, PostfixVM, BytecodeVM, DispatchVM, CompiledVM
 
-__all__ = ['start', 'translate', 'execute_postfix', 'PostfixVM']
+__all__ = ['start', 'translate', 'execute_postfix', 'PostfixVM', 'BytecodeVM', 'DispatchVM', 'CompiledVM']
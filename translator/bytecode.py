@@ -0,0 +1,212 @@
+from array import array
+
+# Postfix code lowered to integer instructions
+#
+# Every instruction is two ints in an array('i'), the opcode and its
+# operand (0 when it has none). Jump operands are the absolute index of the
+# target instruction in the array, so labels are resolved once here and the
+# LABEL pushes and ':' entries of the postfix code are not executed at all.
+# Every name gets a slot, its index in names; variables are read and
+# assigned by slot.
+
+# Opcodes
+PUSH_CONST = 0      # The decoded constant consts[arg]
+LOAD_SLOT = 1       # Value of the variable in slot arg
+STORE_SLOT = 2      # Pops the value of the variable in slot arg
+PUSH_NAME = 3       # The string names[arg]: target of ASSIGN or INPUT, or a label
+ASSIGN = 4          # Pops the target, then the value
+ADD = 5
+SUB = 6
+MUL = 7
+DIV = 8
+POW = 9
+EQ = 10
+NE = 11
+LT = 12
+LE = 13
+GT = 14
+GE = 15
+NEG = 16
+JMP = 17            # Jumps to arg
+JF = 18             # Pops the condition, jumps to arg if it is false
+JMP_LABEL = 19      # Pops a label name and jumps to it
+JF_LABEL = 20       # Pops a label name, then the condition
+PRINT = 21          # Prints the top arg values
+PRINT_COUNT = 22    # Pops the number of values to print first
+INPUT = 23          # Pops the name of the variable to read
+EXEC = 24           # Executes the postfix entry tuples[arg] as it is
+
+opNames = ['PUSH_CONST', 'LOAD_SLOT', 'STORE_SLOT', 'PUSH_NAME', 'ASSIGN', 'ADD', 'SUB', 'MUL', 'DIV',
+           'POW', 'EQ', 'NE', 'LT', 'LE', 'GT', 'GE', 'NEG', 'JMP', 'JF', 'JMP_LABEL', 'JF_LABEL',
+           'PRINT', 'PRINT_COUNT', 'INPUT', 'EXEC']
+
+# Value of the lexeme of every constant token
+decoders = {
+    'INT': int,
+    'FLOAT': float,
+    'BOOL': lambda lexeme: lexeme == 'true',
+    'STRING': lambda lexeme: lexeme.strip('"'),
+}
+
+# Postfix tokens whose lexeme is an operand of the opcode
+nameOps = {'IDENTIFIER': LOAD_SLOT, 'IDENTIFIER_LVALUE': PUSH_NAME, 'LABEL': PUSH_NAME}
+
+# Postfix tokens whose lexeme selects the opcode
+operatorOps = {
+    'ADD_OP': {'+': ADD, '-': SUB},
+    'MULT_OP': {'*': MUL, '/': DIV},
+    'POWER_OP': {'^': POW},
+    'COMPARE_OP': {'==': EQ, '!=': NE, '<': LT, '<=': LE, '>': GT, '>=': GE},
+    'UNARY_OP': {'NEG': NEG},
+}
+
+# Postfix tokens of one opcode without operand
+simpleOps = {
+    'ASSIGN_OP': ASSIGN,
+    'JUMP': JMP_LABEL,
+    'JUMP_IF_FALSE': JF_LABEL,
+    'PRINT_OP': PRINT_COUNT,
+    'INPUT_OP': INPUT,
+}
+
+# Jump that a LABEL push before it is folded into
+labelJumps = {'JUMP': JMP, 'JUMP_IF_FALSE': JF}
+
+
+class Bytecode:
+    """Lowered postfix program.
+
+    code holds the (opcode, operand) pairs; consts (the constant pool, with
+    the values of the literals decoded once), names and tuples are the
+    operand tables of the opcodes that need one, labels maps every label to
+    the index of its instruction in code, and origin[i // 2] is the position
+    of the postfix entry the instruction at i comes from, for messages.
+    """
+
+    def __init__(self, code, consts, names, tuples, labels, origin):
+        self.code = code
+        self.consts = consts
+        self.names = names
+        self.tuples = tuples
+        self.labels = labels
+        self.origin = origin
+
+    def describe(self, ip):
+        """Readable form of the instruction at ip"""
+        op, arg = self.code[ip], self.code[ip + 1]
+        name = opNames[op]
+        if op == PUSH_CONST:
+            return f"{name} {self.consts[arg]!r}"
+        if op <= PUSH_NAME:
+            return f"{name} {self.names[arg]}"
+        if op == EXEC:
+            return f"{name} {self.tuples[arg]}"
+        if op in (JMP, JF, PRINT):
+            return f"{name} {arg}"
+        return name
+
+    def disassemble(self):
+        """List of the readable instructions"""
+        return [f"{ip:5d}: {self.describe(ip)}" for ip in range(0, len(self.code), 2)]
+
+
+def tableIndex(table, index, key, value):
+    """Index of the value with key in the operand table, added if it is new"""
+    i = index.get(key)
+    if i is None:
+        i = index[key] = len(table)
+        table.append(value)
+    return i
+
+
+def constIndex(consts, index, lexeme, token):
+    """Index of the constant in the pool, None if its lexeme has no value"""
+    key = (token, lexeme)
+    if key not in index:
+        try:
+            value = decoders[token](lexeme)
+        except ValueError:
+            return None
+        tableIndex(consts, index, key, value)
+    return index[key]
+
+
+def lower(postfixCode, tableOfLabels):
+    """Lowers (lexeme, token) postfix code to Bytecode.
+
+    A LABEL push is folded into the JMP or JF after it and a label
+    definition (LABEL ':') is dropped; the label names they left on the
+    stack are not pushed any more. PRINT gets the count pushed before it as
+    its operand, and an assignment to a name becomes STORE_SLOT. Entries
+    that a label points at are never folded into the
+    entry before them, and a LABEL whose label does not exist is kept as a
+    push of its name, so the jump fails at run time like before. Unknown
+    tokens and operators become EXEC of the entry, and so do constants
+    that cannot be decoded, which fail when they are executed.
+    """
+    targets = set(tableOfLabels.values())
+    consts, constsIndex = [], {}
+    names, nameIndex = [], {}
+    tuples = []
+    ops = []            # (opcode, operand or label name, postfix position)
+    newIndex = []       # Postfix position -> index in ops
+
+    n = len(postfixCode)
+    i = 0
+    while i < n:
+        lexeme, token = postfixCode[i]
+        newIndex.append(len(ops))
+        nextToken = postfixCode[i + 1][1] if i + 1 < n and i + 1 not in targets else None
+
+        if token == 'LABEL' and nextToken == 'COLON':
+            newIndex.append(len(ops))
+            i += 2
+            continue
+
+        if token == 'LABEL' and nextToken in labelJumps and lexeme in tableOfLabels:
+            newIndex.append(len(ops))
+            ops.append((labelJumps[nextToken], lexeme, i))
+            i += 2
+            continue
+
+        if token == 'IDENTIFIER_LVALUE' and nextToken == 'ASSIGN_OP':
+            newIndex.append(len(ops))
+            ops.append((STORE_SLOT, tableIndex(names, nameIndex, lexeme, lexeme), i))
+            i += 2
+            continue
+
+        if token == 'INT' and nextToken == 'PRINT_OP' and lexeme.isdigit():
+            newIndex.append(len(ops))
+            ops.append((PRINT, int(lexeme), i))
+            i += 2
+            continue
+
+        const = constIndex(consts, constsIndex, lexeme, token) if token in decoders else None
+
+        if token == 'COLON':
+            pass
+        elif const is not None:
+            ops.append((PUSH_CONST, const, i))
+        elif token in nameOps:
+            ops.append((nameOps[token], tableIndex(names, nameIndex, lexeme, lexeme), i))
+        elif token in simpleOps:
+            ops.append((simpleOps[token], 0, i))
+        elif lexeme in operatorOps.get(token, ()):
+            ops.append((operatorOps[token][lexeme], 0, i))
+        else:
+            tuples.append((lexeme, token))
+            ops.append((EXEC, len(tuples) - 1, i))
+        i += 1
+    newIndex.append(len(ops))
+
+    labels = {label: 2 * newIndex[position] for label, position in tableOfLabels.items()}
+    code = array('i')
+    origin = array('i')
+    for op, arg, position in ops:
+        if op == JMP or op == JF:
+            arg = labels[arg]
+        code.append(op)
+        code.append(arg)
+        origin.append(position)
+
+    return Bytecode(code, consts, names, tuples, labels, origin)
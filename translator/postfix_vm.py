@@ -1,3 +1,8 @@
+from diagnostics import diag
+from .bytecode import *
+from .pygen import compileBytecode
+
+
 class PostfixVM:
     """Virtual machine for executing postfix code"""
 
@@ -11,9 +16,9 @@ class PostfixVM:
 
     def run(self):
         """Executes postfix code"""
-        print("\n" + "=" * 60)
-        print("EXECUTING POSTFIX CODE")
-        print("=" * 60 + "\n")
+        diag.info("\n" + "=" * 60)
+        diag.info("EXECUTING POSTFIX CODE")
+        diag.info("=" * 60 + "\n")
 
         try:
             while self.ip < len(self.code):
@@ -30,17 +35,17 @@ class PostfixVM:
                 else:
                     delattr(self, '_jumped')
 
-            print("\n" + "=" * 60)
-            print("✓ EXECUTION COMPLETED SUCCESSFULLY")
-            print("=" * 60)
+            diag.info("\n" + "=" * 60)
+            diag.info("✓ EXECUTION COMPLETED SUCCESSFULLY")
+            diag.info("=" * 60)
             return True
 
         except Exception as e:
-            print(f"\n✗ RUNTIME ERROR at position {self.ip}: {e}")
-            print(f"   Instruction: {self.code[self.ip] if self.ip < len(self.code) else 'EOF'}")
-            print(f"   Stack: {self.stack}")
+            diag.error(f"\n✗ RUNTIME ERROR at position {self.ip}: {e}")
+            diag.error(f"   Instruction: {self.code[self.ip] if self.ip < len(self.code) else 'EOF'}")
+            diag.error(f"   Stack: {self.stack}")
             import traceback
-            traceback.print_exc()
+            diag.error(traceback.format_exc())
             return False
 
     def execute_instruction(self, lexeme, token):
@@ -102,7 +107,7 @@ class PostfixVM:
             self.execute_input()
 
         else:
-            print(f"Warning: Unknown token '{token}' for lexeme '{lexeme}'")
+            diag.warning(f"Warning: Unknown token '{token}' for lexeme '{lexeme}'")
 
     def push_constant(self, lexeme, token):
         """Pushes constant onto stack"""
@@ -142,7 +147,7 @@ class PostfixVM:
         var_name = self.stack.pop()  # Top: variable name
         value = self.stack.pop()     # Next: value
 
-        self.variables[var_name] = value
+        self.store_variable(var_name, value)
 
         if self.debug:
             print(f"   Assigned: {var_name} = {value}")
@@ -267,8 +272,10 @@ class PostfixVM:
             values.append(self.stack.pop())
 
         values.reverse()
+        self.write_output(values)
 
-        # Print
+    def write_output(self, values):
+        """Prints the values of a print operation"""
         output = ' '.join(str(v) for v in values)
         print(f"OUTPUT: {output}")
         self.output.append(output)
@@ -279,7 +286,10 @@ class PostfixVM:
             raise RuntimeError("Stack underflow in INPUT")
 
         var_name = self.stack.pop()
+        self.store_variable(var_name, self.read_input(var_name))
 
+    def read_input(self, var_name):
+        """Reads the value of an input operation"""
         try:
             value_str = input(f"INPUT {var_name}: ")
 
@@ -293,11 +303,15 @@ class PostfixVM:
                 # Keep as string
                 value = value_str
 
-            self.variables[var_name] = value
+            return value
 
         except EOFError:
-            print(f"\nEOF reached, setting {var_name} = 0")
-            self.variables[var_name] = 0
+            diag.warning(f"\nEOF reached, setting {var_name} = 0")
+            return 0
+
+    def store_variable(self, name, value):
+        """Stores the value of an assignment or input"""
+        self.variables[name] = value
 
     def get_output(self):
         """Returns collected output"""
@@ -308,34 +322,577 @@ class PostfixVM:
         return self.variables.copy()
 
 
-def execute_postfix(postfix_code, label_table, debug=False):
-    """Executes postfix code"""
-    vm = PostfixVM(postfix_code, label_table)
+# Value of a slot whose variable is not assigned yet
+UNSET = object()
+
+# Operator of every operator opcode, as PostfixVM names it in messages
+operator_lexemes = {op: lexeme for ops in operatorOps.values() for lexeme, op in ops.items()}
+
+# Message of PostfixVM for the other opcodes that pop more values than the
+# stack has; a folded label or name counts as pushed
+underflow_messages = {
+    STORE_SLOT: "Stack underflow in assignment",
+    ASSIGN: "Stack underflow in assignment",
+    JF: "Stack underflow in JF",
+    JF_LABEL: "Stack underflow in JF",
+    JMP_LABEL: "Stack underflow in JMP",
+    PRINT_COUNT: "Stack underflow in PRINT",
+    INPUT: "Stack underflow in INPUT",
+}
+
+
+def underflow_error(op, arg):
+    """RuntimeError of PostfixVM for an instruction that finds too few
+    values on the stack"""
+    if op in operator_lexemes:
+        return RuntimeError(f"Stack underflow for operator '{operator_lexemes[op]}'")
+    if op == PRINT:
+        return RuntimeError(f"Stack underflow: need {arg} values for PRINT")
+    return RuntimeError(underflow_messages[op])
+
+
+class BytecodeVM(PostfixVM):
+    """Virtual machine for postfix code lowered to Bytecode.
+
+    Takes a Bytecode, or (lexeme, token) postfix code and its label table,
+    which are lowered first. Variables, output, input and the runtime
+    errors are the ones of PostfixVM; an instruction checks the depth of
+    the stack before it pops, like the PostfixVM instruction it replaces.
+    The values of the variables are kept in slots, a list with one item
+    per name of the bytecode; variables only holds what an assignment
+    stores under a target that is not a name.
+    """
+
+    def __init__(self, postfix_code, label_table=None):
+        if not isinstance(postfix_code, Bytecode):
+            postfix_code = lower(postfix_code, label_table or {})
+        super().__init__(postfix_code.code, postfix_code.labels)
+        self.bytecode = postfix_code
+        self.debug = False
+        self.slots = [UNSET] * len(postfix_code.names)
+        self.slot_of = {name: slot for slot, name in enumerate(postfix_code.names)}
+
+    def store_variable(self, name, value):
+        """Stores the value in the slot of name"""
+        slot = self.slot_of.get(name)
+        if slot is None:
+            self.variables[name] = value
+        else:
+            self.slots[slot] = value
+
+    def load_slot(self, slot):
+        """Value of the variable in slot"""
+        value = self.slots[slot]
+        if value is UNSET:
+            raise RuntimeError(f"Undefined variable '{self.bytecode.names[slot]}'")
+        return value
+
+    def get_variables(self):
+        """Returns variable state, by name"""
+        variables = {name: value for name, value in zip(self.bytecode.names, self.slots)
+                     if value is not UNSET}
+        variables.update(self.variables)
+        return variables
+
+    def run(self):
+        """Executes the bytecode"""
+        diag.info("\n" + "=" * 60)
+        diag.info("EXECUTING BYTECODE")
+        diag.info("=" * 60 + "\n")
+
+        bytecode = self.bytecode
+        code = bytecode.code
+        consts = bytecode.consts
+        names = bytecode.names
+        stack = self.stack
+        slots = self.slots
+        end = len(code)
+        ip = at = self.ip
+
+        try:
+            while ip < end:
+                at = ip
+                op = code[ip]
+                arg = code[ip + 1]
+                ip += 2
+
+                if self.debug:
+                    print(f"[{at}] Execute: {bytecode.describe(at)} | Stack: {stack}")
+
+                if op == LOAD_SLOT:
+                    value = slots[arg]
+                    if value is UNSET:
+                        value = self.load_slot(arg)
+                    stack.append(value)
+                elif op == STORE_SLOT:
+                    if not stack:
+                        raise underflow_error(op, arg)
+                    slots[arg] = stack.pop()
+                elif op == PUSH_NAME:
+                    stack.append(names[arg])
+                elif op == PUSH_CONST:
+                    stack.append(consts[arg])
+                elif op == ASSIGN:
+                    self.execute_assign()
+                elif op <= POW:
+                    if len(stack) < 2:
+                        raise underflow_error(op, arg)
+                    right = stack.pop()
+                    left = stack.pop()
+                    if op == ADD:
+                        stack.append(left + right)
+                    elif op == SUB:
+                        stack.append(left - right)
+                    elif op == MUL:
+                        stack.append(left * right)
+                    elif op == DIV:
+                        if right == 0:
+                            raise RuntimeError("Division by zero")
+                        stack.append(left / right)
+                    else:
+                        stack.append(left ** right)
+                elif op <= GE:
+                    if len(stack) < 2:
+                        raise underflow_error(op, arg)
+                    right = stack.pop()
+                    left = stack.pop()
+                    if op == EQ:
+                        stack.append(left == right)
+                    elif op == NE:
+                        stack.append(left != right)
+                    elif op == LT:
+                        stack.append(left < right)
+                    elif op == LE:
+                        stack.append(left <= right)
+                    elif op == GT:
+                        stack.append(left > right)
+                    else:
+                        stack.append(left >= right)
+                elif op == NEG:
+                    if not stack:
+                        raise underflow_error(op, arg)
+                    stack.append(-stack.pop())
+                elif op == JMP:
+                    ip = arg
+                elif op == JF:
+                    if not stack:
+                        raise underflow_error(op, arg)
+                    if not stack.pop():
+                        ip = arg
+                elif op == PRINT:
+                    stack.append(arg)
+                    self.execute_print()
+                elif op == PRINT_COUNT:
+                    self.execute_print()
+                elif op == INPUT:
+                    self.execute_input()
+                elif op == JMP_LABEL:
+                    if not stack:
+                        raise underflow_error(op, arg)
+                    ip = self.label_target(stack.pop())
+                elif op == JF_LABEL:
+                    if len(stack) < 2:
+                        raise underflow_error(op, arg)
+                    label = stack.pop()
+                    if not stack.pop():
+                        ip = self.label_target(label)
+                else:
+                    self.execute_instruction(*bytecode.tuples[arg])
+
+            self.ip = ip
+            diag.info("\n" + "=" * 60)
+            diag.info("✓ EXECUTION COMPLETED SUCCESSFULLY")
+            diag.info("=" * 60)
+            return True
+
+        except Exception as e:
+            self.ip = at
+            diag.error(f"\n✗ RUNTIME ERROR at position {bytecode.origin[at // 2]}: {e}")
+            diag.error(f"   Instruction: {bytecode.describe(at)}")
+            diag.error(f"   Stack: {stack}")
+            import traceback
+            diag.error(traceback.format_exc())
+            return False
+
+    def label_target(self, label):
+        """Instruction index of a label popped by a jump"""
+        if label not in self.labels:
+            raise RuntimeError(f"Undefined label '{label}'")
+        return self.labels[label]
+
+
+class DispatchVM(BytecodeVM):
+    """Bytecode virtual machine with a dispatch table.
+
+    Every instruction is bound to the handler of its opcode and to its
+    operand once, when the program is loaded. A handler takes the operand
+    and the index of its instruction and returns the index of the next one,
+    so the loop keeps the instruction pointer in a local and does nothing
+    but call handlers. Tracing for debug runs in a loop of its own.
+    """
+
+    def __init__(self, postfix_code, label_table=None):
+        super().__init__(postfix_code, label_table)
+        handlers = self.bind_handlers()
+        bytecode = self.bytecode
+        code = bytecode.code
+        operands = {
+            PUSH_CONST: bytecode.consts,
+            PUSH_NAME: bytecode.names,
+            EXEC: bytecode.tuples,
+        }
+
+        # (handler, operand) of every instruction; jump targets become
+        # instruction indexes
+        self.program = []
+        for ip in range(0, len(code), 2):
+            op, arg = code[ip], code[ip + 1]
+            if op in operands:
+                arg = operands[op][arg]
+            elif op == JMP or op == JF:
+                arg //= 2
+            self.program.append((handlers[op], arg))
+
+    def bind_handlers(self):
+        """Handler of every opcode, a closure over the VM state"""
+        stack = self.stack
+        push = stack.append
+        pop = stack.pop
+        slots = self.slots
+        load = self.load_slot
+        store = self.store_variable
+
+        def push_const(value, ip):
+            push(value)
+            return ip + 1
+
+        def load_slot(slot, ip):
+            value = slots[slot]
+            if value is UNSET:
+                value = load(slot)
+            push(value)
+            return ip + 1
+
+        def store_slot(slot, ip):
+            if not stack:
+                raise underflow_error(STORE_SLOT, slot)
+            slots[slot] = pop()
+            return ip + 1
+
+        def push_name(name, ip):
+            push(name)
+            return ip + 1
+
+        def assign(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(ASSIGN, arg)
+            target = pop()
+            store(target, pop())
+            return ip + 1
+
+        def add(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(ADD, arg)
+            right = pop()
+            push(pop() + right)
+            return ip + 1
+
+        def sub(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(SUB, arg)
+            right = pop()
+            push(pop() - right)
+            return ip + 1
+
+        def mul(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(MUL, arg)
+            right = pop()
+            push(pop() * right)
+            return ip + 1
+
+        def div(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(DIV, arg)
+            right = pop()
+            left = pop()
+            if right == 0:
+                raise RuntimeError("Division by zero")
+            push(left / right)
+            return ip + 1
+
+        def power(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(POW, arg)
+            right = pop()
+            push(pop() ** right)
+            return ip + 1
+
+        def eq(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(EQ, arg)
+            right = pop()
+            push(pop() == right)
+            return ip + 1
+
+        def ne(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(NE, arg)
+            right = pop()
+            push(pop() != right)
+            return ip + 1
+
+        def lt(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(LT, arg)
+            right = pop()
+            push(pop() < right)
+            return ip + 1
+
+        def le(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(LE, arg)
+            right = pop()
+            push(pop() <= right)
+            return ip + 1
+
+        def gt(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(GT, arg)
+            right = pop()
+            push(pop() > right)
+            return ip + 1
+
+        def ge(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(GE, arg)
+            right = pop()
+            push(pop() >= right)
+            return ip + 1
+
+        def neg(arg, ip):
+            if not stack:
+                raise underflow_error(NEG, arg)
+            push(-pop())
+            return ip + 1
+
+        def jump(target, ip):
+            return target
+
+        def jump_if_false(target, ip):
+            if not stack:
+                raise underflow_error(JF, target)
+            if pop():
+                return ip + 1
+            return target
+
+        def jump_label(arg, ip):
+            if not stack:
+                raise underflow_error(JMP_LABEL, arg)
+            return self.label_target(pop()) // 2
+
+        def jump_label_if_false(arg, ip):
+            if len(stack) < 2:
+                raise underflow_error(JF_LABEL, arg)
+            label = pop()
+            if pop():
+                return ip + 1
+            return self.label_target(label) // 2
+
+        def print_values(count, ip):
+            push(count)
+            self.execute_print()
+            return ip + 1
+
+        def print_count(arg, ip):
+            self.execute_print()
+            return ip + 1
+
+        def input_value(arg, ip):
+            self.execute_input()
+            return ip + 1
+
+        def execute(entry, ip):
+            self.execute_instruction(*entry)
+            return ip + 1
+
+        return [push_const, load_slot, store_slot, push_name, assign,
+                add, sub, mul, div, power, eq, ne, lt, le, gt, ge, neg,
+                jump, jump_if_false, jump_label, jump_label_if_false,
+                print_values, print_count, input_value, execute]
+
+    def run(self):
+        """Executes the bound program"""
+        diag.info("\n" + "=" * 60)
+        diag.info("EXECUTING BYTECODE")
+        diag.info("=" * 60 + "\n")
+
+        program = self.program
+        end = len(program)
+        ip = self.ip // 2
+
+        try:
+            if self.debug:
+                ip = self.run_debug(ip)
+            else:
+                while ip < end:
+                    handler, arg = program[ip]
+                    ip = handler(arg, ip)
+
+            self.ip = 2 * ip
+            diag.info("\n" + "=" * 60)
+            diag.info("✓ EXECUTION COMPLETED SUCCESSFULLY")
+            diag.info("=" * 60)
+            return True
+
+        except Exception as e:
+            if self.debug:
+                ip = self.ip // 2
+            self.ip = 2 * ip
+            diag.error(f"\n✗ RUNTIME ERROR at position {self.bytecode.origin[ip]}: {e}")
+            diag.error(f"   Instruction: {self.bytecode.describe(self.ip)}")
+            diag.error(f"   Stack: {self.stack}")
+            import traceback
+            diag.error(traceback.format_exc())
+            return False
+
+    def run_debug(self, ip):
+        """Executes the bound program printing every instruction"""
+        program = self.program
+        describe = self.bytecode.describe
+        while ip < len(program):
+            self.ip = 2 * ip
+            print(f"[{self.ip}] Execute: {describe(self.ip)} | Stack: {self.stack}")
+            handler, arg = program[ip]
+            ip = handler(arg, ip)
+        return ip
+
+
+class CompiledVM(BytecodeVM):
+    """Runs bytecode translated to a Python function.
+
+    The bytecode is translated once by translator.pygen and compiled with
+    compile(); the function then runs on CPython's own interpreter, with the
+    variables in its locals. The stack, output, input, variables dict,
+    slots and runtime errors of the VM are the ones of BytecodeVM; the
+    function uses them through the services passed to it. Its locals
+    start as UNSET, a read that may find one calls load_slot, and they are
+    copied to the slots when it ends. An error is reported at the
+    instruction of the line of the function that raised it.
+    """
+
+    def __init__(self, postfix_code, label_table=None):
+        super().__init__(postfix_code, label_table)
+        namespace = {}
+        code, self.line_origins = compileBytecode(self.bytecode)
+        exec(code, namespace)
+        self.function = namespace['_run']
+
+    def run(self):
+        """Calls the compiled function"""
+        diag.info("\n" + "=" * 60)
+        diag.info("EXECUTING COMPILED CODE")
+        diag.info("=" * 60 + "\n")
+
+        bytecode = self.bytecode
+        try:
+            self.function(self.stack.append, self.stack.pop, self.need, self.divide,
+                          self.load_slot, UNSET, self.print_values, self.execute_print, self.read_input, self.execute_tuple,
+                          self.label_index, frozenset(self.slot_of), self.variables, bytecode.consts,
+                          self.collect_locals)
+
+            self.ip = len(bytecode.code)
+            diag.info("\n" + "=" * 60)
+            diag.info("✓ EXECUTION COMPLETED SUCCESSFULLY")
+            diag.info("=" * 60)
+            return True
+
+        except Exception as e:
+            self.ip = 2 * self.error_index(e.__traceback__)
+            if self.ip < len(bytecode.code):
+                diag.error(f"\n✗ RUNTIME ERROR at position {bytecode.origin[self.ip // 2]}: {e}")
+                diag.error(f"   Instruction: {bytecode.describe(self.ip)}")
+            else:
+                diag.error(f"\n✗ RUNTIME ERROR: {e}")
+            diag.error(f"   Stack: {self.stack}")
+            import traceback
+            diag.error(traceback.format_exc())
+            return False
+
+    def error_index(self, tb):
+        """Instruction index of the last line of the function in the traceback"""
+        index = len(self.bytecode.code) // 2
+        while tb is not None:
+            if tb.tb_frame.f_code.co_filename == '<joovy>':
+                index = self.line_origins[tb.tb_lineno]
+            tb = tb.tb_next
+        return index
+
+    def need(self, count, index):
+        """Raises the underflow error of the instruction index when the
+        stack has fewer than count values"""
+        if len(self.stack) < count:
+            ip = 2 * index
+            raise underflow_error(self.bytecode.code[ip], self.bytecode.code[ip + 1])
+
+    def divide(self, left, right):
+        if right == 0:
+            raise RuntimeError("Division by zero")
+        return left / right
+
+    def print_values(self, *values):
+        self.write_output(values)
+
+    def execute_tuple(self, index):
+        self.execute_instruction(*self.bytecode.tuples[index])
+
+    def label_index(self, label):
+        return self.label_target(label) // 2
+
+    def collect_locals(self, names):
+        """Copies the variables of the function to the slots"""
+        for name, value in names.items():
+            if name[0] == 'v' and name[1:].isdigit():
+                self.slots[int(name[1:])] = value
+
+
+# Virtual machine of every execution engine
+engines = {
+    'tuple': PostfixVM,
+    'bytecode': BytecodeVM,
+    'dispatch': DispatchVM,
+    'python': CompiledVM,
+}
+
+
+def execute_postfix(postfix_code, label_table, debug=False, engine='tuple'):
+    """Executes postfix code with the virtual machine of engine"""
+    vm = engines[engine](postfix_code, label_table)
     vm.debug = debug
 
     success = vm.run()
 
     if success:
-        print("\n" + "=" * 60)
-        print("FINAL VARIABLE STATE:")
-        print("=" * 60)
+        diag.info("\n" + "=" * 60)
+        diag.info("FINAL VARIABLE STATE:")
+        diag.info("=" * 60)
 
         variables = vm.get_variables()
         if variables:
             for name, value in sorted(variables.items()):
-                print(f"  {name} = {value}")
+                diag.info(f"  {name} = {value}")
         else:
-            print("  (no variables)")
+            diag.info("  (no variables)")
 
-        print("\n" + "=" * 60)
-        print("PROGRAM OUTPUT:")
-        print("=" * 60)
+        diag.info("\n" + "=" * 60)
+        diag.info("PROGRAM OUTPUT:")
+        diag.info("=" * 60)
 
         output = vm.get_output()
         if output:
             for line in output:
-                print(f"  {line}")
+                diag.info(f"  {line}")
         else:
-            print("  (no output)")
+            diag.info("  (no output)")
 
     return success
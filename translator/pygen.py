@@ -0,0 +1,425 @@
+import math
+
+from .bytecode import *
+
+# Bytecode translated to the source of a Python function
+#
+# The values the postfix code keeps on its stack become Python expressions
+# while the translation walks the instructions, so 'a b + c :=' turns into
+# 'v2 = (v0 + v1)' and CPython evaluates it without any stack. Variables are
+# locals named after their slot. The jumps of if, if/else and loops become
+# Python if, else and while statements; code whose jumps do not nest like
+# that runs as a state machine, one state per basic block. A value still on
+# the stack where control flow splits or joins is pushed to the real stack
+# of the VM, and taken from there when an instruction needs more values than
+# the translation has, so the stack behaves as in the VM in all cases. Before
+# such an instruction the VM checks that its stack has the values, a
+# division checks its divisor, and a variable that may not be assigned yet
+# is checked against the UNSET of the VM when it is read, so the runtime
+# errors are the ones of the VM.
+
+# Python operator of every binary opcode
+binaryOps = {ADD: '+', SUB: '-', MUL: '*', DIV: '/', POW: '**',
+             EQ: '==', NE: '!=', LT: '<', LE: '<=', GT: '>', GE: '>='}
+
+# Deepest nesting of an expression before it is stored in a temporary
+maxDepth = 40
+
+# Arguments of the generated function, the services of the VM
+runtimeArgs = ('_push', '_pop', '_need', '_div', '_load', '_unset', '_print', '_print_count', '_input',
+               '_exec', '_label', '_names', '_vars', '_consts', '_done')
+
+# Line of the function source where its body starts
+bodyLine = 3
+
+indentUnit = '    '
+
+
+class Unstructured(Exception):
+    """The jumps of the bytecode do not nest as Python statements"""
+
+
+class Value:
+    """Python expression of a value on the stack"""
+    __slots__ = ('expr', 'depth', 'constant', 'slot', 'nonzero')
+
+    def __init__(self, expr, depth=0, constant=False, slot=None, nonzero=False):
+        self.expr = expr
+        self.depth = depth
+        self.constant = constant    # A literal, evaluating it does nothing
+        self.slot = slot            # Slot of the name it is, if it is one
+        self.nonzero = nonzero      # A literal that is not 0, a safe divisor
+
+
+class PythonGenerator:
+    """Generates the source of the function that runs the bytecode"""
+
+    def __init__(self, bytecode):
+        self.bytecode = bytecode
+        self.ops = bytecode.code[0::2]
+        self.args = bytecode.code[1::2]
+        self.count = len(self.ops)
+        self.slotOf = {name: slot for slot, name in enumerate(bytecode.names)}
+
+        # Instruction index of every static jump target, and the jumps back
+        # to every instruction
+        self.backJumps = {}
+        for i in range(self.count):
+            if self.ops[i] in (JMP, JF):
+                target = self.args[i] // 2
+                if target <= i:
+                    self.backJumps.setdefault(target, []).append(i)
+
+    # ========== EMITTING ==========
+
+    def reset(self, depth):
+        self.lines = []
+        self.origins = []       # Instruction index of every line
+        self.at = 0             # Instruction being translated
+        self.depth = depth
+        self.stack = []
+        self.temps = 0
+        self.assigned = set()   # Slots surely assigned at this point
+        if self.bytecode.names:
+            self.emit(' = '.join(f"v{slot}" for slot in range(len(self.bytecode.names))) + " = _unset")
+
+    def emit(self, line):
+        self.lines.append(indentUnit * self.depth + line)
+        self.origins.append(self.at)
+
+    def temp(self):
+        self.temps += 1
+        return f"_t{self.temps}"
+
+    def push(self, value):
+        self.stack.append(value)
+        if value.depth > maxDepth:
+            self.materialize(True)
+
+    def take(self, count):
+        """The top count values, in the order they were pushed. The ones the
+        translation does not have are taken from the VM stack, after the
+        values it has are evaluated, as the VM would have done already, and
+        the VM has checked that its stack holds them"""
+        missing = count - len(self.stack)
+        if missing <= 0:
+            values = self.stack[len(self.stack) - count:]
+            del self.stack[len(self.stack) - count:]
+            return values
+
+        self.materialize()
+        self.emit(f"_need({missing}, {self.at})")
+        values = []
+        for _ in range(missing):
+            name = self.temp()
+            self.emit(f"{name} = _pop()")
+            values.append(Value(name))
+        values.reverse()
+        values += self.stack
+        self.stack = []
+        return values
+
+    def materialize(self, all=False):
+        """Evaluates the values that are not literals into temporaries, in
+        the order they were pushed, before a statement that has effects"""
+        for i, value in enumerate(self.stack):
+            if all or not value.constant:
+                name = self.temp()
+                self.emit(f"{name} = {value.expr}")
+                self.stack[i] = Value(name)
+
+    def spill(self):
+        """Moves the values to the VM stack where control flow splits or joins"""
+        for value in self.stack:
+            self.emit(f"_push({value.expr})")
+        self.stack = []
+
+    def literal(self, slot):
+        value = self.bytecode.consts[slot]
+        if isinstance(value, float) and not math.isfinite(value):
+            return f"_consts[{slot}]"
+        return repr(value)
+
+    def store(self, target, value):
+        """Statement of an assignment of value to target"""
+        if target.slot is not None:
+            self.emit(f"v{target.slot} = {value.expr}")
+            self.assigned.add(target.slot)
+            return
+
+        # Target known at run time only: a name is a variable, any other
+        # value a key of the variables of the VM
+        self.emit(f"_b = {value.expr}")
+        self.emit(f"_a = {target.expr}")
+        if self.slotOf:
+            self.emit("if _a in _names:")
+            for i, (name, slot) in enumerate(self.slotOf.items()):
+                keyword = 'if' if i == 0 else 'elif'
+                self.emit(f"{indentUnit}{keyword} _a == {name!r}:")
+                self.emit(f"{indentUnit * 2}v{slot} = _b")
+            self.emit("else:")
+            self.emit(f"{indentUnit}_vars[_a] = _b")
+        else:
+            self.emit("_vars[_a] = _b")
+
+    # ========== INSTRUCTIONS ==========
+
+    def step(self, i):
+        """Translates the instruction i, which is not a jump"""
+        op, arg = self.ops[i], self.args[i]
+        self.at = i
+
+        if op == PUSH_CONST:
+            self.push(Value(self.literal(arg), constant=True, nonzero=self.bytecode.consts[arg] != 0))
+
+        elif op == LOAD_SLOT:
+            if arg not in self.assigned:
+                # The values before it are evaluated first, as in the VM
+                self.materialize()
+                self.emit(f"if v{arg} is _unset: _load({arg})")
+                self.assigned.add(arg)
+            self.push(Value(f"v{arg}"))
+
+        elif op == PUSH_NAME:
+            name = self.bytecode.names[arg]
+            self.push(Value(repr(name), constant=True, slot=self.slotOf[name], nonzero=True))
+
+        elif op == DIV:
+            left, right = self.take(2)
+            depth = max(left.depth, right.depth) + 1
+            if right.nonzero:
+                self.push(Value(f"({left.expr} / {right.expr})", depth))
+            else:
+                self.push(Value(f"_div({left.expr}, {right.expr})", depth))
+
+        elif op in binaryOps:
+            left, right = self.take(2)
+            self.push(Value(f"({left.expr} {binaryOps[op]} {right.expr})", max(left.depth, right.depth) + 1))
+
+        elif op == NEG:
+            operand, = self.take(1)
+            self.push(Value(f"(-{operand.expr})", operand.depth + 1))
+
+        elif op == STORE_SLOT:
+            value, = self.take(1)
+            self.materialize()
+            self.emit(f"v{arg} = {value.expr}")
+            self.assigned.add(arg)
+
+        elif op == ASSIGN:
+            value, target = self.take(2)
+            self.materialize()
+            self.store(target, value)
+
+        elif op == PRINT:
+            values = self.take(arg)
+            self.materialize()
+            self.emit(f"_print({', '.join(value.expr for value in values)})")
+
+        elif op == INPUT:
+            target, = self.take(1)
+            self.materialize()
+            if target.slot is not None:
+                self.emit(f"v{target.slot} = _input({target.expr})")
+                self.assigned.add(target.slot)
+            else:
+                self.emit(f"_c = {target.expr}")
+                self.store(Value('_c'), Value('_input(_c)'))
+
+        elif op == PRINT_COUNT:
+            self.spill()
+            self.emit("_print_count()")
+
+        else:
+            # EXEC: the VM executes the entry on its own stack
+            self.spill()
+            self.emit(f"_exec({arg})")
+
+    # ========== STRUCTURED CONTROL FLOW ==========
+
+    def structured(self):
+        """Body with Python control flow; raises Unstructured"""
+        self.reset(2)
+        self.region(0, self.count, None)
+        return self.lines
+
+    def region(self, start, end, loop, head=False):
+        """Translates the instructions start..end-1; loop is the (head, exit)
+        of the innermost loop they are in. With head, start is the head of
+        that loop"""
+        i = start
+        while i < end:
+            self.at = i
+            back = [j for j in self.backJumps.get(i, ()) if j < end]
+            if back and not (head and i == start):
+                # while True: ... with the last jump back to i as its end
+                last = max(back)
+                self.spill()
+                self.block("while True:", i, last + 1, (i, last + 1), True)
+                self.emit(f"{indentUnit}break")
+                i = last + 1
+                continue
+
+            op = self.ops[i]
+            if op == JMP:
+                self.spill()
+                self.emit(self.loopJump(self.args[i] // 2, loop))
+                i += 1
+
+            elif op == JF:
+                target = self.args[i] // 2
+                cond, = self.take(1)
+                self.spill()
+                if loop is not None and target in loop:
+                    self.emit(f"if not {cond.expr}:")
+                    self.emit(f"{indentUnit}{self.loopJump(target, loop)}")
+                    i += 1
+                elif i < target <= end:
+                    j = target - 1
+                    other = self.args[j] // 2 if j > i and self.ops[j] == JMP else -1
+                    if target <= other <= end:
+                        # if/else, the jump at j skips the else part; a
+                        # variable is assigned after it if both parts do
+                        assigned = self.block(f"if {cond.expr}:", i + 1, j, loop)
+                        assigned &= self.block("else:", target, other, loop)
+                        self.assigned |= assigned
+                        i = other
+                    else:
+                        self.block(f"if {cond.expr}:", i + 1, target, loop)
+                        i = target
+                else:
+                    raise Unstructured(f"jump from {i} to {target}")
+
+            elif op == JMP_LABEL or op == JF_LABEL:
+                raise Unstructured(f"jump to a label at run time at {i}")
+
+            else:
+                self.step(i)
+                i += 1
+
+        self.spill()
+
+    def block(self, header, start, end, loop, head=False):
+        """Statement header with the instructions start..end-1 as its body;
+        returns the slots assigned at its end, which may not run"""
+        self.emit(header)
+        self.depth += 1
+        size = len(self.lines)
+        before = self.assigned
+        self.assigned = set(before)
+        self.region(start, end, loop, head)
+        if len(self.lines) == size:
+            self.emit("pass")
+        self.depth -= 1
+        assigned, self.assigned = self.assigned, before
+        return assigned
+
+    def loopJump(self, target, loop):
+        if loop is not None and target == loop[0]:
+            return "continue"
+        if loop is not None and target == loop[1]:
+            return "break"
+        raise Unstructured(f"jump to {target} out of a loop")
+
+    # ========== STATE MACHINE ==========
+
+    def stateMachine(self):
+        """Body that runs every basic block as a state of a loop"""
+        self.reset(2)
+        leaders = {0}
+        for label in self.bytecode.labels.values():
+            leaders.add(label // 2)
+        for i in range(self.count):
+            if self.ops[i] in (JMP, JF, JMP_LABEL, JF_LABEL):
+                leaders.add(i + 1)
+                if self.ops[i] in (JMP, JF):
+                    leaders.add(self.args[i] // 2)
+        leaders = sorted(leader for leader in leaders if leader < self.count)
+
+        self.emit("_state = 0")
+        self.emit("while True:")
+        self.depth += 1
+        for n, first in enumerate(leaders):
+            last = leaders[n + 1] if n + 1 < len(leaders) else self.count
+            self.emit(f"{'if' if n == 0 else 'elif'} _state == {first}:")
+            self.depth += 1
+            self.basicBlock(first, last)
+            self.depth -= 1
+        self.emit("else:" if leaders else "if True:")
+        self.emit(f"{indentUnit}break")
+        self.depth -= 1
+        return self.lines
+
+    def basicBlock(self, first, last):
+        self.assigned = set()
+        for i in range(first, last):
+            op, arg = self.ops[i], self.args[i]
+            self.at = i
+            if op == JMP:
+                self.spill()
+                self.emit(f"_state = {arg // 2}")
+                return
+            if op == JMP_LABEL:
+                label, = self.take(1)
+                self.spill()
+                self.emit(f"_state = _label({label.expr})")
+                return
+            if op == JF or op == JF_LABEL:
+                if op == JF:
+                    cond, = self.take(1)
+                    target = str(arg // 2)
+                else:
+                    cond, label = self.take(2)
+                    self.materialize()
+                    self.emit(f"_f = {cond.expr}")
+                    self.emit(f"_l = {label.expr}")
+                    cond = Value('_f')
+                    target = "_label(_l)"
+                self.spill()
+                self.emit(f"if not {cond.expr}:")
+                self.emit(f"{indentUnit}_state = {target}")
+                self.emit(f"{indentUnit}continue")
+                break
+            self.step(i)
+        self.spill()
+        self.emit(f"_state = {last}")
+
+    # ========== FUNCTION ==========
+
+    def function(self):
+        """Source of the function _run(*runtimeArgs)"""
+        try:
+            body = self.structured()
+        except Unstructured:
+            body = self.stateMachine()
+        return self.wrap(body)
+
+    def wrap(self, body):
+        """Source of the function with body; lineOrigins gets the
+        instruction index of every line of it"""
+        self.lineOrigins = [0] * bodyLine + self.origins + [self.at] * 3
+        return '\n'.join([
+            f"def _run({', '.join(runtimeArgs)}):",
+            f"{indentUnit}try:",
+            *body,
+            f"{indentUnit * 2}pass",
+            f"{indentUnit}finally:",
+            f"{indentUnit * 2}_done(locals())",
+        ]) + '\n'
+
+
+def generatePython(bytecode):
+    """Source of the Python function that runs the bytecode"""
+    return PythonGenerator(bytecode).function()
+
+
+def compileBytecode(bytecode):
+    """Code object that defines the function _run of the bytecode, and the
+    instruction index of every line of its source. Nesting too deep for the
+    Python compiler falls back to the state machine"""
+    generator = PythonGenerator(bytecode)
+    try:
+        code = compile(generator.function(), '<joovy>', 'exec')
+    except (SyntaxError, RecursionError, MemoryError):
+        code = compile(generator.wrap(generator.stateMachine()), '<joovy>', 'exec')
+    return code, generator.lineOrigins
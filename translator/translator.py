@@ -1,32 +1,22 @@
-from lexer.lexer import start as lex_start
-from lexer import globals as g
+from parser import buildAst, parseFile, parseFunctionBody
+from astnodes import *
+from lexer.kinds import *
+from diagnostics import diag
 
 # Global variables for translator
-tableOfSymb = {}           # Symbol table from lexer
-numRow = 0                 # Current record number
-len_tableOfSymb = 0        # Total records
 postfixCode = []           # Generated postfix code
 labelCounter = 0           # Counter for generating labels
+functions = {}             # Top-level functions {name: FuncDecl}
 tableOfLabels = {}         # Table of labels {label: position}
 tempVarCounter = 0         # Counter for temporary variables
+workStack = []             # Pending steps [(function, argument)], next one last
 
 
-# ========== HELPER FUNCTIONS ==========
-
-def getSymb():
-    """Gets current entry from symbol table"""
-    global numRow, tableOfSymb
-    if numRow <= len_tableOfSymb:
-        numLine, lexeme, token, _ = tableOfSymb[numRow]
-        return numLine, lexeme, token
-    return None, None, None
+class TranslationError(Exception):
+    """Error in the program that stops translation, reported without traceback"""
 
 
-def nextSymb():
-    """Moves to next symbol"""
-    global numRow
-    numRow += 1
-
+# ========== HELPER FUNCTIONS ==========
 
 def createLabel():
     """Generates new unique label"""
@@ -46,191 +36,121 @@ def addToPostfix(lexeme, token):
     """Adds element to postfix code"""
     global postfixCode
     postfixCode.append((lexeme, token))
-    print(f"  + Postfix: ({lexeme}, {token})")
+    if diag.showTrace:
+        diag.trace(f"  + Postfix: ({lexeme}, {token})")
 
 
 def setLabelValue(label):
     """Sets label value to current position in postfix code"""
     global tableOfLabels, postfixCode
     tableOfLabels[label] = len(postfixCode)
-    print(f"  @ Label '{label}' = position {len(postfixCode)}")
+    if diag.showTrace:
+        diag.trace(f"  @ Label '{label}' = position {len(postfixCode)}")
 
 
-# ========== TRANSLATION FUNCTIONS ==========
+def placeLabel(label):
+    """Places label at the current position in postfix code"""
+    addToPostfix(label, 'LABEL')
+    addToPostfix(':', 'COLON')
+    setLabelValue(label)
 
-def translateProgram():
-    """Program = {Declaration | Statement}"""
-    print("\n" + "=" * 60)
-    print("TRANSLATION TO POSTFIX")
-    print("=" * 60 + "\n")
 
-    # Process all declarations and statements
-    while numRow <= len_tableOfSymb:
-        numLine, lex, tok = getSymb()
+def jumpTo(label):
+    """Adds unconditional jump to label"""
+    addToPostfix(label, 'LABEL')
+    addToPostfix('JMP', 'JUMP')
 
-        if numLine is None:
-            break
 
-        # Variable/constant declarations - translate them!
-        if tok == 'TYPE' or lex == 'const':
-            translateDeclaration()
+def pushStatements(statements):
+    """Schedules the statements, the first one to run next"""
+    workStack.extend((translateStatement, node) for node in reversed(statements))
 
-        # Function declaration - skip for now (LR4 basic version)
-        elif lex == 'def' and tok == 'KEYWORD':
-            skipFunction()
 
-        # Statements
-        elif tok == 'IDENTIFIER' or lex in ('if', 'for', 'print', 'input', 'return') or lex == '{':
-            translateStatement()
+def translateStatements(statements):
+    """Translates the statements and everything nested in them
 
-        else:
-            break
+    Compound statements do not call the translation of their blocks: they
+    push the blocks and the code after each block as steps on workStack,
+    so the nesting depth of the program does not grow the Python stack
+    """
+    pushStatements(statements)
+    while workStack:
+        step, argument = workStack.pop()
+        step(argument)
 
-    print("\n" + "=" * 60)
-    print("POSTFIX CODE GENERATED")
-    print("=" * 60)
-    return True
 
+def requireFunction(name):
+    """Parses the body of a lazily parsed function on its first call"""
+    func = functions.get(name)
+    if func is not None and func.lazy is not None and parseFunctionBody(func) is None:
+        raise TranslationError(f"invalid body of function '{name}'")
 
-def translateDeclaration():
-    """Processes variable or constant declaration and translates initialization"""
-    numLine, lex, tok = getSymb()
 
-    print(f"\nProcessing declaration at line {numLine}")
+# ========== TRANSLATION FUNCTIONS ==========
 
-    # const keyword
-    isConst = False
-    if lex == 'const':
-        isConst = True
-        nextSymb()
+def translateProgram(program):
+    """Program = {Declaration | Statement}"""
+    diag.info("\n" + "=" * 60)
+    diag.info("TRANSLATION TO POSTFIX")
+    diag.info("=" * 60 + "\n")
 
-    # Type
-    nextSymb()
+    # Process all declarations and statements
+    translateStatements(program.body)
 
-    # Ident = Value [, Ident = Value]*
-    while True:
-        numLine, lex, tok = getSymb()
-        ident = lex
-        nextSymb()  # Ident
+    diag.info("\n" + "=" * 60)
+    diag.info("POSTFIX CODE GENERATED")
+    diag.info("=" * 60)
+    return True
 
-        numLine, lex, tok = getSymb()
 
-        if lex == '=':
-            print(f"  Translating initialization: {ident} = ...")
-            nextSymb()  # =
+def translateDeclaration(node):
+    """Processes variable or constant declaration and translates initialization"""
+    if diag.showTrace:
+        diag.trace(f"\nProcessing declaration at line {node.line}")
+
+    # Ident = Value [, Ident = Value]*
+    for ident, value in node.items:
+        if value is not None:
+            if diag.showTrace:
+                diag.trace(f"  Translating initialization: {ident} = ...")
 
             # Translate the expression
-            translateExpression()
+            translateExpression(value)
 
             # Add assignment
             addToPostfix(ident, 'IDENTIFIER_LVALUE')
             addToPostfix(':=', 'ASSIGN_OP')
 
-        numLine, lex, tok = getSymb()
-        if lex == ',':
-            nextSymb()
-        else:
-            break
-
-
-def skipFunction():
-    """Skips function declaration"""
-    nextSymb()  # def
-    nextSymb()  # function name
-    nextSymb()  # (
-
-    # Skip parameters
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == ')':
-            nextSymb()
-            break
-        nextSymb()
-
-    # Skip block
-    skipBlock()
-
 
-def skipBlock():
-    """Skips block { ... }"""
-    nextSymb()  # {
+def skipFunction(node):
+    """Skips function declaration (LR4 basic version)"""
+    if diag.showTrace:
+        diag.trace(f"\nSkipping function '{node.name}' at line {node.line}")
 
-    depth = 1
-    while depth > 0:
-        numLine, lex, tok = getSymb()
-        if lex == '{':
-            depth += 1
-        elif lex == '}':
-            depth -= 1
-        nextSymb()
 
-
-def translateStatement():
+def translateStatement(node):
     """Translates statement"""
-    numLine, lex, tok = getSymb()
-
-    print(f"\nTranslating statement at line {numLine}: ({lex}, {tok})")
-
-    # Assignment
-    if tok == 'IDENTIFIER':
-        saved_row = numRow
-        nextSymb()
-        numLine2, lex2, tok2 = getSymb()
-        numRow = saved_row
-
-        if lex2 == '=' and tok2 == 'ASSIGN_OP':
-            translateAssignment()
-        elif lex2 == '(' and tok2 == 'PAR_OP':
-            translateFuncCall()
-
-    # If statement
-    elif lex == 'if' and tok == 'KEYWORD':
-        translateIf()
-
-    # For loop
-    elif lex == 'for' and tok == 'KEYWORD':
-        translateFor()
-
-    # Print
-    elif lex == 'print' and tok == 'KEYWORD':
-        translatePrint()
+    if diag.showTrace:
+        diag.trace(f"\nTranslating statement at line {node.line}: {type(node).__name__}")
 
-    # Input
-    elif lex == 'input' and tok == 'KEYWORD':
-        translateInput()
+    translators[type(node)](node)
 
-    # Return
-    elif lex == 'return' and tok == 'KEYWORD':
-        translateReturn()
 
-    # Block
-    elif lex == '{' and tok == 'PAR_OP':
-        translateBlock()
-
-
-def translateAssignment():
+def translateAssignment(node):
     """Assignment = Ident '=' Expression
     Postfix: Ident Expression :=
     """
-    print("  Translating assignment")
-
-    # Ident
-    numLine, lex, tok = getSymb()
-    ident = lex
-    nextSymb()
-
-    # '='
-    nextSymb()
+    diag.trace("  Translating assignment")
 
     # Expression
-    translateExpression()
+    translateExpression(node.value)
 
     # Add to postfix: Ident := (with l-value marker)
-    addToPostfix(ident, 'IDENTIFIER_LVALUE')
+    addToPostfix(node.name, 'IDENTIFIER_LVALUE')
     addToPostfix(':=', 'ASSIGN_OP')
 
 
-def translateIf():
+def translateIf(node):
     """IfStatement = 'if' '(' Expression ')' Block ['else' Block]
 
     Postfix scheme:
@@ -242,15 +162,10 @@ def translateIf():
     - JF pops: label (top), then condition
     - If condition is false, jump to label
     """
-    print("  Translating if statement")
-
-    nextSymb()  # if
-    nextSymb()  # (
+    diag.trace("  Translating if statement")
 
     # Expression - leaves result on stack
-    translateExpression()
-
-    nextSymb()  # )
+    translateExpression(node.cond)
 
     # Generate labels
     labelElse = createLabel()
@@ -261,74 +176,40 @@ def translateIf():
     addToPostfix(labelElse, 'LABEL')
     addToPostfix('JF', 'JUMP_IF_FALSE')
 
-    # Then block
-    translateBlock()
-
-    # Check for else
-    numLine, lex, tok = getSymb()
-
-    if lex == 'else' and tok == 'KEYWORD':
-        # JMP to end (skip else block)
-        addToPostfix(labelEnd, 'LABEL')
-        addToPostfix('JMP', 'JUMP')
-
-        # Place else label here
-        addToPostfix(labelElse, 'LABEL')
-        addToPostfix(':', 'COLON')
-        setLabelValue(labelElse)
-
-        nextSymb()  # else
-        translateBlock()
-
-        # Place end label
-        addToPostfix(labelEnd, 'LABEL')
-        addToPostfix(':', 'COLON')
-        setLabelValue(labelEnd)
+    if node.orelse is not None:
+        # Then block, JMP to end (skip else block), else label here,
+        # else block and end label, pushed in reverse order
+        workStack.append((placeLabel, labelEnd))
+        workStack.append((translateBlock, node.orelse))
+        workStack.append((placeLabel, labelElse))
+        workStack.append((jumpTo, labelEnd))
     else:
-        # No else - just place label
-        addToPostfix(labelElse, 'LABEL')
-        addToPostfix(':', 'COLON')
-        setLabelValue(labelElse)
+        # No else - just place label after the then block
+        workStack.append((placeLabel, labelElse))
 
+    workStack.append((translateBlock, node.then))
 
-def translateFor():
+
+def translateFor(node):
     """ForLoop = 'for' '(' Ident 'in' Start..End ')' Block
 
     Postfix scheme:
     Ident Start :=
     m1:
-    Ident End Ident - 0 >= m2 JF
     Block
     Ident Ident 1 + :=
     m1 JMP
     m2:
 
-    Semantic:
-    1. Initialize loop variable with start value
-    2. m1: Check if variable <= end
-    3. If false, jump to m2 (exit)
-    4. Execute block
-    5. Increment variable
-    6. Jump back to m1
-    7. m2: end of loop
+    The end of the range is not checked yet (tempEnd is reserved for it),
+    so m2 is only reached by a jump that does not exist yet
     """
-    print("  Translating for loop")
-
-    nextSymb()  # for
-    nextSymb()  # (
-
-    # Loop variable
-    numLine, lex, tok = getSymb()
-    loopVar = lex
-    nextSymb()
-
-    nextSymb()  # in
-
-    # Start value
-    translateForRange()  # Gets start value on stack
+    diag.trace("  Translating for loop")
 
     # Initialize: loopVar = start
-    addToPostfix(loopVar, 'IDENTIFIER_LVALUE')
+    kind, lex = node.start
+    addToPostfix(lex, tokenOfKind[kind])
+    addToPostfix(node.var, 'IDENTIFIER_LVALUE')
     addToPostfix(':=', 'ASSIGN_OP')
 
     # Generate labels
@@ -336,338 +217,163 @@ def translateFor():
     labelEnd = createLabel()
 
     # m1: loop start
-    addToPostfix(labelLoop, 'LABEL')
-    addToPostfix(':', 'COLON')
-    setLabelValue(labelLoop)
+    placeLabel(labelLoop)
 
-    # Check condition: loopVar <= end
-    # We need: end - loopVar >= 0
-    # But we already skipped to ')', so end value is gone
-    # Need to rethink...
-
-    # Get end value (currently at ')' token)
-    # This is complex - need to store end value
-
-    # Simplified version: assume we have end value somehow
     tempEnd = createTempVar()
 
-    nextSymb()  # )
-
-    # For now, skip the range check implementation
-    # Just translate the block
+    # Block, increment, jump back to loop start and m2: loop end,
+    # pushed in reverse order
+    workStack.append((placeLabel, labelEnd))
+    workStack.append((jumpTo, labelLoop))
+    workStack.append((incrementVar, node.var))
+    workStack.append((translateBlock, node.body))
 
-    translateBlock()
 
-    # Increment: loopVar = loopVar + 1
-    addToPostfix(loopVar, 'IDENTIFIER')
-    addToPostfix(loopVar, 'IDENTIFIER')
+def incrementVar(name):
+    """Increment: loopVar = loopVar + 1"""
+    addToPostfix(name, 'IDENTIFIER')
+    addToPostfix(name, 'IDENTIFIER')
     addToPostfix('1', 'INT')
     addToPostfix('+', 'ADD_OP')
     addToPostfix(':=', 'ASSIGN_OP')
 
-    # Jump back to loop start
-    addToPostfix(labelLoop, 'LABEL')
-    addToPostfix('JMP', 'JUMP')
-
-    # m2: loop end
-    addToPostfix(labelEnd, 'LABEL')
-    addToPostfix(':', 'COLON')
-    setLabelValue(labelEnd)
-
-
-def translateForRange():
-    """Translates range in for loop (start..end)
-    Returns: leaves start value on stack for now
-    """
-    # Start value
-    numLine, lex, tok = getSymb()
-    if tok in ('INT', 'FLOAT'):
-        addToPostfix(lex, tok)
-        nextSymb()
-
-    # Skip dots
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == '.' and tok == 'DOT':
-            nextSymb()
-        else:
-            break
 
-    # End value - will be handled differently
-    # For now just skip it
-    numLine, lex, tok = getSymb()
-    if tok in ('INT', 'FLOAT'):
-        nextSymb()
-
-
-def translatePrint():
+def translatePrint(node):
     """PrintStmt = 'print' '(' [ExprList] ')'
     Postfix: Expression1 Expression2 ... PRINT n
     Where n is the number of expressions
     """
-    print("  Translating print")
-
-    nextSymb()  # print
-    nextSymb()  # (
-
-    count = 0
+    diag.trace("  Translating print")
 
-    # Expression list
-    numLine, lex, tok = getSymb()
-    if lex != ')':
-        translateExpression()
-        count += 1
-
-        while True:
-            numLine, lex, tok = getSymb()
-            if lex == ',':
-                nextSymb()
-                translateExpression()
-                count += 1
-            else:
-                break
-
-    nextSymb()  # )
+    for expr in node.args:
+        translateExpression(expr)
 
     # Add PRINT with count
-    addToPostfix(str(count), 'INT')
+    addToPostfix(str(len(node.args)), 'INT')
     addToPostfix('PRINT', 'PRINT_OP')
 
 
-def translateInput():
+def translateInput(node):
     """InputStmt = 'input' '(' Ident ')'
     Postfix: Ident INPUT
     """
-    print("  Translating input")
-
-    nextSymb()  # input
-    nextSymb()  # (
-
-    # Ident
-    numLine, lex, tok = getSymb()
-    addToPostfix(lex, 'IDENTIFIER_LVALUE')
-    nextSymb()
-
-    nextSymb()  # )
+    diag.trace("  Translating input")
 
+    addToPostfix(node.name, 'IDENTIFIER_LVALUE')
     addToPostfix('INPUT', 'INPUT_OP')
 
 
-def translateReturn():
+def translateReturn(node):
     """ReturnStmt = 'return' [Expression]
     For now, just translate expression if present
     """
-    print("  Translating return")
+    diag.trace("  Translating return")
 
-    nextSymb()  # return
+    if node.value is not None:
+        translateExpression(node.value)
 
-    numLine, lex, tok = getSymb()
-    if lex != '}':
-        translateExpression()
 
-
-def translateFuncCall():
+def translateFuncCall(node):
     """Function call - skip for now (basic version)"""
-    print("  Skipping function call (not implemented yet)")
-
-    nextSymb()  # function name
-    nextSymb()  # (
+    requireFunction(node.name)
+    diag.trace("  Skipping function call (not implemented yet)")
 
-    # Skip arguments
-    depth = 1
-    while depth > 0:
-        numLine, lex, tok = getSymb()
-        if lex == '(':
-            depth += 1
-        elif lex == ')':
-            depth -= 1
-        nextSymb()
 
-
-def translateBlock():
+def translateBlock(node):
     """Block = '{' {Statement} '}'"""
-    print("  Translating block")
-
-    nextSymb()  # {
-
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == '}' and tok == 'PAR_OP':
-            nextSymb()
-            break
-        translateStatement()
-
-
-def translateExpression():
-    """Expression = CompareExpr
-    For arithmetic: operand1 operand2 operator
-    For comparison: operand1 operand2 relop
-    """
-    translateCompareExpr()
-
-
-def translateCompareExpr():
-    """CompareExpr = ArithExpr [RelOp ArithExpr]"""
-    translateArithExpr()
-
-    # Check for comparison operator
-    numLine, lex, tok = getSymb()
-    if tok == 'COMPARE_OP':
-        relop = lex
-        nextSymb()
-        translateArithExpr()
-        addToPostfix(relop, 'COMPARE_OP')
+    diag.trace("  Translating block")
 
+    pushStatements(node.body)
 
-def translateArithExpr():
-    """ArithExpr = Term {AddOp Term}"""
-    translateTerm()
 
-    while True:
-        numLine, lex, tok = getSymb()
-        if tok == 'ADD_OP':
-            op = lex
-            nextSymb()
-            translateTerm()
-            addToPostfix(op, 'ADD_OP')
-        else:
-            break
-
-
-def translateTerm():
-    """Term = Power {MultOp Power}"""
-    translatePower()
-
-    while True:
-        numLine, lex, tok = getSymb()
-        if tok == 'MULT_OP':
-            op = lex
-            nextSymb()
-            translatePower()
-            addToPostfix(op, 'MULT_OP')
-        else:
-            break
-
-
-def translatePower():
-    """Power = Factor {'^' Factor}"""
-    translateFactor()
-
-    while True:
-        numLine, lex, tok = getSymb()
-        if lex == '^' and tok == 'POWER_OP':
-            nextSymb()
-            translateFactor()
-            addToPostfix('^', 'POWER_OP')
-        else:
-            break
-
-
-def translateFactor():
-    """Factor = [Sign] Primary"""
-    # Check for unary sign
-    numLine, lex, tok = getSymb()
-    unaryOp = None
-
-    if tok == 'ADD_OP' and lex in ('+', '-'):
-        unaryOp = lex
-        nextSymb()
-
-    translatePrimary()
-
-    # Add unary operator after operand
-    if unaryOp == '-':
-        addToPostfix('NEG', 'UNARY_OP')
-    # Unary + does nothing
+# Translation function of every statement node
+translators = {
+    VarDecl: translateDeclaration,
+    FuncDecl: skipFunction,
+    Assign: translateAssignment,
+    If: translateIf,
+    For: translateFor,
+    Print: translatePrint,
+    Input: translateInput,
+    Return: translateReturn,
+    Call: translateFuncCall,
+    Block: translateBlock,
+}
 
 
-def translatePrimary():
-    """Primary = Ident | Const | '(' Expression ')'"""
-    numLine, lex, tok = getSymb()
-
-    # Constant
-    if tok in ('INT', 'FLOAT', 'BOOL', 'STRING'):
-        addToPostfix(lex, tok)
-        nextSymb()
+def translateExpression(expr):
+    """Expression code is already in postfix order:
+    operand1 operand2 operator, unary minus after its operand
+    """
+    for item in expr.code:
+        kind = item[0]
 
-    # Identifier (might be function call)
-    elif tok == 'IDENTIFIER':
-        ident = lex
-        nextSymb()
+        if kind == NEG:
+            addToPostfix('NEG', 'UNARY_OP')
 
-        # Check for function call
-        numLine2, lex2, tok2 = getSymb()
-        if lex2 == '(' and tok2 == 'PAR_OP':
+        elif kind == CALL:
             # Function call - for now just skip
             # In full implementation, translate arguments and add CALL
-            print(f"    Warning: Function call '{ident}' not fully supported")
-            skipFunctionCallArgs()
-        else:
-            addToPostfix(ident, 'IDENTIFIER')
-
-    # Parenthesized expression
-    elif lex == '(' and tok == 'PAR_OP':
-        nextSymb()  # (
-        translateExpression()
-        nextSymb()  # )
+            requireFunction(item[1])
+            diag.warning(f"    Warning: Function call '{item[1]}' not fully supported")
 
-
-def skipFunctionCallArgs():
-    """Skips function call arguments"""
-    nextSymb()  # (
-
-    depth = 1
-    while depth > 0:
-        numLine, lex, tok = getSymb()
-        if lex == '(':
-            depth += 1
-        elif lex == ')':
-            depth -= 1
-        nextSymb()
+        # Constants, identifiers and binary operators
+        else:
+            addToPostfix(item[1], tokenOfKind[kind])
 
 
 # ========== MAIN TRANSLATION FUNCTION ==========
 
-def translate(table_of_symb):
-    """Main translation function"""
-    global tableOfSymb, numRow, len_tableOfSymb, postfixCode
-    global labelCounter, tableOfLabels, tempVarCounter
+def translateTree(program):
+    """Translates the Program tree built by the parser"""
+    global postfixCode, labelCounter, tableOfLabels, tempVarCounter, functions, workStack
 
     # Initialize
-    tableOfSymb = table_of_symb
-    numRow = 1
-    len_tableOfSymb = len(tableOfSymb)
     postfixCode = []
     labelCounter = 0
     tableOfLabels = {}
     tempVarCounter = 0
+    workStack = []
+    functions = {node.name: node for node in program.body if isinstance(node, FuncDecl)}
 
     # Translate
     try:
-        translateProgram()
+        translateProgram(program)
         return True, postfixCode, tableOfLabels
+    except TranslationError as e:
+        diag.error(f"\nTranslation ERROR: {e}")
+        return False, [], {}
     except Exception as e:
-        print(f"\nTranslation ERROR: {e}")
+        diag.error(f"\nTranslation ERROR: {e}")
         import traceback
-        traceback.print_exc()
+        diag.error(traceback.format_exc())
+        return False, [], {}
+
+
+def translate(table_of_symb, table_of_kind=None):
+    """Main translation function"""
+    program = buildAst(table_of_symb, table_of_kind)
+    if program is None:
         return False, [], {}
+    return translateTree(program)
 
 
-def start(file_path):
-    """Runs complete analysis and translation"""
-    # Run lexer
-    lex_success = lex_start(file_path)
+def start(file_path, lazy=False):
+    """Runs complete analysis and translation; with lazy, a function body is
+    only parsed when a call to the function is translated"""
+    # Run lexer and parser, once for the whole compilation
+    program = parseFile(file_path, lazy=lazy)
 
-    if not lex_success or g.errorCount > 0:
-        print("\n✗ Lexical analysis failed. Translation not possible.")
+    if program is None:
+        diag.error("\n✗ Lexical or syntax analysis failed. Translation not possible.")
         return False, [], {}
 
     # Translate
-    success, postfix, labels = translate(g.tableOfSymb)
+    success, postfix, labels = translateTree(program)
 
     if success:
-        print("\n" + "=" * 60)
-        print("✓ Translation completed successfully")
-        print("=" * 60)
+        diag.info("\n" + "=" * 60)
+        diag.info("✓ Translation completed successfully")
+        diag.info("=" * 60)
 
     return success, postfix, labels